@@ -1,5 +1,12 @@
+from pathlib import Path
+
+from django.conf import settings
 from django.contrib import admin
+from django.http import FileResponse, Http404
+from django.shortcuts import render
+
 from .models import *
+from .profiling import list_profiles, read_profile
 
 admin.site.register(UserProfile)
 admin.site.register(Category)
@@ -12,3 +19,41 @@ admin.site.register(Cart)
 admin.site.register(CartItem)
 admin.site.register(Review)
 admin.site.register(Store)
+admin.site.register(OrderEvent)
+
+
+@admin.register(ArchivedOrder, ArchivedOrderItem, ArchivedReceipt, ArchivedOrderEvent)
+class ArchiveAdmin(admin.ModelAdmin):
+    # архив только для просмотра: его пишет команда archive_orders
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+def profile_list(request):
+    context = {**admin.site.each_context(request), 'title': 'Профили запросов', 'profiles': list_profiles(),
+               'enabled': settings.PROFILING_ENABLED}
+    return render(request, 'admin/market_app/profiles.html', context)
+
+
+def profile_detail(request, profile_id):
+    profile = read_profile(profile_id)
+    if profile is None:
+        raise Http404
+    queries = sorted(profile['queries'], key=lambda query: query['ms'], reverse=True)
+    context = {**admin.site.each_context(request), 'title': f"{profile['method']} {profile['path']}",
+               'profile': profile, 'queries': queries}
+    return render(request, 'admin/market_app/profile_detail.html', context)
+
+
+def profile_download(request, profile_id):
+    if read_profile(profile_id) is None:
+        raise Http404
+    path = Path(settings.PROFILING_DIR) / f'{profile_id}.speedscope.json'
+    try:
+        file = path.open('rb')
+    except OSError:  # удалён ротацией
+        raise Http404
+    return FileResponse(file, as_attachment=True, filename=path.name, content_type='application/json')
@@ -0,0 +1,130 @@
+"""
+Перенос доставленных заказов в архив.
+
+Заказ со статусом «Доставлено», который не менялся дольше
+ARCHIVE_ORDERS_AFTER_DAYS дней, переносится вместе с позициями, чеком и
+журналом статусов в таблицы Archived* (возможно, в отдельную БД) и удаляется
+из горячих таблиц. Пакеты небольшие, каждый в своей короткой транзакции.
+Сначала коммитится запись в архив, потом удаление из горячих таблиц: если
+процесс упадёт между ними, следующий проход повторит пакет (ignore_conflicts),
+а чтение до этого берёт горячую копию.
+"""
+import heapq
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import Case, F, When
+from django.utils import timezone
+
+from .models import (
+    ArchivedOrder, ArchivedOrderEvent, ArchivedOrderItem, ArchivedReceipt, OrderEvent, OrderItem, Ordering,
+    Product, Receipt,
+)
+
+ARCHIVABLE_STATUS = 'Доставлено'
+
+
+def archive_cutoff(days=None):
+    days = settings.ARCHIVE_ORDERS_AFTER_DAYS if days is None else days
+    return timezone.now() - timedelta(days=days)
+
+
+def delete_rows(using, model, column, ids):
+    """
+    DELETE ... WHERE column IN (ids) одним запросом, без сигналов и каскадов Django.
+    """
+    connection = connections[using]
+    table, column = connection.ops.quote_name(model._meta.db_table), connection.ops.quote_name(column)
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {table} WHERE {column} IN ({', '.join(['%s'] * len(ids))})", list(ids))
+
+
+def archive_batch(cutoff, batch_size=500):
+    """
+    Переносит в архив до batch_size заказов, доставленных раньше cutoff. Возвращает их число.
+    """
+    hot_db = router.db_for_write(Ordering)
+    with transaction.atomic(using=hot_db):
+        orders = list(
+            Ordering.objects.select_for_update(skip_locked=True)
+            .filter(delivery_status=ARCHIVABLE_STATUS, updated_at__lt=cutoff)
+            .order_by('updated_at')[:batch_size]
+        )
+        if not orders:
+            return 0
+        order_ids = [order.pk for order in orders]
+        items = list(OrderItem.objects.filter(order_id__in=order_ids))
+        receipts = list(Receipt.objects.filter(order_id__in=order_ids))
+        events = list(OrderEvent.objects.filter(order_id__in=order_ids))
+
+        with transaction.atomic(using=router.db_for_write(ArchivedOrder)):
+            ArchivedOrder.objects.bulk_create([
+                ArchivedOrder(id=o.pk, user_id=o.user_id, created_at=o.created_at, updated_at=o.updated_at,
+                              is_paid=o.is_paid, delivery_status=o.delivery_status)
+                for o in orders
+            ], ignore_conflicts=True)
+            ArchivedOrderItem.objects.bulk_create([
+                ArchivedOrderItem(id=i.pk, order_id=i.order_id, product_id=i.product_id, quantity=i.quantity,
+                                  product_name=i.product_name, product_image=i.product_image,
+                                  unit_price=i.unit_price, discount_percent=i.discount_percent)
+                for i in items
+            ], ignore_conflicts=True)
+            ArchivedReceipt.objects.bulk_create([
+                ArchivedReceipt(id=r.pk, order_id=r.order_id, store_name_id=r.store_name_id,
+                                purchase_date=r.purchase_date, delivery_date=r.delivery_date,
+                                total_sum=r.total_sum, delivery_cost=r.delivery_cost)
+                for r in receipts
+            ], ignore_conflicts=True)
+            ArchivedOrderEvent.objects.bulk_create([
+                ArchivedOrderEvent(id=e.pk, order_id=e.order_id, from_status=e.from_status, to_status=e.to_status,
+                                   actor_id=e.actor_id, created_at=e.created_at)
+                for e in events
+            ], ignore_conflicts=True)
+
+        # популярность товара не должна упасть оттого, что позиции ушли из OrderItem
+        quantities = defaultdict(int)
+        for item in items:
+            quantities[item.product_id] += item.quantity
+        if quantities:
+            Product.objects.filter(pk__in=quantities).update(archived_quantity=F('archived_quantity') + Case(
+                *(When(pk=pk, then=quantity) for pk, quantity in quantities.items())
+            ))
+
+        # сигналы post_delete пропускаются намеренно: popularity не меняется (штуки уже
+        # в archived_quantity), а пересчёт и сброс кэшей на каждую строку переносу не нужны.
+        # Поэтому DELETE напрямую, зависимые таблицы — раньше заказов
+        for model in (OrderEvent, Receipt, OrderItem):
+            delete_rows(hot_db, model, 'order_id', order_ids)
+        delete_rows(hot_db, Ordering, 'id', order_ids)
+    return len(order_ids)
+
+
+def archive_orders(cutoff, batch_size=500, max_batches=None, pause=0.0):
+    """
+    Пакетами переносит все подходящие заказы; pause — пауза между пакетами,
+    чтобы не занимать БД. Возвращает число перенесённых заказов.
+    """
+    total = batches = 0
+    while max_batches is None or batches < max_batches:
+        moved = archive_batch(cutoff, batch_size)
+        total += moved
+        batches += 1
+        if moved < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+    return total
+
+
+def merge_order_tiers(hot, archived, key, reverse=False):
+    """
+    Заказы обоих уровней одним списком, отсортированным по key. Заказ, который
+    уже в архиве, но ещё не удалён из горячих таблиц, берётся из горячих.
+    """
+    hot = list(hot)
+    hot_ids = {order.pk for order in hot}
+    archived = [order for order in archived if order.pk not in hot_ids]
+    return list(heapq.merge(hot, archived, key=key, reverse=reverse))
@@ -0,0 +1,221 @@
+"""
+Подсказки поиска по мере ввода: префиксное дерево названий товаров и категорий
+в памяти рабочего процесса.
+
+Дерево строится при старте процесса (warm_index из asgi.py/wsgi.py) и
+обновляется сигналами Product/Category. Сигналы приходят только в процесс,
+который сохранил объект, поэтому остальные процессы перестраивают индекс,
+когда он старше AUTOCOMPLETE_MAX_AGE секунд.
+"""
+import heapq
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, connection
+
+logger = logging.getLogger(__name__)
+
+EN_LAYOUT = "qwertyuiop[]asdfghjkl;'zxcvbnm,.`"
+RU_LAYOUT = "йцукенгшщзхъфывапролджэячсмитьбюё"
+EN_TO_RU = str.maketrans(EN_LAYOUT, RU_LAYOUT)
+RU_TO_EN = str.maketrans(RU_LAYOUT, EN_LAYOUT)
+
+
+def normalize(text):
+    return ' '.join(text.casefold().replace('ё', 'е').split())
+
+
+def query_variants(query):
+    """
+    Запрос как есть и набранный в другой раскладке ("vjkjrj" -> "молоко").
+    """
+    query = normalize(query)
+    variants = [query]
+    for table in (EN_TO_RU, RU_TO_EN):
+        swapped = normalize(query.translate(table))
+        if swapped not in variants:
+            variants.append(swapped)
+    return variants
+
+
+def name_terms(name):
+    """
+    Полное название и каждый его хвост с начала слова: "халва подсолнечная"
+    находится и по "хал", и по "подс".
+    """
+    words = normalize(name).split(' ')
+    return [(' '.join(words[i:]), i == 0) for i in range(len(words)) if words[i]]
+
+
+class Node:
+    __slots__ = ('children', 'ids', 'top')
+
+    def __init__(self):
+        self.children = {}
+        self.ids = {}  # записи, чьи термины проходят через узел -> совпадает ли термин с началом названия
+        self.top = None  # кэш лучших записей узла, сбрасывается при изменении ids
+
+
+class AutocompleteIndex:
+    max_typos = 1
+    top_size = 20
+
+    def __init__(self):
+        self.root = Node()
+        self.entries = {}  # (kind, id) -> (название, термины)
+        self.lock = threading.Lock()
+        self.built_at = time.monotonic()
+
+    def add(self, kind, pk, name):
+        key = (kind, pk)
+        with self.lock:
+            self._remove(key)
+            terms = name_terms(name)
+            self.entries[key] = (name, terms)
+            for term, from_start in terms:
+                for node in self._path(term, create=True):
+                    node.ids[key] = node.ids.get(key, False) or from_start
+                    node.top = None
+
+    def remove(self, kind, pk):
+        with self.lock:
+            self._remove((kind, pk))
+
+    def _path(self, term, create=False):
+        node = self.root
+        yield node
+        for char in term:
+            child = node.children.get(char)
+            if child is None:
+                if not create:
+                    return
+                child = node.children[char] = Node()
+            node = child
+            yield node
+
+    def _remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        for term, _ in entry[1]:
+            path = list(self._path(term))
+            for node in path:
+                node.ids.pop(key, None)
+                node.top = None
+            # обрезаем опустевшие ветки
+            for parent, char, child in reversed(list(zip(path, term, path[1:]))):
+                if child.ids:
+                    break
+                del parent.children[char]
+
+    def top(self, node):
+        """
+        Лучшие записи узла: сначала совпадение с начала названия, затем короткие названия.
+        Считается один раз и живёт до следующего изменения узла.
+        """
+        if node.top is None:
+            node.top = heapq.nsmallest(
+                self.top_size, node.ids.items(),
+                key=lambda item: (not item[1], len(self.entries[item[0]][0]), self.entries[item[0]][0]),
+            )
+        return node.top
+
+    def exact(self, query):
+        node = self.root
+        for char in query:
+            node = node.children.get(char)
+            if node is None:
+                return None
+        return node
+
+    def fuzzy(self, query):
+        """
+        Узлы, в которых какой-либо термин начинается с query с точностью до
+        одной правки (вставка, удаление, замена): обход дерева со строкой
+        Левенштейна, ветки с минимумом строки больше max_typos отсекаются.
+        """
+        found = []
+        first_row = list(range(len(query) + 1))
+        stack = [(child, char, first_row) for char, child in self.root.children.items()]
+        while stack:
+            node, char, previous = stack.pop()
+            row = [previous[0] + 1]
+            for i, query_char in enumerate(query, 1):
+                row.append(min(row[i - 1] + 1, previous[i] + 1, previous[i - 1] + (query_char != char)))
+            if row[-1] <= self.max_typos:
+                found.append(node)  # весь запрос уже совпал, глубже идти не нужно
+            elif min(row) <= self.max_typos:
+                stack.extend((child, next_char, row) for next_char, child in node.children.items())
+        return found
+
+    def suggest(self, query, limit=10):
+        limit = min(limit, self.top_size)
+        ranked = {}
+        with self.lock:
+            for variant in query_variants(query):
+                if not variant:
+                    continue
+                node = self.exact(variant)
+                nodes = [(node, 0)] if node is not None else []
+                if (node is None or len(node.ids) < limit) and len(variant) > 2:
+                    nodes += [(fuzzy, 1) for fuzzy in self.fuzzy(variant)]
+                for node, typo in nodes:
+                    for key, from_start in self.top(node):
+                        name = self.entries[key][0]
+                        score = (typo, not from_start, len(name), name)
+                        if key not in ranked or score < ranked[key]:
+                            ranked[key] = score
+        best = heapq.nsmallest(limit, ranked.items(), key=lambda item: item[1])
+        return [{'type': kind, 'id': pk, 'name': score[3]} for (kind, pk), score in best]
+
+
+_index = None
+_build_lock = threading.Lock()
+
+
+def build_index():
+    from .models import Category, Product
+
+    index = AutocompleteIndex()
+    for pk, name in Category.objects.values_list('id', 'category_name').iterator():
+        index.add('category', pk, name)
+    for pk, name in Product.objects.values_list('id', 'product_name').iterator():
+        index.add('product', pk, name)
+    return index
+
+
+def get_index():
+    global _index
+    index = _index
+    if index is None or time.monotonic() - index.built_at > settings.AUTOCOMPLETE_MAX_AGE:
+        with _build_lock:
+            if _index is index:
+                _index = build_index()
+            index = _index
+    return index
+
+
+def current_index():
+    """
+    Индекс, если он уже построен в этом процессе (для сигналов: не строим его ради одной записи).
+    """
+    return _index
+
+
+def _warm():
+    try:
+        get_index()
+    except DatabaseError:
+        # БД ещё не готова (миграции не применены) — индекс построится при первом запросе
+        logger.warning("Индекс автодополнения не построен при старте", exc_info=True)
+    finally:
+        connection.close()
+
+
+def warm_index():
+    # uvicorn импортирует приложение уже внутри event loop, где ORM запрещён, — строим в отдельном потоке
+    thread = threading.Thread(target=_warm)
+    thread.start()
+    thread.join()
@@ -0,0 +1,63 @@
+from django.db import transaction
+from django.db.models import Case, F, When
+
+from .models import CartItem
+
+
+def collapse_operations(operations):
+    """
+    Сворачивает список операций над корзиной в одно итоговое действие на товар.
+
+    Результат: {product_id: ('add', n)} — прибавить n к текущему количеству,
+    или {product_id: ('set', n)} — выставить ровно n (0 — удалить позицию).
+    """
+    result = {}
+    for operation in operations:
+        product_id = operation['product_id']
+        op = operation['op']
+        if op == 'remove':
+            result[product_id] = ('set', 0)
+        elif op == 'set':
+            result[product_id] = ('set', operation['quantity'])
+        else:
+            kind, current = result.get(product_id, ('add', 0))
+            result[product_id] = (kind, current + operation['quantity'])
+    return result
+
+
+@transaction.atomic
+def apply_cart_operations(cart, operations):
+    """
+    Применяет операции add/set/remove к корзине в одной транзакции.
+
+    Независимо от числа операций это не больше четырёх запросов: удаление,
+    upsert абсолютных значений, вставка недостающих строк и атомарный
+    инкремент через F(), поэтому параллельные добавления не теряются.
+    """
+    actions = collapse_operations(operations)
+    to_remove = [pk for pk, (kind, qty) in actions.items() if kind == 'set' and qty == 0]
+    to_set = {pk: qty for pk, (kind, qty) in actions.items() if kind == 'set' and qty > 0}
+    to_add = {pk: qty for pk, (kind, qty) in actions.items() if kind == 'add' and qty > 0}
+
+    if to_remove:
+        CartItem.objects.filter(cart=cart, product_id__in=to_remove).delete()
+
+    if to_set:
+        CartItem.objects.bulk_create(
+            [CartItem(cart=cart, product_id=pk, quantity=qty) for pk, qty in to_set.items()],
+            update_conflicts=True,
+            unique_fields=['cart', 'product'],
+            update_fields=['quantity'],
+        )
+
+    if to_add:
+        CartItem.objects.bulk_create(
+            [CartItem(cart=cart, product_id=pk, quantity=0) for pk in to_add],
+            ignore_conflicts=True,
+        )
+        CartItem.objects.filter(cart=cart, product_id__in=to_add).update(
+            quantity=F('quantity') + Case(
+                *[When(product_id=pk, then=qty) for pk, qty in to_add.items()],
+                default=0,
+            )
+        )
@@ -0,0 +1,174 @@
+"""
+Колоночный снимок каталога для фильтров и сортировки списка товаров.
+
+Снимок — структурированный массив NumPy в файле CATALOG_SNAPSHOT_FILE
+(формат .npy). Рабочие процессы открывают его через mmap, поэтому данные
+лежат в памяти один раз на машину, а не в каждом процессе. Запись идёт под
+flock: изменения товара, акции или отзыва патчат строки на месте, новые и
+удалённые товары приводят к пересборке файла (атомарная замена через rename).
+"""
+import fcntl
+import os
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+from .models import Product
+
+SNAPSHOT_DTYPE = np.dtype([
+    ('id', 'i8'),
+    ('category', 'i8'),
+    ('subcategory', 'i8'),
+    ('store', 'i8'),  # -1 — товар без магазина
+    ('price', 'i4'),
+    ('effective_price', 'i4'),  # цена с учётом самой большой активной скидки
+    ('stock', 'i4'),
+    ('rating', 'f8'),  # 0 — нет отзывов, как avg_rating в API
+    ('popularity', 'i8'),
+    ('created_at', 'i8'),  # микросекунды от эпохи
+])
+
+# ?ordering= -> колонка снимка; в БД это одноимённые поля Product с индексом (field, id)
+ORDERING_COLUMNS = {
+    'id': 'id',
+    'price': 'price',
+    'effective_price': 'effective_price',
+    'created_at': 'created_at',
+    'rating': 'rating',
+    'popularity': 'popularity',
+}
+
+
+def catalog_rows(product_ids=None):
+    queryset = Product.objects.all()
+    if product_ids is not None:
+        queryset = queryset.filter(pk__in=product_ids)
+    rows = queryset.values_list(
+        'id', 'category_id', 'subcategory_id', 'store_id', 'price', 'effective_price', 'quantity',
+        'rating', 'popularity', 'created_at',
+    ).order_by('id')
+    return np.array(
+        [(pk, category, subcategory, -1 if store is None else store, *values, int(created_at.timestamp()) * 1_000_000 + created_at.microsecond)
+         for pk, category, subcategory, store, *values, created_at in rows],
+        dtype=SNAPSHOT_DTYPE,
+    )
+
+
+def snapshot_path():
+    return Path(settings.CATALOG_SNAPSHOT_FILE)
+
+
+@contextmanager
+def write_lock():
+    path = snapshot_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path.with_suffix('.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _write(data):
+    path = snapshot_path()
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp, 'wb') as f:
+        np.save(f, data)
+    os.replace(tmp, path)
+
+
+def build_snapshot():
+    with write_lock():
+        data = catalog_rows()
+        _write(data)
+    return len(data)
+
+
+def patch_snapshot(product_ids):
+    """
+    Обновляет строки товаров на месте. Если товара нет в снимке (новый) или
+    его больше нет в БД (удалён), снимок пересобирается целиком.
+    """
+    product_ids = sorted(set(product_ids))
+    if not product_ids:
+        return
+    with write_lock():
+        try:
+            data = np.load(snapshot_path(), mmap_mode='r+')
+        except FileNotFoundError:
+            _write(catalog_rows())
+            return
+        rows = catalog_rows(product_ids)
+        positions = np.searchsorted(data['id'], rows['id'])
+        if len(rows) != len(product_ids) or (positions >= len(data)).any() or (data['id'][positions] != rows['id']).any():
+            del data
+            _write(catalog_rows())
+            return
+        data[positions] = rows
+        data.flush()
+
+
+class CatalogSnapshot:
+    """
+    Читатель снимка в процессе: держит mmap и переоткрывает его, когда файл заменён.
+    """
+
+    def __init__(self):
+        self.data = None
+        self.version = None
+
+    def load(self):
+        path = snapshot_path()
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            build_snapshot()
+            stat = path.stat()
+        version = (stat.st_ino, stat.st_mtime_ns)
+        if version != self.version:
+            data = np.load(path, mmap_mode='r')
+            if data.dtype != SNAPSHOT_DTYPE:
+                # файл от предыдущей версии кода
+                build_snapshot()
+                return self.load()
+            self.data, self.version = data, version
+        return self.data
+
+    def select(self, category=None, subcategory=None, store=None, min_price=None, max_price=None,
+               min_rating=None, in_stock=None, ordering=None):
+        """
+        id товаров, прошедших фильтры, в порядке ordering (при равенстве — по id).
+        """
+        data = self.load()
+        mask = np.ones(len(data), dtype=bool)
+        for column, value in (('category', category), ('subcategory', subcategory), ('store', store)):
+            if value is not None:
+                mask &= data[column] == int(value)
+        if min_price is not None:
+            mask &= data['effective_price'] >= float(min_price)
+        if max_price is not None:
+            mask &= data['effective_price'] <= float(max_price)
+        if min_rating is not None:
+            mask &= data['rating'] >= float(min_rating)
+        if in_stock is not None:
+            mask &= (data['stock'] > 0) == in_stock
+        selected = data[mask]
+
+        ids = selected['id']
+        if ordering and ordering.lstrip('-') != 'id':
+            # lexsort: последний ключ главный, id — при равенстве (в ту же сторону, как индекс (field, id))
+            keys = selected[ORDERING_COLUMNS[ordering.lstrip('-')]]
+            ids = ids[np.lexsort((ids, keys))]
+        if ordering and ordering.startswith('-'):
+            ids = ids[::-1]
+        return ids
+
+
+_snapshot = CatalogSnapshot()
+
+
+def get_snapshot():
+    return _snapshot
@@ -0,0 +1,144 @@
+import asyncio
+import atexit
+import json
+import os
+import socket
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+
+class LocalBroker:
+    """
+    Pub/sub в памяти одного процесса: user_id -> очереди открытых SSE-подключений.
+
+    subscribe/unsubscribe вызываются из event loop, publish — из любого потока
+    (синхронные view под ASGI работают в отдельном потоке).
+    """
+    queue_size = 100
+
+    def __init__(self):
+        self.subscribers = {}
+        self.loop = None
+
+    def subscribe(self, user_id):
+        self.loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self.subscribers.setdefault(user_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, user_id, queue):
+        queues = self.subscribers.get(user_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self.subscribers[user_id]
+
+    def publish(self, user_id, message):
+        self.deliver(user_id, message)
+
+    def deliver(self, user_id, message):
+        loop = self.loop
+        if loop is None or loop.is_closed():
+            return
+        loop.call_soon_threadsafe(self._put, user_id, message)
+
+    def _put(self, user_id, message):
+        for queue in self.subscribers.get(user_id, ()):
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # клиент не успевает читать: он догонит пропущенное по Last-Event-ID
+                pass
+
+
+class UnixSocketBroker(LocalBroker):
+    """
+    Раздаёт события всем рабочим процессам на одной машине без внешних сервисов.
+
+    Каждый процесс с подписчиками слушает свой unix datagram-сокет в
+    ORDER_EVENTS_SOCKET_DIR, publish отправляет сообщение во все сокеты каталога.
+    Сокеты завершившихся процессов удаляются при первой неудачной отправке.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.directory = Path(settings.ORDER_EVENTS_SOCKET_DIR)
+        self.path = self.directory / f"{os.getpid()}-{uuid.uuid4().hex[:8]}.sock"
+        self.sock = None
+
+    def subscribe(self, user_id):
+        if self.sock is None:
+            self.listen()
+        return super().subscribe(user_id)
+
+    def listen(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sock.bind(str(self.path))
+        sock.setblocking(False)
+        asyncio.get_running_loop().add_reader(sock.fileno(), self.on_readable)
+        atexit.register(self.path.unlink, missing_ok=True)
+        self.sock = sock
+
+    def on_readable(self):
+        while True:
+            try:
+                data = self.sock.recv(65536)
+            except BlockingIOError:
+                return
+            payload = json.loads(data)
+            self._put(payload['user'], payload['message'])
+
+    def publish(self, user_id, message):
+        data = json.dumps({'user': user_id, 'message': message}).encode()
+        sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sender.setblocking(False)
+        try:
+            for path in self.directory.glob('*.sock'):
+                try:
+                    sender.sendto(data, str(path))
+                except (ConnectionRefusedError, FileNotFoundError):
+                    path.unlink(missing_ok=True)
+                except BlockingIOError:
+                    pass
+        finally:
+            sender.close()
+
+
+_broker = None
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        _broker = import_string(settings.ORDER_EVENTS_BROKER)()
+    return _broker
+
+
+def order_event_message(event):
+    return {
+        'id': event.id,
+        'order': event.order_id,
+        'from_status': event.from_status,
+        'to_status': event.to_status,
+        'created_at': event.created_at.isoformat(),
+    }
+
+
+def notify_order_events(events, user_ids):
+    """
+    Публикует записи OrderEvent владельцам заказов после коммита транзакции.
+    user_ids: {order_id: user_id}.
+    """
+    messages = [(user_ids[event.order_id], order_event_message(event)) for event in events]
+
+    def send():
+        broker = get_broker()
+        for user_id, message in messages:
+            broker.publish(user_id, message)
+
+    transaction.on_commit(send)
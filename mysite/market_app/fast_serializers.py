@@ -0,0 +1,178 @@
+from django.core.files.storage import default_storage
+from rest_framework import serializers
+
+from .models import SubCategory, active_discounts
+from .serializers import CartItemDetailSerializer, CategorySerializer, ProductListSerializers, SaleSerializers
+
+
+class RowSerializer:
+    """
+    Быстрый путь для списков: повторяет вывод DRF-сериализатора байт-в-байт,
+    но собирает словари прямо из .values(), без создания моделей и вложенных
+    сериализаторов на каждую строку.
+
+    План полей компилируется один раз на запрос из serializer_class.fields,
+    вложенные объекты (категории, подкатегории) сериализуются один раз на id.
+    Учитывает ?fields= и ?expand= так же, как и обычный сериализатор.
+    """
+    serializer_class = None
+    nested_querysets = {}  # имя вложенного поля -> queryset для его объектов (по умолчанию все объекты модели)
+
+    def __init__(self, context=None):
+        self.context = context or {}
+        self.request = self.context.get('request')
+        self.fields = self.serializer_class(context=self.context).fields
+        # ?fields= / ?expand= относятся только к верхнему уровню
+        self.nested_context = {k: v for k, v in self.context.items() if k not in ('fields', 'expand')}
+
+    def computed_fields(self):
+        """
+        {имя поля: (колонки для values(), функция(row))} для SerializerMethodField и свойств модели.
+        """
+        return {}
+
+    def file_url(self, name):
+        if not name:
+            return None
+        url = default_storage.url(name)
+        if self.request is not None:
+            return self.request.build_absolute_uri(url)
+        return url
+
+    def converter(self, field):
+        # поля, где to_representation реально меняет значение из БД
+        if isinstance(field, serializers.FileField):
+            return self.file_url
+        if isinstance(field, (serializers.DecimalField, serializers.DateTimeField,
+                              serializers.DateField, serializers.TimeField)):
+            return field.to_representation
+        return None
+
+    def compile(self):
+        computed = self.computed_fields()
+        plan, columns = [], []
+        for name, field in self.fields.items():
+            if field.write_only:
+                continue
+            if name in computed:
+                needed, func = computed[name]
+                columns.extend(c for c in needed if c not in columns)
+                plan.append((name, None, func, None))
+                continue
+            column = '__'.join(field.source_attrs)
+            if column not in columns:
+                columns.append(column)
+            nested = name if isinstance(field, serializers.Serializer) else None
+            plan.append((name, column, self.converter(field), nested))
+        return plan, columns
+
+    def nested_lookup(self, name, ids):
+        field = self.fields[name]
+        queryset = self.nested_querysets.get(name, field.Meta.model._default_manager.all())
+        serializer_class = type(field)
+        return {obj.pk: serializer_class(obj, context=self.nested_context).data for obj in queryset.filter(pk__in=ids)}
+
+    def serialize(self, queryset, order=None):
+        """
+        order — список pk, в порядке которого вернуть строки (например, из снимка каталога).
+        """
+        plan, columns = self.compile()
+        if order is not None:
+            rows = list(queryset.values('pk', *columns))
+            position = {pk: i for i, pk in enumerate(order)}
+            rows.sort(key=lambda row: position[row['pk']])
+        else:
+            rows = list(queryset.values(*columns))
+
+        lookups = {}
+        for name, column, _, nested in plan:
+            if nested:
+                ids = {row[column] for row in rows if row[column] is not None}
+                lookups[name] = self.nested_lookup(name, ids)
+
+        data = []
+        for row in rows:
+            item = {}
+            for name, column, func, nested in plan:
+                if column is None:
+                    item[name] = func(row)
+                    continue
+                value = row[column]
+                if value is None:
+                    item[name] = None
+                elif nested:
+                    item[name] = lookups[nested][value]
+                elif func is not None:
+                    item[name] = func(value)
+                else:
+                    item[name] = value
+            data.append(item)
+        return data
+
+
+class CategoryRowSerializer(RowSerializer):
+    serializer_class = CategorySerializer
+
+
+class ProductRowSerializer(RowSerializer):
+    """
+    Ожидает queryset, собранный через with_rating() и with_favorited() (если эти поля запрошены).
+    """
+    serializer_class = ProductListSerializers
+    nested_querysets = {
+        'subcategory': SubCategory.objects.select_related('category'),
+    }
+
+    def computed_fields(self):
+        return {
+            'avg_rating': (['rating_avg'], lambda row: round(row['rating_avg'], 1) if row['rating_avg'] else 0.0),
+            'is_favorited': (['is_favorited'], lambda row: row['is_favorited']),
+        }
+
+
+class SaleRowSerializer(RowSerializer):
+    serializer_class = SaleSerializers
+
+    def computed_fields(self):
+        def discounted_price(row):
+            # та же формула, что и Sale.discounted_price
+            price = row['product__price']
+            if row['discount_percent'] and price:
+                return price * (100 - row['discount_percent']) // 100
+            return price
+
+        return {
+            'discounted_price': (['discount_percent', 'product__price'], discounted_price),
+            'is_currently_active': (['is_active'], lambda row: row['is_active']),
+        }
+
+
+class CartItemRowSerializer(RowSerializer):
+    serializer_class = CartItemDetailSerializer
+
+    def __init__(self, context=None, discounts=None):
+        super().__init__(context)
+        self.discounts = discounts or {}  # {product_id: скидка, %} — как в CartItem.total_price
+
+    def computed_fields(self):
+        def total_price(row):
+            price = row['product__price'] * (100 - self.discounts.get(row['product'], 0)) // 100
+            return price * row['quantity']
+
+        return {
+            'total_price': (['product', 'product__price', 'quantity'], total_price),
+        }
+
+
+def serialize_cart(cart, context):
+    """
+    Быстрый аналог CartDetailSerializer(cart).data.
+    """
+    discounts = active_discounts(cart.items.values('product_id'))
+    items = CartItemRowSerializer(context, discounts).serialize(cart.items.all())
+    return {
+        'id': cart.id,
+        'user': cart.user_id,
+        'items': items,
+        'total_price': sum(item['total_price'] for item in items),
+    }
@@ -0,0 +1,93 @@
+import re
+
+import django_filters
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+
+from .catalog import ORDERING_COLUMNS
+from .models import DELIVERY_STATUS_CHOICES, ROLE_CHOICES, OrderItem, Product, UserProfile
+
+
+class ProductFilter(django_filters.FilterSet):
+    """
+    Фильтры и сортировка списка товаров через БД. Те же параметры умеет
+    обрабатывать колоночный снимок каталога (market_app.catalog), результат совпадает.
+    """
+    category = django_filters.NumberFilter(field_name='category')
+    subcategory = django_filters.NumberFilter(field_name='subcategory')
+    store = django_filters.NumberFilter(field_name='store')
+    min_price = django_filters.NumberFilter(field_name='effective_price', lookup_expr='gte')
+    max_price = django_filters.NumberFilter(field_name='effective_price', lookup_expr='lte')
+    min_rating = django_filters.NumberFilter(field_name='rating', lookup_expr='gte')
+    in_stock = django_filters.BooleanFilter(method='filter_in_stock')
+    ordering = django_filters.CharFilter(method='filter_ordering')
+
+    class Meta:
+        model = Product
+        fields = []
+
+    def filter_in_stock(self, queryset, name, value):
+        return queryset.filter(quantity__gt=0) if value else queryset.filter(quantity=0)
+
+    def filter_ordering(self, queryset, name, value):
+        column = ORDERING_COLUMNS.get(value.lstrip('-'))
+        if column is None:
+            raise ValidationError({'ordering': f"Допустимые значения: {', '.join(ORDERING_COLUMNS)}, с '-' — по убыванию."})
+        # id вторым ключом в ту же сторону: порядок стабилен, читается по индексу (field, id)
+        # и совпадает со снимком каталога
+        if value.startswith('-'):
+            return queryset.order_by(f"-{column}", '-id')
+        return queryset.order_by(column, 'id')
+
+    def snapshot_params(self):
+        """
+        Заданные параметры в виде аргументов CatalogSnapshot.select, None — если их нет.
+        """
+        if not self.is_valid():
+            return None
+        params = {name: value for name, value in self.form.cleaned_data.items() if value not in (None, '')}
+        if 'ordering' in params and params['ordering'].lstrip('-') not in ORDERING_COLUMNS:
+            return None  # ошибку вернёт filter_ordering
+        return params or None
+
+
+class UserDirectoryFilter(django_filters.FilterSet):
+    """
+    ?role= и ?q= — поиск по началу username, email или телефона. Поиск с учётом
+    регистра: так LIKE 'x%' читается по индексу.
+    """
+    role = django_filters.ChoiceFilter(choices=ROLE_CHOICES)
+    q = django_filters.CharFilter(method='filter_prefix')
+
+    class Meta:
+        model = UserProfile
+        fields = []
+
+    def filter_prefix(self, queryset, name, value):
+        value = value.strip()
+        if not value:
+            return queryset
+        condition = Q(username__startswith=value) | Q(email__startswith=value)
+        phone = re.sub(r'[\s()-]', '', value)
+        if re.fullmatch(r'\+?\d+', phone):
+            # номера хранятся в E.164: +996...
+            condition |= Q(phone_number__startswith=phone if phone.startswith('+') else f"+{phone}")
+        return queryset.filter(condition)
+
+
+class SellerInboxFilter(django_filters.FilterSet):
+    """
+    ?status= (по умолчанию «В обработке» — ещё не отправленные) и ?store= — один
+    из магазинов продавца.
+    """
+    status = django_filters.ChoiceFilter(field_name='order_status', choices=DELIVERY_STATUS_CHOICES)
+    store = django_filters.NumberFilter(field_name='store_id')
+
+    class Meta:
+        model = OrderItem
+        fields = []
+
+    def filter_queryset(self, queryset):
+        if not self.form.cleaned_data.get('status'):
+            queryset = queryset.filter(order_status=OrderItem._meta.get_field('order_status').default)
+        return super().filter_queryset(queryset)
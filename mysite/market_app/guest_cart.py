@@ -0,0 +1,111 @@
+"""
+Корзина гостя: пары (товар, количество) в подписанной cookie, без строк в БД.
+
+Анонимные запросы к /cart/... читают и переписывают cookie, ничего не
+записывая в базу. При входе или регистрации корзина гостя переносится в Cart
+пользователя одним apply_cart_operations (bulk upsert), cookie удаляется.
+"""
+from django.conf import settings
+from django.core import signing
+from rest_framework import serializers
+
+from .cart import apply_cart_operations, collapse_operations
+from .models import Cart, CartItem, Product, with_discounts
+from .serializers import CartItemDetailSerializer
+
+SALT = 'market_app.guest_cart'
+
+
+def read_guest_cart(request):
+    """
+    {product_id: количество}; поддельная, испорченная или истёкшая cookie — пустая корзина.
+    """
+    raw = request.COOKIES.get(settings.GUEST_CART_COOKIE)
+    if not raw:
+        return {}
+    try:
+        pairs = signing.loads(raw, salt=SALT, max_age=settings.GUEST_CART_MAX_AGE)
+        return {int(product_id): int(quantity) for product_id, quantity in pairs if int(quantity) > 0}
+    except (signing.BadSignature, TypeError, ValueError):
+        return {}
+
+
+def write_guest_cart(response, items):
+    if not items:
+        response.delete_cookie(settings.GUEST_CART_COOKIE, samesite='Lax')
+        return
+    response.set_cookie(
+        settings.GUEST_CART_COOKIE, signing.dumps(sorted(items.items()), salt=SALT, compress=True),
+        max_age=settings.GUEST_CART_MAX_AGE, httponly=True, samesite='Lax',
+        secure=settings.SESSION_COOKIE_SECURE,
+    )
+
+
+def apply_guest_operations(items, operations):
+    """
+    То же, что apply_cart_operations, для корзины гостя. Возвращает новую корзину.
+    """
+    items = dict(items)
+    for product_id, (kind, quantity) in collapse_operations(operations).items():
+        if kind == 'add':
+            quantity += items.get(product_id, 0)
+        if quantity > 0:
+            items[product_id] = quantity
+        else:
+            items.pop(product_id, None)
+    if len(items) > settings.GUEST_CART_MAX_ITEMS:
+        # cookie ограничена ~4 КБ
+        raise serializers.ValidationError(
+            f"В корзине без входа не больше {settings.GUEST_CART_MAX_ITEMS} товаров, войдите в аккаунт"
+        )
+    return items
+
+
+def guest_cart_data(items, context):
+    """
+    Корзина гостя в формате CartDetailSerializer (id и user — null).
+    """
+    products = Product.objects.in_bulk(items)
+    rows = with_discounts([CartItem(product=products[pk], quantity=quantity)
+                           for pk, quantity in items.items() if pk in products])
+    data = CartItemDetailSerializer(rows, many=True, context=context).data
+    return {'id': None, 'user': None, 'items': data, 'total_price': sum(item['total_price'] for item in data)}
+
+
+def merge_guest_cart(request, user):
+    """
+    Добавляет корзину гостя к корзине user. True, если было что переносить
+    (тогда cookie нужно удалить).
+    """
+    items = read_guest_cart(request)
+    if not items:
+        return False
+    existing = Product.objects.filter(pk__in=items).values_list('pk', flat=True)
+    operations = [{'op': 'add', 'product_id': pk, 'quantity': items[pk]} for pk in existing]
+    if operations:
+        cart, _ = Cart.objects.get_or_create(user=user)
+        apply_cart_operations(cart, operations)
+    return True
+
+
+class GuestCartMixin:
+    """
+    Корзина анонимного запроса: guest_items() читает cookie, после
+    save_guest_items() новая корзина уходит в ответе.
+    """
+    guest_cart = None
+
+    def is_guest(self):
+        return not self.request.user.is_authenticated
+
+    def guest_items(self):
+        return read_guest_cart(self.request)
+
+    def save_guest_items(self, items):
+        self.guest_cart = items
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if self.guest_cart is not None:
+            write_guest_cart(response, self.guest_cart)
+        return response
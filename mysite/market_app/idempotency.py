@@ -0,0 +1,92 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import status
+from rest_framework.response import Response
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+
+
+def idempotency_cache():
+    return caches[settings.IDEMPOTENCY_CACHE]
+
+
+def request_fingerprint(request):
+    """
+    Хэш тела запроса: тот же ключ с другими данными — ошибка клиента, а не повтор.
+    """
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(f"{request.method}:{request.path}:{body}".encode()).hexdigest()
+
+
+def replay(stored):
+    response = Response(stored['data'], status=stored['status'], headers=stored['headers'])
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def run_idempotent(request, key, handler):
+    """
+    Выполняет handler() один раз на (пользователь, путь, ключ) и сохраняет ответ на
+    IDEMPOTENCY_KEY_TTL секунд; повторы получают сохранённый ответ без выполнения.
+
+    Параллельный дубль не выполняется вторым: пока первый запрос не закончил, он сразу
+    получает 409 с Retry-After, а повтор после — сохранённый ответ. Ждать в view нельзя:
+    под ASGI синхронные view процесса делят один поток, и ожидание остановило бы их все.
+    Ответы 5xx не сохраняются — такой запрос можно повторить.
+    """
+    cache = idempotency_cache()
+    scope = hashlib.sha256(f"{request.user.pk}:{request.path}:{key}".encode()).hexdigest()
+    result_key = f"idempotency:{scope}"
+    lock_key = f"{result_key}:lock"
+    fingerprint = request_fingerprint(request)
+
+    if not cache.add(lock_key, fingerprint, timeout=settings.IDEMPOTENCY_LOCK_TIMEOUT):
+        stored = cache.get(result_key)
+        if stored is None:
+            return Response({"detail": "Запрос с этим Idempotency-Key ещё выполняется."},
+                            status=status.HTTP_409_CONFLICT,
+                            headers={'Retry-After': str(settings.IDEMPOTENCY_RETRY_AFTER)})
+    else:
+        stored = cache.get(result_key)
+        if stored is None:
+            try:
+                response = handler()
+                if response.status_code < 500:
+                    headers = {name: response[name] for name in ('Location',) if response.has_header(name)}
+                    cache.set(result_key, {
+                        'fingerprint': fingerprint,
+                        'status': response.status_code,
+                        'data': response.data,
+                        'headers': headers,
+                    }, timeout=settings.IDEMPOTENCY_KEY_TTL)
+                return response
+            finally:
+                cache.delete(lock_key)
+        cache.delete(lock_key)
+
+    if stored['fingerprint'] != fingerprint:
+        return Response({"detail": "Idempotency-Key уже использован с другими данными."},
+                        status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+    return replay(stored)
+
+
+class IdempotentPostMixin:
+    """
+    Поддержка заголовка Idempotency-Key для POST: повтор того же запроса
+    (сеть оборвалась, клиент переотправил) не выполняет запись второй раз.
+    Без заголовка запрос обрабатывается как обычно.
+    """
+
+    def post(self, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        # у гостя нет ключа пользователя, а его корзина приходит в cookie запроса:
+        # повтор с той же cookie и так даёт тот же результат
+        if not key or not request.user.is_authenticated:
+            return super().post(request, *args, **kwargs)
+        if len(key) > 255:
+            return Response({"detail": "Idempotency-Key длиннее 255 символов."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return run_idempotent(request, key, lambda: super(IdempotentPostMixin, self).post(request, *args, **kwargs))
@@ -0,0 +1,281 @@
+"""
+Нагрузочный тест: сценарии пользователей, локальный SMTP-приёмник и статистика.
+
+Запускается командой load_test: она поднимает проект (uvicorn) на отдельной
+засеянной базе, подставляет SMTP-приёмник вместо smtp.gmail.com и гоняет
+параллельные асинхронные клиенты по взвешенным сценариям.
+"""
+import asyncio
+import random
+import time
+import uuid
+from collections import defaultdict
+
+import httpx
+
+SEARCH_WORDS = [
+    'молоко', 'мёд', 'халва', 'хлеб', 'сыр', 'курица', 'говядина', 'баранина', 'рис', 'чай',
+    'кофе', 'шоколад', 'масло', 'финики', 'орехи', 'колбаса', 'йогурт', 'сметана', 'изюм', 'лепёшка',
+]
+PASSWORD = 'load-test-password'
+
+
+def user_email(i):
+    return f"load{i}@example.com"
+
+
+def seed(users=200, products=2000):
+    """
+    Засевает пустую базу: пользователи (с одинаковым паролем PASSWORD), категории,
+    магазин и товары со словами из SEARCH_WORDS в названиях.
+    """
+    from django.contrib.auth.hashers import make_password
+
+    from .models import Category, Product, Store, SubCategory, UserProfile
+
+    rnd = random.Random(0)
+    password = make_password(PASSWORD)  # хэш один на всех: сидирование не должно занимать минуты
+    accounts = UserProfile.objects.bulk_create([
+        UserProfile(username=f"load{i}", email=user_email(i), password=password,
+                    phone_number=f"+99670{i:07d}", address='Бишкек')
+        for i in range(users)
+    ])
+    categories = Category.objects.bulk_create([Category(category_name=f"Категория {i}") for i in range(8)])
+    subcategories = SubCategory.objects.bulk_create([
+        SubCategory(category=category, subcategory_name=f"{category.category_name}.{j}")
+        for category in categories for j in range(3)
+    ])
+    store = Store.objects.create(owner=accounts[0], store_name='Нагрузка', category=categories[0],
+                                 subcategory=subcategories[0])
+    Product.objects.bulk_create([
+        Product(
+            store=store, category=sub.category, subcategory=sub,
+            product_name=' '.join(rnd.sample(SEARCH_WORDS, 2))[:28] + f" {i}",
+            description='', price=price, effective_price=price, weight=1, quantity=rnd.randint(0, 50),
+            composition='', action='', expiration_date='', equipment='', product_code=str(i),
+        )
+        for i, sub, price in ((i, rnd.choice(subcategories), rnd.randint(50, 3000)) for i in range(products))
+    ])
+
+
+class SmtpSink:
+    """
+    Минимальный SMTP-сервер, который принимает любые письма и только считает их.
+    Поддерживает EHLO/HELO, AUTH PLAIN (Django логинится, если задан EMAIL_HOST_USER),
+    MAIL, RCPT, DATA, RSET, NOOP, QUIT.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0):
+        self.host, self.port = host, port
+        self.messages = 0
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def handle(self, reader, writer):
+        def reply(line):
+            writer.write(f"{line}\r\n".encode())
+
+        reply("220 load-test SMTP sink")
+        try:
+            while line := await reader.readline():
+                command = line.decode(errors='replace').strip()
+                verb = command.split(' ', 1)[0].upper()
+                if verb == 'EHLO':
+                    reply("250-load-test")
+                    reply("250-AUTH PLAIN")
+                    reply("250 8BITMIME")
+                elif verb == 'AUTH':
+                    if len(command.split()) < 3:
+                        # логин/пароль придут следующей строкой; проверять их незачем
+                        reply("334 ")
+                        await writer.drain()
+                        await reader.readline()
+                    reply("235 2.7.0 Authentication successful")
+                elif verb == 'DATA':
+                    reply("354 End data with <CR><LF>.<CR><LF>")
+                    await writer.drain()
+                    while await reader.readline() not in (b'.\r\n', b'.\n', b''):
+                        pass
+                    self.messages += 1
+                    reply("250 OK")
+                elif verb == 'QUIT':
+                    reply("221 Bye")
+                    break
+                else:  # HELO, MAIL, RCPT, RSET, NOOP
+                    reply("250 OK")
+                await writer.drain()
+        finally:
+            writer.close()
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(q / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class LoadStats:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+
+    def record(self, name, status, latency):
+        self.latencies[name].append(latency)
+        self.statuses[name][status] += 1
+        if status == 'error' or status >= 400:
+            self.errors[name] += 1
+
+    def report(self, duration):
+        endpoints = {}
+        total = errors = 0
+        for name in sorted(self.latencies):
+            values = sorted(self.latencies[name])
+            total += len(values)
+            errors += self.errors[name]
+            endpoints[name] = {
+                'requests': len(values),
+                'errors': self.errors[name],
+                'error_rate': round(self.errors[name] / len(values), 4),
+                'rps': round(len(values) / duration, 2),
+                'p50_ms': round(percentile(values, 50) * 1000, 2),
+                'p95_ms': round(percentile(values, 95) * 1000, 2),
+                'p99_ms': round(percentile(values, 99) * 1000, 2),
+                'max_ms': round(values[-1] * 1000, 2),
+                'statuses': {str(status): count for status, count in self.statuses[name].items()},
+            }
+        return {
+            'duration_s': round(duration, 2),
+            'requests': total,
+            'errors': errors,
+            'error_rate': round(errors / total, 4) if total else 0,
+            'throughput_rps': round(total / duration, 2),
+            'endpoints': endpoints,
+        }
+
+
+class VirtualUser:
+    """
+    Один клиент: свой аккаунт, JWT и keep-alive соединение. Сценарии — цепочки
+    запросов, которые делает живой покупатель.
+    """
+
+    def __init__(self, client, stats, index, product_ids, rnd):
+        self.client = client
+        self.stats = stats
+        self.index = index
+        self.product_ids = product_ids
+        self.rnd = rnd
+        self.token = None
+
+    async def request(self, name, method, url, **kwargs):
+        headers = kwargs.pop('headers', {})
+        if self.token:
+            headers['Authorization'] = f"Bearer {self.token}"
+        start = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, headers=headers, **kwargs)
+        except httpx.HTTPError:
+            self.stats.record(name, 'error', time.perf_counter() - start)
+            return None
+        self.stats.record(name, response.status_code, time.perf_counter() - start)
+        return response
+
+    def product_id(self):
+        return self.rnd.choice(self.product_ids)
+
+    async def login(self):
+        response = await self.request('POST /login/', 'POST', '/login/',
+                                      json={'email': user_email(self.index), 'password': PASSWORD})
+        if response is not None and response.status_code == 200:
+            self.token = response.json()['access']
+
+    async def browse(self):
+        await self.request('GET /category', 'GET', '/category')
+        ordering = self.rnd.choice(['-popularity', 'price', '-rating', '-created_at'])
+        await self.request('GET /product?ordering=', 'GET', '/product',
+                           params={'ordering': ordering, 'limit': 20, 'offset': self.rnd.randint(0, 5) * 20})
+        for _ in range(2):
+            await self.request('GET /product/<pk>/', 'GET', f"/product/{self.product_id()}/")
+
+    async def search(self):
+        word = self.rnd.choice(SEARCH_WORDS)
+        for length in range(1, min(len(word), 5) + 1):  # как при наборе в строке поиска
+            await self.request('GET /product/autocomplete/', 'GET', '/product/autocomplete/',
+                               params={'q': word[:length]})
+        await self.request('GET /product?search=', 'GET', '/product', params={'search': word, 'limit': 20})
+
+    async def cart(self):
+        for _ in range(self.rnd.randint(1, 3)):
+            await self.request('POST /cart/add/', 'POST', '/cart/add/',
+                               json={'product_id': self.product_id(), 'quantity': self.rnd.randint(1, 3)})
+        await self.request('GET /cart/', 'GET', '/cart/')
+
+    async def checkout(self):
+        await self.request('POST /cart/add/', 'POST', '/cart/add/', json={'product_id': self.product_id()})
+        key = uuid.uuid4().hex
+        for _ in range(self.rnd.choice([1, 1, 1, 2])):  # иногда клиент повторяет запрос
+            await self.request('POST /orders/from-cart/', 'POST', '/orders/from-cart/', json={},
+                               headers={'Idempotency-Key': key})
+        await self.request('GET /orders/', 'GET', '/orders/')
+
+    async def review(self):
+        await self.request('POST /reviews/', 'POST', '/reviews/',
+                           json={'product': self.product_id(), 'rating': self.rnd.randint(1, 5), 'comment': 'ok'})
+
+    async def login_storm(self):
+        await self.login()
+
+    async def password_reset(self):
+        # письмо уходит в SMTP-приёмник
+        await self.request('POST /password_reset/', 'POST', '/password_reset/', json={'email': user_email(self.index)})
+
+
+JOURNEYS = {
+    'browse': 40,
+    'search': 25,
+    'cart': 15,
+    'checkout': 8,
+    'review': 5,
+    'login_storm': 5,
+    'password_reset': 2,
+}
+
+
+async def run_user(base_url, stats, index, accounts, product_ids, deadline, journeys, think_time):
+    rnd = random.Random(index)
+    names, weights = zip(*journeys.items())
+    async with httpx.AsyncClient(base_url=base_url, timeout=30) as client:
+        # клиентов может быть больше, чем засеянных аккаунтов
+        user = VirtualUser(client, stats, index % accounts, product_ids, rnd)
+        await user.login()
+        while time.monotonic() < deadline:
+            await getattr(user, rnd.choices(names, weights)[0])()
+            if think_time:
+                await asyncio.sleep(rnd.uniform(0, think_time))
+
+
+async def run_load(base_url, users, duration, product_ids, accounts, journeys=None, think_time=0.0, ramp_up=0.0):
+    """
+    users параллельных клиентов в течение duration секунд, старт растянут на ramp_up
+    секунд. Клиенты входят под аккаунтами load0..load{accounts-1} из seed().
+    """
+    stats = LoadStats()
+    start = time.monotonic()
+    deadline = start + duration
+
+    async def delayed(index):
+        if ramp_up:
+            await asyncio.sleep(ramp_up * index / users)
+        await run_user(base_url, stats, index, accounts, product_ids, deadline, journeys or JOURNEYS, think_time)
+
+    await asyncio.gather(*(delayed(i) for i in range(users)))
+    return stats.report(time.monotonic() - start)
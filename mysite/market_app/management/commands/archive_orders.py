@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from market_app.archive import archive_cutoff, archive_orders
+
+
+class Command(BaseCommand):
+    help = "Переносит доставленные заказы старше ARCHIVE_ORDERS_AFTER_DAYS в архивные таблицы"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=int,
+                            help="Возраст заказа (по последней смене статуса); по умолчанию из настроек")
+        parser.add_argument('--batch-size', type=int, default=500, help="Заказов в одной транзакции")
+        parser.add_argument('--max-batches', type=int, help="Не больше стольких пакетов за проход")
+        parser.add_argument('--pause', type=float, default=0.1, help="Пауза между пакетами, секунд")
+        parser.add_argument('--every', type=float,
+                            help="Повторять проход каждые столько секунд (без него — один проход, для cron)")
+
+    def handle(self, *args, **options):
+        while True:
+            moved = archive_orders(
+                archive_cutoff(options['older_than_days']), batch_size=options['batch_size'],
+                max_batches=options['max_batches'], pause=options['pause'],
+            )
+            self.stdout.write(f"{timezone.now():%Y-%m-%d %H:%M:%S} перенесено в архив заказов: {moved}")
+            if not options['every']:
+                return
+            time.sleep(options['every'])
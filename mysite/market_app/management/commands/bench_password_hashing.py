@@ -0,0 +1,50 @@
+import asyncio
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from market_app.passwords import HashPool
+
+
+class Command(BaseCommand):
+    help = ("Замеряет хэширование пароля (PBKDF2) и пропускную способность пула; "
+            "подсказывает PASSWORD_PBKDF2_ITERATIONS под заданное время одного хэша")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target-ms', type=float, default=100, help="Желаемое время одного хэша")
+        parser.add_argument('--iterations', type=int, help="Итераций для замера (по умолчанию из настроек)")
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--burst', type=int, default=100, help="Одновременных входов для замера пула")
+
+    def single_ms(self, repeat):
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            make_password('benchmark-password')
+            samples.append((time.perf_counter() - start) * 1000)
+        return statistics.median(samples)
+
+    async def burst(self, count):
+        pool = HashPool(settings.PASSWORD_HASH_WORKERS, count)
+        start = time.perf_counter()
+        await asyncio.gather(*(pool.run(make_password, 'benchmark-password') for _ in range(count)))
+        return time.perf_counter() - start
+
+    def handle(self, *args, **options):
+        iterations = options['iterations'] or settings.PASSWORD_PBKDF2_ITERATIONS
+        with override_settings(PASSWORD_PBKDF2_ITERATIONS=iterations):
+            hash_ms = self.single_ms(options['repeat'])
+            elapsed = asyncio.run(self.burst(options['burst']))
+
+        suggested = max(100_000, int(round(iterations * options['target_ms'] / hash_ms, -4)))
+        workers = settings.PASSWORD_HASH_WORKERS
+        self.stdout.write(f"итераций {iterations}: один хэш {hash_ms:.1f} мс")
+        self.stdout.write(
+            f"пул из {workers} потоков: {options['burst']} хэшей за {elapsed:.2f} с "
+            f"({options['burst'] / elapsed:.1f}/с, последний вход ждёт {elapsed * 1000:.0f} мс)"
+        )
+        self.stdout.write(f"для ~{options['target_ms']:.0f} мс на хэш: PASSWORD_PBKDF2_ITERATIONS={suggested}")
@@ -0,0 +1,52 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from market_app.models import UserProfile
+from market_app.views import CartDetailView, CategoryAPIView, ProductListAPIView, SaleAPIView
+
+
+class Command(BaseCommand):
+    help = "Сравнивает CPU-время стандартной и быстрой сериализации горячих списков"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=50)
+        parser.add_argument('--user', help="username для эндпоинта корзины")
+
+    def render(self, view, user, fast):
+        request = APIRequestFactory().get('/', HTTP_ACCEPT='application/json')
+        if user is not None:
+            force_authenticate(request, user=user)
+        with override_settings(FAST_SERIALIZATION=fast):
+            response = view(request)
+            response.render()
+        return response.content
+
+    def measure(self, view, user, fast, repeat):
+        start = time.process_time()
+        for _ in range(repeat):
+            content = self.render(view, user, fast)
+        return (time.process_time() - start) * 1000 / repeat, content
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        user = UserProfile.objects.get(username=options['user']) if options['user'] else None
+        endpoints = [
+            ('product', ProductListAPIView.as_view()),
+            ('sale', SaleAPIView.as_view()),
+            ('category', CategoryAPIView.as_view()),
+        ]
+        if user is not None:
+            endpoints.append(('cart', CartDetailView.as_view()))
+
+        for name, view in endpoints:
+            default_ms, default_content = self.measure(view, user, False, repeat)
+            fast_ms, fast_content = self.measure(view, user, True, repeat)
+            identical = "да" if default_content == fast_content else "НЕТ"
+            saving = 100 * (1 - fast_ms / default_ms) if default_ms else 0
+            self.stdout.write(
+                f"{name:10} обычный {default_ms:8.2f} мс  быстрый {fast_ms:8.2f} мс  "
+                f"экономия {saving:5.1f}%  размер {len(default_content)} б  совпадает: {identical}"
+            )
@@ -0,0 +1,52 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# Выполняется в отдельном процессе, как холодный старт рабочего процесса gunicorn
+WORKER_SCRIPT = """
+import json, os, time
+start = time.perf_counter()
+from django.core.wsgi import get_wsgi_application
+from django.urls import get_resolver
+application = get_wsgi_application()
+get_resolver().url_patterns
+boot = time.perf_counter() - start
+
+from django.test import Client
+start = time.perf_counter()
+response = Client().get(os.environ['BENCH_PATH'])
+first = time.perf_counter() - start
+print(json.dumps({'boot_ms': boot * 1000, 'first_request_ms': first * 1000, 'status': response.status_code}))
+"""
+
+
+class Command(BaseCommand):
+    help = "Замеряет холодный старт рабочего процесса и первый запрос с документацией и без"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5)
+        parser.add_argument('--path', default='/category')
+
+    def run_worker(self, docs_enabled, path):
+        env = dict(os.environ, API_DOCS_ENABLED=str(docs_enabled), BENCH_PATH=path,
+                   DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'mysite.settings'))
+        output = subprocess.run(
+            [sys.executable, '-c', WORKER_SCRIPT], env=env, cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout
+        return json.loads(output.strip().splitlines()[-1])
+
+    def handle(self, *args, **options):
+        for docs_enabled in (True, False):
+            results = [self.run_worker(docs_enabled, options['path']) for _ in range(options['runs'])]
+            boot = statistics.median(r['boot_ms'] for r in results)
+            first = statistics.median(r['first_request_ms'] for r in results)
+            self.stdout.write(
+                f"документация {'вкл ' if docs_enabled else 'выкл'}: старт {boot:7.1f} мс, "
+                f"первый запрос {options['path']} {first:7.1f} мс (медиана из {options['runs']})"
+            )
@@ -0,0 +1,19 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Собирает схему OpenAPI в файл API_SCHEMA_FILE (запускается при деплое)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help="Куда записать схему (по умолчанию API_SCHEMA_FILE)")
+
+    def handle(self, *args, **options):
+        from mysite.docs import generate_schema  # drf_yasg нужен только здесь
+
+        output = Path(options['output'] or settings.API_SCHEMA_FILE)
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_bytes(generate_schema())
+        self.stdout.write(self.style.SUCCESS(f"Схема записана в {output}"))
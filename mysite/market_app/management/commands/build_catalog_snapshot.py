@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from market_app.catalog import build_snapshot
+
+
+class Command(BaseCommand):
+    help = "Пересобирает колоночный снимок каталога (фильтры и сортировка /product)"
+
+    def handle(self, *args, **options):
+        count = build_snapshot()
+        self.stdout.write(self.style.SUCCESS(f"Товаров в снимке: {count}"))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from market_app.recommendations import build_recommendations
+
+
+class Command(BaseCommand):
+    help = "Пересобирает рекомендации «часто покупают вместе» по истории заказов"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=20, help="Сколько соседей хранить на товар")
+        parser.add_argument('--min-support', type=int, default=2, help="Минимум совместных заказов для пары")
+        parser.add_argument('--method', choices=['lift', 'pmi'], default='lift')
+        parser.add_argument('--chunk-size', type=int, default=500_000,
+                            help="Сколько строк OrderItem держать в памяти за раз")
+
+    def handle(self, *args, **options):
+        written = build_recommendations(
+            top_k=options['top_k'],
+            min_support=options['min_support'],
+            method=options['method'],
+            chunk_size=options['chunk_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(f"Сохранено пар: {written}"))
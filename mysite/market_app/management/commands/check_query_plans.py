@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from market_app.query_plans import all_checks, run_checks, seed
+
+
+class Command(BaseCommand):
+    help = ("Проверяет через EXPLAIN, что сортировки /product и основные запросы view "
+            "идут по индексу, без полной сортировки и полного скана таблицы")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0,
+                            help="Сначала заполнить базу N синтетическими товарами (изменения откатываются)")
+        parser.add_argument('--verbose-plans', action='store_true', help="Печатать план каждого запроса")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            ids = seed(options['seed']) if options['seed'] else {}
+            checks = all_checks(**ids)
+            if options['verbose_plans']:
+                for check in checks:
+                    self.stdout.write(f"{check.name}\n  " + check.explain().replace("\n", "\n  "))
+            problems = run_checks(checks)
+            transaction.set_rollback(True)
+
+        for name, lines in problems:
+            self.stderr.write(f"{name}:\n  " + "\n  ".join(lines))
+        if problems:
+            raise CommandError(f"Запросов с полной сортировкой или сканом: {len(problems)} из {len(checks)}")
+        self.stdout.write(self.style.SUCCESS(f"Все запросы ({len(checks)}) читаются по индексу"))
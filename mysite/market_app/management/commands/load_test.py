@@ -0,0 +1,150 @@
+import asyncio
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from market_app.loadtest import JOURNEYS, SmtpSink, run_load
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class Command(BaseCommand):
+    help = ("Нагрузочный тест: поднимает проект на засеянной временной базе с локальным "
+            "SMTP-приёмником и выводит пропускную способность, p50/p95/p99 и ошибки по эндпоинтам (JSON)")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50, help="Параллельных клиентов")
+        parser.add_argument('--duration', type=float, default=30, help="Длительность, секунд")
+        parser.add_argument('--ramp-up', type=float, default=5, help="За сколько секунд стартуют все клиенты")
+        parser.add_argument('--think-time', type=float, default=0.0, help="Максимальная пауза между сценариями")
+        parser.add_argument('--workers', type=int, default=2, help="Рабочих процессов uvicorn")
+        parser.add_argument('--seed-users', type=int, default=200,
+                            help="Аккаунтов load0..loadN-1 (с --target — сколько их уже засеяно)")
+        parser.add_argument('--seed-products', type=int, default=2000)
+        parser.add_argument('--target', help="Не поднимать проект, а нагружать уже запущенный (URL)")
+        parser.add_argument('--output', help="Куда записать JSON-отчёт (по умолчанию stdout)")
+        parser.add_argument('--max-error-rate', type=float,
+                            help="Завершиться с ошибкой, если доля ошибок выше (для сравнения сборок в CI)")
+        parser.add_argument('--keep', action='store_true', help="Не удалять временную базу после теста")
+
+    def handle(self, *args, **options):
+        workdir = None
+        if not options['target']:
+            workdir = Path(tempfile.mkdtemp(prefix='halalmarket-load-'))
+        try:
+            report = asyncio.run(self.run(options, workdir))
+        finally:
+            if workdir and not options['keep']:
+                shutil.rmtree(workdir, ignore_errors=True)
+
+        output = json.dumps(report, indent=2, ensure_ascii=False)
+        if options['output']:
+            Path(options['output']).write_text(output, encoding='utf-8')
+            self.stderr.write(f"Отчёт: {options['output']}")
+        else:
+            self.stdout.write(output)
+
+        if options['max_error_rate'] is not None and report['error_rate'] > options['max_error_rate']:
+            raise CommandError(f"Доля ошибок {report['error_rate']} выше {options['max_error_rate']}")
+
+    def server_env(self, workdir, smtp_port):
+        return {
+            **os.environ,
+            'SQLITE_PATH': str(workdir / 'db.sqlite3'),
+            'CATALOG_SNAPSHOT_FILE': str(workdir / 'catalog_snapshot.npy'),
+            'ORDER_EVENTS_SOCKET_DIR': str(workdir / 'order-events'),
+            'RESULT_CACHE_LOCATION': str(workdir / 'result_cache'),
+            'EMAIL_HOST': '127.0.0.1',
+            'EMAIL_PORT': str(smtp_port),
+            'EMAIL_USE_TLS': 'False',
+            'API_DOCS_ENABLED': 'False',
+        }
+
+    def prepare_database(self, env, options):
+        manage = [sys.executable, str(Path(settings.BASE_DIR) / 'manage.py')]
+        seed = f"from market_app.loadtest import seed; seed({options['seed_users']}, {options['seed_products']})"
+        for command in (['migrate', '--noinput'], ['createcachetable'], ['shell', '-c', seed],
+                        ['build_catalog_snapshot']):
+            self.stderr.write(f"manage.py {command[0]}")
+            subprocess.run(manage + command, env=env, cwd=settings.BASE_DIR, check=True, stdout=subprocess.DEVNULL)
+
+    async def start_server(self, env, options):
+        port = free_port()
+        server = await asyncio.create_subprocess_exec(
+            sys.executable, '-m', 'uvicorn', 'mysite.asgi:application',
+            '--host', '127.0.0.1', '--port', str(port), '--workers', str(options['workers']),
+            '--no-access-log', '--log-level', 'warning',
+            cwd=settings.BASE_DIR, env=env,
+        )
+        base_url = f"http://127.0.0.1:{port}"
+        deadline = time.monotonic() + 60
+        async with httpx.AsyncClient(base_url=base_url) as client:
+            while time.monotonic() < deadline:
+                if server.returncode is not None:
+                    raise CommandError("uvicorn завершился при старте")
+                try:
+                    if (await client.get('/category')).status_code == 200:
+                        return server, base_url
+                except httpx.HTTPError:
+                    pass
+                await asyncio.sleep(0.3)
+        server.terminate()
+        raise CommandError("Сервер не ответил за 60 секунд")
+
+    async def product_ids(self, base_url):
+        async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+            response = await client.get('/product', params={'fields': 'id'})
+            response.raise_for_status()
+            return [row['id'] for row in response.json()]
+
+    async def run(self, options, workdir):
+        sink = server = None
+        base_url = options['target']
+        try:
+            if workdir:
+                sink = SmtpSink()
+                await sink.start()
+                env = self.server_env(workdir, sink.port)
+                await asyncio.to_thread(self.prepare_database, env, options)
+                server, base_url = await self.start_server(env, options)
+
+            product_ids = await self.product_ids(base_url)
+            if not product_ids:
+                raise CommandError("В базе нет товаров")
+            self.stderr.write(f"Нагрузка: {options['users']} клиентов, {options['duration']} с, {base_url}")
+            report = await run_load(
+                base_url, options['users'], options['duration'], product_ids, options['seed_users'],
+                think_time=options['think_time'], ramp_up=options['ramp_up'],
+            )
+        finally:
+            if server is not None and server.returncode is None:
+                server.terminate()
+                await server.wait()
+            if sink is not None:
+                await sink.stop()
+
+        report['config'] = {
+            'users': options['users'],
+            'duration_s': options['duration'],
+            'workers': options['workers'] if workdir else None,
+            'target': options['target'] or 'local',
+            'seed_users': options['seed_users'] if workdir else None,
+            'seed_products': options['seed_products'] if workdir else None,
+            'journeys': JOURNEYS,
+        }
+        report['emails_sent'] = sink.messages if sink else None
+        return report
@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from market_app.tokens import prune_expired_tokens
+
+
+class Command(BaseCommand):
+    help = "Удаляет истёкшие refresh-токены из таблиц token_blacklist"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help="Токенов в одной транзакции")
+        parser.add_argument('--pause', type=float, default=0.1, help="Пауза между пакетами, секунд")
+        parser.add_argument('--every', type=float,
+                            help="Повторять проход каждые столько секунд (без него — один проход, для cron)")
+
+    def handle(self, *args, **options):
+        while True:
+            deleted = prune_expired_tokens(batch_size=options['batch_size'], pause=options['pause'])
+            self.stdout.write(f"{timezone.now():%Y-%m-%d %H:%M:%S} удалено истёкших токенов: {deleted}")
+            if not options['every']:
+                return
+            time.sleep(options['every'])
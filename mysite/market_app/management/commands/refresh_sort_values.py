@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from market_app.models import Product
+
+
+class Command(BaseCommand):
+    help = ("Полностью пересчитывает колонки сортировки товаров (цена со скидкой, рейтинг, популярность) — "
+            "после импорта или правок БД в обход сигналов")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Товаров в одном UPDATE")
+
+    def handle(self, *args, **options):
+        ids = list(Product.objects.order_by('pk').values_list('pk', flat=True))
+        for start in range(0, len(ids), options['batch_size']):
+            batch = ids[start:start + options['batch_size']]
+            Product.objects.filter(pk__gte=batch[0], pk__lte=batch[-1]).refresh_sort_values()
+        self.stdout.write(self.style.SUCCESS(f"Пересчитано товаров: {len(ids)}"))
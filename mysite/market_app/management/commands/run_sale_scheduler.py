@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from market_app.sales import apply_due_transitions, next_transition_time
+
+
+class Command(BaseCommand):
+    help = "Включает и выключает акции ровно на границах start_date/end_date"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Один проход (для cron)")
+        parser.add_argument('--max-sleep', type=float, default=60,
+                            help="Максимальная пауза, чтобы заметить новые акции")
+
+    def handle(self, *args, **options):
+        while True:
+            switched = apply_due_transitions()
+            if switched:
+                self.stdout.write(f"{timezone.now():%Y-%m-%d %H:%M:%S} переключено акций: {switched}")
+            if options['once']:
+                return
+
+            # спим до ближайшего переключения, но не дольше max-sleep
+            pause = options['max_sleep']
+            upcoming = next_transition_time()
+            if upcoming is not None:
+                pause = min(pause, (upcoming - timezone.now()).total_seconds())
+            time.sleep(max(pause, 0))
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.4 on 2026-10-19 13:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('market_app', '0002_userprofile_verification_code_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductRecommendation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommendations', to='market_app.product')),
+                ('recommended', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='market_app.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', '-score'], name='market_app__product_029da7_idx')],
+                'unique_together': {('product', 'recommended')},
+            },
+        ),
+    ]
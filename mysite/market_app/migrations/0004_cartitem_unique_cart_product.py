@@ -0,0 +1,34 @@
+# Generated by Django 5.2.4 on 2026-10-19 13:29
+
+from django.db import migrations
+from django.db.models import Count, Sum
+
+
+def merge_duplicate_cart_items(apps, schema_editor):
+    # перед уникальным ограничением схлопываем дубли (cart, product) в одну строку
+    CartItem = apps.get_model('market_app', 'CartItem')
+    duplicates = (
+        CartItem.objects.values('cart_id', 'product_id')
+        .annotate(rows=Count('id'), total=Sum('quantity'))
+        .filter(rows__gt=1)
+    )
+    for dup in duplicates:
+        items = CartItem.objects.filter(cart_id=dup['cart_id'], product_id=dup['product_id']).order_by('id')
+        keep = items.first()
+        items.exclude(pk=keep.pk).delete()
+        CartItem.objects.filter(pk=keep.pk).update(quantity=dup['total'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('market_app', '0003_productrecommendation'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_cart_items, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='cartitem',
+            unique_together={('cart', 'product')},
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.4 on 2026-10-19 13:37
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def schedule_existing_sales(apps, schema_editor):
+    # та же логика, что и Sale.refresh_schedule (в миграциях методы модели недоступны)
+    Sale = apps.get_model('market_app', 'Sale')
+    now = timezone.now()
+    sales = list(Sale.objects.all())
+    for sale in sales:
+        if now < sale.start_date:
+            sale.is_active, sale.next_transition = False, sale.start_date
+        elif now < sale.end_date:
+            sale.is_active, sale.next_transition = True, sale.end_date
+        else:
+            sale.is_active, sale.next_transition = False, None
+    Sale.objects.bulk_update(sales, ['is_active', 'next_transition'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('market_app', '0004_cartitem_unique_cart_product'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sale',
+            name='next_transition',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['next_transition'], name='market_app__next_tr_3d8d9b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['product', 'is_active'], name='market_app__product_b1e227_idx'),
+        ),
+        migrations.RunPython(schedule_existing_sales, migrations.RunPython.noop),
+    ]
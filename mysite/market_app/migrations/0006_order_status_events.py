@@ -0,0 +1,63 @@
+# Generated by Django 5.2.4 on 2026-10-19 13:38
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fix_processing_status(apps, schema_editor):
+    # старое значение по умолчанию 'processing' не входило в choices
+    Ordering = apps.get_model('market_app', 'Ordering')
+    Ordering.objects.filter(delivery_status='processing').update(delivery_status='В обработке')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('market_app', '0005_sale_next_transition'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('from_status', models.CharField(choices=[('В обработке', 'В обработке'), ('В пути', 'В пути'), ('Доставлено', 'Доставлено')], max_length=50)),
+                ('to_status', models.CharField(choices=[('В обработке', 'В обработке'), ('В пути', 'В пути'), ('Доставлено', 'Доставлено')], max_length=50)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='ordering',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AlterField(
+            model_name='ordering',
+            name='delivery_status',
+            field=models.CharField(choices=[('В обработке', 'В обработке'), ('В пути', 'В пути'), ('Доставлено', 'Доставлено')], default='В обработке', max_length=50),
+        ),
+        migrations.AddIndex(
+            model_name='ordering',
+            index=models.Index(fields=['user', 'updated_at'], name='market_app__user_id_0d653e_idx'),
+        ),
+        migrations.AddField(
+            model_name='orderevent',
+            name='actor',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='orderevent',
+            name='order',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='market_app.ordering'),
+        ),
+        migrations.AddIndex(
+            model_name='orderevent',
+            index=models.Index(fields=['order', 'created_at'], name='market_app__order_i_17ad79_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orderevent',
+            index=models.Index(fields=['created_at'], name='market_app__created_2474c6_idx'),
+        ),
+        migrations.RunPython(fix_processing_status, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 5.2.4 on 2026-10-19 13:49
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import Avg, ExpressionWrapper, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_sort_values(apps, schema_editor):
+    # то же, что ProductQuerySet.refresh_sort_values, на исторических моделях
+    Product = apps.get_model('market_app', 'Product')
+    Sale = apps.get_model('market_app', 'Sale')
+    Review = apps.get_model('market_app', 'Review')
+    OrderItem = apps.get_model('market_app', 'OrderItem')
+    active_discount = Sale.objects.filter(product=OuterRef('pk'), is_active=True).order_by('-discount_percent')
+    discount = Coalesce(Subquery(active_discount.values('discount_percent')[:1]), Value(0))
+    rating = Review.objects.filter(product=OuterRef('pk')).values('product').annotate(value=Avg('rating'))
+    ordered = OrderItem.objects.filter(product=OuterRef('pk')).values('product').annotate(value=Sum('quantity'))
+    Product.objects.update(
+        effective_price=ExpressionWrapper(F('price') * (100 - discount) / 100, output_field=models.IntegerField()),
+        rating=Coalesce(Subquery(rating.values('value')), Value(0.0), output_field=models.FloatField()),
+        popularity=Coalesce(Subquery(ordered.values('value')), Value(0)),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('market_app', '0006_order_status_events'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='effective_price',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='popularity',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_sort_values, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['price', 'id'], name='product_price_sort'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['effective_price', 'id'], name='product_eff_price_sort'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['created_at', 'id'], name='product_created_sort'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['rating', 'id'], name='product_rating_sort'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['popularity', 'id'], name='product_popularity_sort'),
+        ),
+    ]
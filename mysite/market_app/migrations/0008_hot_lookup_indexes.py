@@ -0,0 +1,33 @@
+# Generated by Django 5.2.4 on 2026-10-19 13:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('market_app', '0007_product_sort_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='sale',
+            name='market_app__product_b1e227_idx',
+        ),
+        migrations.AddIndex(
+            model_name='favoriteproduct',
+            index=models.Index(fields=['favorite', '-created_date'], name='favorite_product_recent'),
+        ),
+        migrations.AddIndex(
+            model_name='ordering',
+            index=models.Index(fields=['user', '-created_at'], name='ordering_user_recent'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(condition=models.Q(('parent__isnull', True)), fields=['product', '-created_at'], name='review_top_level_by_product'),
+        ),
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['product', '-discount_percent'], name='sale_active_by_product'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.4 on 2026-10-19 14:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('market_app', '0008_hot_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='userprofile',
+            index=models.Index(fields=['role', 'id'], name='userprofile_role_id'),
+        ),
+        migrations.AddIndex(
+            model_name='userprofile',
+            index=models.Index(fields=['email'], name='userprofile_email_prefix', opclasses=['varchar_pattern_ops']),
+        ),
+    ]
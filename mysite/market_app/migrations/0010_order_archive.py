@@ -0,0 +1,108 @@
+# Generated by Django 5.2.4 on 2026-10-19 14:07
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('market_app', '0009_user_directory_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedOrder',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('is_paid', models.BooleanField(default=False)),
+                ('delivery_status', models.CharField(choices=[('В обработке', 'В обработке'), ('В пути', 'В пути'), ('Доставлено', 'Доставлено')], max_length=50)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedOrderEvent',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('from_status', models.CharField(choices=[('В обработке', 'В обработке'), ('В пути', 'В пути'), ('Доставлено', 'Доставлено')], max_length=50)),
+                ('to_status', models.CharField(choices=[('В обработке', 'В обработке'), ('В пути', 'В пути'), ('Доставлено', 'Доставлено')], max_length=50)),
+                ('created_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedOrderItem',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('quantity', models.PositiveIntegerField(default=1)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedReceipt',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('purchase_date', models.DateTimeField()),
+                ('delivery_date', models.DateTimeField()),
+                ('total_sum', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('delivery_cost', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='archived_quantity',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='ordering',
+            index=models.Index(condition=models.Q(('delivery_status', 'Доставлено')), fields=['updated_at'], name='ordering_delivered_updated'),
+        ),
+        migrations.AddField(
+            model_name='archivedorder',
+            name='user',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='archivedorderevent',
+            name='actor',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='archivedorderevent',
+            name='order',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='market_app.archivedorder'),
+        ),
+        migrations.AddField(
+            model_name='archivedorderitem',
+            name='order',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='market_app.archivedorder'),
+        ),
+        migrations.AddField(
+            model_name='archivedorderitem',
+            name='product',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='market_app.product'),
+        ),
+        migrations.AddField(
+            model_name='archivedreceipt',
+            name='order',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='receipt', to='market_app.archivedorder'),
+        ),
+        migrations.AddField(
+            model_name='archivedreceipt',
+            name='store_name',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='market_app.store'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedorder',
+            index=models.Index(fields=['user', '-created_at'], name='archived_order_user_recent'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedorder',
+            index=models.Index(fields=['user', 'updated_at'], name='archived_order_user_updated'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedorderevent',
+            index=models.Index(fields=['order', 'created_at'], name='market_app__order_i_1c352e_idx'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.4 on 2026-10-19 14:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def fill_order_item_copies(apps, schema_editor):
+    OrderItem = apps.get_model('market_app', 'OrderItem')
+    Ordering = apps.get_model('market_app', 'Ordering')
+    Product = apps.get_model('market_app', 'Product')
+    order = Ordering.objects.filter(pk=OuterRef('order_id'))
+    OrderItem.objects.update(
+        store_id=Subquery(Product.objects.filter(pk=OuterRef('product_id')).values('store_id')[:1]),
+        order_status=Subquery(order.values('delivery_status')[:1]),
+        created_at=Subquery(order.values('created_at')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('market_app', '0010_order_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='store',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='order_items', to='market_app.store'),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='order_status',
+            field=models.CharField(choices=[('В обработке', 'В обработке'), ('В пути', 'В пути'), ('Доставлено', 'Доставлено')], default='В обработке', max_length=50),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='created_at',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.RunPython(fill_order_item_copies, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='orderitem',
+            name='created_at',
+            field=models.DateTimeField(),
+        ),
+        migrations.AddIndex(
+            model_name='orderitem',
+            index=models.Index(fields=['store', 'order_status', '-created_at'], name='orderitem_store_inbox'),
+        ),
+    ]
@@ -0,0 +1,91 @@
+# Generated by Django 5.2.4 on 2026-10-19 16:05
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def fill_order_item_snapshots(apps, schema_editor):
+    # прошлые цены и скидки неизвестны: берём текущие название и цену, скидку 0
+    OrderItem = apps.get_model('market_app', 'OrderItem')
+    Product = apps.get_model('market_app', 'Product')
+    product = Product.objects.filter(pk=OuterRef('product_id'))
+    OrderItem.objects.update(
+        product_name=Subquery(product.values('product_name')[:1]),
+        product_image=Subquery(product.values('product_image')[:1]),
+        unit_price=Subquery(product.values('price')[:1]),
+    )
+
+
+def fill_archived_item_snapshots(apps, schema_editor):
+    # архив может лежать в другой БД: товары читаем из default, пишем пакетами
+    ArchivedOrderItem = apps.get_model('market_app', 'ArchivedOrderItem')
+    Product = apps.get_model('market_app', 'Product')
+    items = ArchivedOrderItem.objects.using(schema_editor.connection.alias)
+    pks = list(items.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(pks), 1000):
+        batch = list(items.filter(pk__in=pks[start:start + 1000]))
+        products = Product.objects.using('default').in_bulk({item.product_id for item in batch})
+        for item in batch:
+            product = products.get(item.product_id)
+            if product is not None:
+                item.product_name = product.product_name
+                item.product_image = product.product_image
+                item.unit_price = product.price
+        items.bulk_update(batch, ['product_name', 'product_image', 'unit_price'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('market_app', '0011_seller_inbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='product_name',
+            field=models.CharField(default='', editable=False, max_length=32),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='product_image',
+            field=models.ImageField(blank=True, editable=False, upload_to='product_image/'),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='unit_price',
+            field=models.PositiveIntegerField(default=0, editable=False),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='discount_percent',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_order_item_snapshots, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='archivedorderitem',
+            name='product_name',
+            field=models.CharField(default='', max_length=32),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='archivedorderitem',
+            name='product_image',
+            field=models.ImageField(blank=True, upload_to='product_image/'),
+        ),
+        migrations.AddField(
+            model_name='archivedorderitem',
+            name='unit_price',
+            field=models.PositiveIntegerField(default=0),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='archivedorderitem',
+            name='discount_percent',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_archived_item_snapshots, migrations.RunPython.noop,
+                             hints={'model_name': 'archivedorderitem'}),
+    ]
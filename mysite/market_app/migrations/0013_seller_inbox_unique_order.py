@@ -0,0 +1,21 @@
+# Generated by Django 5.2.4 on 2026-10-19 14:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('market_app', '0012_order_line_snapshots'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='orderitem',
+            name='orderitem_store_inbox',
+        ),
+        migrations.AddIndex(
+            model_name='orderitem',
+            index=models.Index(fields=['store', 'order_status', '-created_at', '-id'], name='orderitem_store_inbox'),
+        ),
+    ]
@@ -1,7 +1,10 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.utils.functional import cached_property
 from phonenumber_field.modelfields import PhoneNumberField
-from django.db.models import Avg
+from django.db.models import Avg, Exists, ExpressionWrapper, F, Max, OuterRef, Q, Subquery, Sum, Value
+from django.utils import timezone
+from django.db.models.functions import Coalesce
 from django.dispatch import receiver
 from django.urls import reverse
 from django_rest_passwordreset.signals import reset_password_token_created
@@ -21,6 +24,14 @@ class UserProfile(AbstractUser):
     address = models.CharField(max_length=120)
     verification_code = models.CharField(max_length=6, null=True, blank=True)
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # справочник пользователей (/client): фильтр по роли, постранично по id
+            models.Index(fields=['role', 'id'], name='userprofile_role_id'),
+            # поиск по началу email и вход по email; в PostgreSQL pattern_ops нужен для LIKE 'x%'
+            models.Index(fields=['email'], name='userprofile_email_prefix', opclasses=['varchar_pattern_ops']),
+        ]
+
 
 
 @receiver(reset_password_token_created)
@@ -68,6 +79,50 @@ class Store(models.Model):
 
 
 
+SORT_FIELDS = ('effective_price', 'rating', 'popularity')
+
+
+class ProductQuerySet(models.QuerySet):
+    def with_rating(self):
+        # средний рейтинг из денормализованной колонки: без JOIN отзывов и GROUP BY,
+        # поэтому сортировка списка остаётся на индексе
+        return self.annotate(rating_avg=F('rating'))
+
+    def refresh_sort_values(self, fields=SORT_FIELDS):
+        """
+        Пересчитывает денормализованные колонки сортировки у товаров queryset:
+        effective_price — цена с самой большой активной скидкой (как Sale.discounted_price),
+        rating — средний рейтинг (0 без отзывов), popularity — сколько штук заказано
+        (горячие OrderItem плюс archived_quantity из архива). fields — какие из них.
+
+        popularity суммирует всю историю заказов, поэтому полностью пересчитывается
+        только командой refresh_sort_values; позиции заказов меняют её через add_popularity.
+        """
+        values = {}
+        if 'effective_price' in fields:
+            active_discount = Sale.objects.filter(product=OuterRef('pk'), is_active=True).order_by('-discount_percent')
+            discount = Coalesce(Subquery(active_discount.values('discount_percent')[:1]), Value(0))
+            values['effective_price'] = ExpressionWrapper(F('price') * (100 - discount) / 100,
+                                                          output_field=models.IntegerField())
+        if 'rating' in fields:
+            rating = Review.objects.filter(product=OuterRef('pk')).values('product').annotate(value=Avg('rating'))
+            values['rating'] = Coalesce(Subquery(rating.values('value')), Value(0.0), output_field=models.FloatField())
+        if 'popularity' in fields:
+            ordered = OrderItem.objects.filter(product=OuterRef('pk')).values('product').annotate(value=Sum('quantity'))
+            values['popularity'] = F('archived_quantity') + Coalesce(Subquery(ordered.values('value')), Value(0))
+        return self.update(**values)
+
+    def add_popularity(self, delta):
+        return self.update(popularity=F('popularity') + delta)
+
+    def with_favorited(self, user):
+        if not user or not user.is_authenticated:
+            return self.annotate(is_favorited=Value(False))
+        return self.annotate(is_favorited=Exists(
+            FavoriteProduct.objects.filter(product=OuterRef('pk'), favorite__user=user)
+        ))
+
+
 class Product(models.Model):
     store = models.ForeignKey("Store", on_delete=models.CASCADE, related_name="products", null=True, blank=True)
     subcategory = models.ForeignKey(SubCategory, on_delete=models.CASCADE)
@@ -83,6 +138,25 @@ class Product(models.Model):
     expiration_date = models.CharField(max_length=64)
     equipment = models.CharField(max_length=300)
     product_code = models.CharField(max_length=20)
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+    # колонки для сортировки списка по индексу; пересчитываются сигналами (refresh_sort_values)
+    effective_price = models.PositiveIntegerField(default=0, editable=False)
+    rating = models.FloatField(default=0, editable=False)
+    popularity = models.PositiveIntegerField(default=0, editable=False)
+    # штук в заказах, перенесённых в архив (market_app.archive); входит в popularity
+    archived_quantity = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = ProductQuerySet.as_manager()
+
+    class Meta:
+        # по индексу на каждую сортировку списка; id в конце — стабильный порядок при равных значениях
+        indexes = [
+            models.Index(fields=['price', 'id'], name='product_price_sort'),
+            models.Index(fields=['effective_price', 'id'], name='product_eff_price_sort'),
+            models.Index(fields=['created_at', 'id'], name='product_created_sort'),
+            models.Index(fields=['rating', 'id'], name='product_rating_sort'),
+            models.Index(fields=['popularity', 'id'], name='product_popularity_sort'),
+        ]
 
     def get_average_rating(self):
         avg = self.reviews.aggregate(Avg('rating'))['rating__avg']
@@ -93,11 +167,14 @@ class Product(models.Model):
 
 class Sale(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='sales')
+    # is_active выставляется автоматически: при сохранении и планировщиком run_sale_scheduler
     is_active = models.BooleanField(default=False)
     description = models.TextField()
     discount_percent = models.PositiveSmallIntegerField(default=0)
     start_date = models.DateTimeField()
     end_date = models.DateTimeField()
+    # когда акцию нужно переключить в следующий раз (None — акция закончилась)
+    next_transition = models.DateTimeField(null=True, blank=True, editable=False)
 
     @property
     def discounted_price(self):
@@ -107,13 +184,57 @@ class Sale(models.Model):
 
     @property
     def is_currently_active(self):
-        from django.utils import timezone
-        now = timezone.now()
-        return self.is_active and self.start_date <= now <= self.end_date
+        return self.is_active
+
+    def refresh_schedule(self, now=None):
+        """
+        Пересчитывает is_active и next_transition для момента now (интервал [start_date, end_date)).
+        """
+        now = now or timezone.now()
+        if now < self.start_date:
+            self.is_active, self.next_transition = False, self.start_date
+        elif now < self.end_date:
+            self.is_active, self.next_transition = True, self.end_date
+        else:
+            self.is_active, self.next_transition = False, None
+
+    def save(self, *args, **kwargs):
+        self.refresh_schedule()
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'is_active', 'next_transition'}
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.product.product_name} - {self.discount_percent}%"
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['next_transition']),
+            # активные акции товара, самая большая скидка первой (страница товара, effective_price)
+            models.Index(fields=['product', '-discount_percent'], condition=Q(is_active=True),
+                         name='sale_active_by_product'),
+        ]
+
+
+def active_discounts(product_ids):
+    """
+    {product_id: самая большая активная скидка, %} — та же, что в effective_price.
+    """
+    return dict(
+        Sale.objects.filter(product_id__in=product_ids, is_active=True)
+        .values('product_id').annotate(discount=Max('discount_percent')).values_list('product_id', 'discount')
+    )
+
+
+def with_discounts(cart_items):
+    """
+    Проставляет позициям корзины discount_percent одним запросом на все товары.
+    """
+    discounts = active_discounts([item.product_id for item in cart_items])
+    for item in cart_items:
+        item.discount_percent = discounts.get(item.product_id, 0)
+    return cart_items
+
 class Favorite(models.Model):
     user = models.OneToOneField(UserProfile, on_delete=models.CASCADE)
 
@@ -130,39 +251,124 @@ class FavoriteProduct(models.Model):
 
     class Meta:
         unique_together = ('product', 'favorite')
+        indexes = [
+            # избранное пользователя, новые сверху
+            models.Index(fields=['favorite', '-created_date'], name='favorite_product_recent'),
+        ]
+
+
+DELIVERY_STATUS_CHOICES = (
+    ('В обработке', 'В обработке'),
+    ('В пути', 'В пути'),
+    ('Доставлено', 'Доставлено'),
+)
+
+# Допустимые переходы статуса доставки
+DELIVERY_STATUS_TRANSITIONS = {
+    'В обработке': {'В пути'},
+    'В пути': {'Доставлено'},
+    'Доставлено': set(),
+}
 
 
 class Ordering(models.Model):
     user = models.ForeignKey(UserProfile, on_delete=models.CASCADE, related_name="orders")
     products = models.ManyToManyField(Product, through='OrderItem')
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     is_paid = models.BooleanField(default=False)
 
     delivery_status = models.CharField(
         max_length=50,
-        choices=[
-            ('В обработке', 'В обработке'),
-            ('В пути', 'В пути'),
-            ('Доставлено', 'Доставлено'),
-        ],
-        default='processing'
+        choices=DELIVERY_STATUS_CHOICES,
+        default='В обработке'
     )
 
     def __str__(self):
         return f"Заказ #{self.id} от {self.user.username}"
 
+    def can_transition_to(self, status):
+        return status in DELIVERY_STATUS_TRANSITIONS.get(self.delivery_status, set())
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'updated_at']),
+            models.Index(fields=['user', '-created_at'], name='ordering_user_recent'),
+            # кандидаты в архив: доставленные, давно не менявшиеся
+            models.Index(fields=['updated_at'], condition=Q(delivery_status='Доставлено'),
+                         name='ordering_delivered_updated'),
+        ]
+
+
+class OrderEvent(models.Model):
+    """
+    Журнал смены статусов заказа (только добавление).
+    """
+    order = models.ForeignKey(Ordering, on_delete=models.CASCADE, related_name='events')
+    from_status = models.CharField(max_length=50, choices=DELIVERY_STATUS_CHOICES)
+    to_status = models.CharField(max_length=50, choices=DELIVERY_STATUS_CHOICES)
+    actor = models.ForeignKey(UserProfile, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Заказ #{self.order_id}: {self.from_status} -> {self.to_status}"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['order', 'created_at']),
+            models.Index(fields=['created_at']),
+        ]
+
 
 class OrderItem(models.Model):
     order = models.ForeignKey(Ordering, on_delete=models.CASCADE, related_name="items")
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1)
+    # копии product.store, order.delivery_status и order.created_at для входящих
+    # заказов продавца (/seller/orders/): выборка по индексу без JOIN заказов и товаров
+    # у товара магазин может быть не указан — тогда позиция не попадает ни в чей входящий список
+    store = models.ForeignKey(Store, on_delete=models.CASCADE, related_name='order_items', null=True)
+    order_status = models.CharField(max_length=50, choices=DELIVERY_STATUS_CHOICES, default='В обработке')
+    created_at = models.DateTimeField()
+    # снимок товара на момент заказа: правки товара не меняют историю заказов,
+    # а заказы и чеки выводятся без обращения к Product
+    product_name = models.CharField(max_length=32, editable=False)
+    product_image = models.ImageField(upload_to='product_image/', blank=True, editable=False)
+    unit_price = models.PositiveIntegerField(editable=False)
+    discount_percent = models.PositiveSmallIntegerField(default=0, editable=False)
 
     def __str__(self):
-        return f"{self.quantity} x {self.product.product_name}"
+        return f"{self.quantity} x {self.product_name}"
+
+    def fill_snapshot(self, product, discount_percent=0):
+        self.product_name = product.product_name
+        self.product_image = product.product_image.name
+        self.unit_price = product.price
+        self.discount_percent = discount_percent
+
+    def save(self, *args, **kwargs):
+        if self.unit_price is None:
+            self.fill_snapshot(self.product, active_discounts([self.product_id]).get(self.product_id, 0))
+        if self.store_id is None:
+            self.store_id = self.product.store_id
+        if self.created_at is None:
+            self.order_status = self.order.delivery_status
+            self.created_at = self.order.created_at
+        super().save(*args, **kwargs)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['store', 'order_status', '-created_at', '-id'], name='orderitem_store_inbox'),
+        ]
+
+    @property
+    def sale_price(self):
+        # цена за штуку со скидкой, как Sale.discounted_price
+        return self.unit_price * (100 - self.discount_percent) // 100
 
     @property
     def total_price(self):
-        return self.product.price * self.quantity
+        return self.sale_price * self.quantity
 
 
 class Cart(models.Model):
@@ -172,22 +378,39 @@ class Cart(models.Model):
     def __str__(self):
         return f"Cart of {self.user.username}"
 
+    @cached_property
+    def discounted_items(self):
+        # позиции со скидками, которые применит оформление заказа
+        return with_discounts(list(self.items.select_related('product')))
+
     @property
     def total_price(self):
-        return sum(item.total_price for item in self.items.all())
+        return sum(item.total_price for item in self.discounted_items)
 
 class CartItem(models.Model):
     cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name='items')
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1)
 
+    @cached_property
+    def discount_percent(self):
+        # та же скидка, что OrderItem получит при оформлении; для списка позиций — with_discounts
+        return active_discounts([self.product_id]).get(self.product_id, 0)
+
+    @property
+    def sale_price(self):
+        return self.product.price * (100 - self.discount_percent) // 100
+
     @property
     def total_price(self):
-        return self.product.price * self.quantity
+        return self.sale_price * self.quantity
 
     def __str__(self):
         return f"{self.quantity} x {self.product.product_name}"
 
+    class Meta:
+        unique_together = ('cart', 'product')
+
 class Review(models.Model):
     user = models.ForeignKey(UserProfile, on_delete=models.CASCADE)
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reviews')
@@ -203,6 +426,13 @@ class Review(models.Model):
 
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # отзывы верхнего уровня к товару по дате; ответы ищутся по индексу parent
+            models.Index(fields=['product', '-created_at'], condition=Q(parent__isnull=True),
+                         name='review_top_level_by_product'),
+        ]
+
     def is_reply(self):
         return self.parent is not None
 
@@ -224,3 +454,92 @@ class Receipt(models.Model):
         return f"Чек для заказа #{self.order.id}"
 
 
+# Архив доставленных заказов (market_app.archive). id и поля те же, что у горячих
+# таблиц, поэтому сериализаторы заказов и чеков читают обе. Архив может лежать в
+# отдельной БД (ARCHIVE_DATABASE), поэтому связи с пользователями, товарами и
+# магазинами — без ограничений в БД.
+
+class ArchivedOrder(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(UserProfile, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    is_paid = models.BooleanField(default=False)
+    delivery_status = models.CharField(max_length=50, choices=DELIVERY_STATUS_CHOICES)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Архивный заказ #{self.id}"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='archived_order_user_recent'),
+            models.Index(fields=['user', 'updated_at'], name='archived_order_user_updated'),
+        ]
+
+
+class ArchivedOrderEvent(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    order = models.ForeignKey(ArchivedOrder, on_delete=models.CASCADE, related_name='events')
+    from_status = models.CharField(max_length=50, choices=DELIVERY_STATUS_CHOICES)
+    to_status = models.CharField(max_length=50, choices=DELIVERY_STATUS_CHOICES)
+    actor = models.ForeignKey(UserProfile, on_delete=models.DO_NOTHING, db_constraint=False, null=True,
+                              blank=True, related_name='+')
+    created_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['order', 'created_at']),
+        ]
+
+
+class ArchivedOrderItem(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    order = models.ForeignKey(ArchivedOrder, on_delete=models.CASCADE, related_name='items')
+    product = models.ForeignKey(Product, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    quantity = models.PositiveIntegerField(default=1)
+    product_name = models.CharField(max_length=32)
+    product_image = models.ImageField(upload_to='product_image/', blank=True)
+    unit_price = models.PositiveIntegerField()
+    discount_percent = models.PositiveSmallIntegerField(default=0)
+
+    @property
+    def sale_price(self):
+        return self.unit_price * (100 - self.discount_percent) // 100
+
+    @property
+    def total_price(self):
+        return self.sale_price * self.quantity
+
+
+class ArchivedReceipt(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    order = models.OneToOneField(ArchivedOrder, on_delete=models.CASCADE, related_name='receipt')
+    store_name = models.ForeignKey(Store, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    purchase_date = models.DateTimeField()
+    delivery_date = models.DateTimeField()
+    total_sum = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    delivery_cost = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"Архивный чек для заказа #{self.order_id}"
+
+
+
+
+class ProductRecommendation(models.Model):
+    """
+    Предрасчитанные соседи «часто покупают вместе» (заполняется командой build_recommendations).
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='recommendations')
+    recommended = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+
+    def __str__(self):
+        return f"{self.product_id} -> {self.recommended_id} ({self.score:.3f})"
+
+    class Meta:
+        unique_together = ('product', 'recommended')
+        indexes = [
+            models.Index(fields=['product', '-score']),
+        ]
@@ -0,0 +1,47 @@
+from django.db import transaction
+from django.utils import timezone
+
+from .events import notify_order_events
+from .models import OrderEvent, OrderItem, Ordering
+
+
+def bulk_transition(order_ids, status, actor=None, batch_size=500):
+    """
+    Переводит заказы в статус status по машине состояний DELIVERY_STATUS_TRANSITIONS.
+
+    На каждый пакет: один SELECT ... FOR UPDATE, один bulk_update, один UPDATE
+    копии статуса в OrderItem и один bulk_create в журнал OrderEvent. Возвращает (обновлённые id, отклонённые
+    [{id, status}], не найденные id).
+    """
+    order_ids = list(dict.fromkeys(order_ids))
+    updated, rejected, found = [], [], set()
+
+    for start in range(0, len(order_ids), batch_size):
+        batch = order_ids[start:start + batch_size]
+        with transaction.atomic():
+            orders = list(
+                Ordering.objects.select_for_update()
+                .filter(pk__in=batch)
+                .only('id', 'user', 'delivery_status', 'updated_at')
+            )
+            now = timezone.now()
+            changed, events = [], []
+            for order in orders:
+                found.add(order.pk)
+                if not order.can_transition_to(status):
+                    rejected.append({'id': order.pk, 'status': order.delivery_status})
+                    continue
+                events.append(OrderEvent(
+                    order=order, from_status=order.delivery_status, to_status=status, actor=actor, created_at=now,
+                ))
+                order.delivery_status = status
+                order.updated_at = now  # bulk_update не трогает auto_now
+                changed.append(order)
+            Ordering.objects.bulk_update(changed, ['delivery_status', 'updated_at'])
+            OrderItem.objects.filter(order_id__in=[order.pk for order in changed]).update(order_status=status)
+            OrderEvent.objects.bulk_create(events)
+            notify_order_events(events, {order.pk: order.user_id for order in changed})
+        updated.extend(order.pk for order in changed)
+
+    not_found = [pk for pk in order_ids if pk not in found]
+    return updated, rejected, not_found
@@ -0,0 +1,95 @@
+import heapq
+import json
+from itertools import islice
+from operator import attrgetter
+
+from django.db import connections
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+
+
+def estimated_count(queryset, exact_below):
+    """
+    (число строк, оценка ли это). В PostgreSQL берётся оценка планировщика из
+    EXPLAIN — COUNT(*) по большой таблице читает её целиком; если оценка меньше
+    exact_below, считаем точно. В остальных БД — обычный count().
+    """
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        sql, params = queryset.order_by().query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        estimate = int(plan[0]['Plan']['Plan Rows'])
+        if estimate >= exact_below:
+            return estimate, True
+    return queryset.count(), False
+
+
+class MergedQuerySet:
+    """
+    Несколько querysets как один для CursorPagination: order_by и filter применяются
+    к каждому, срез берёт из каждого не больше stop строк и сливает их по порядку.
+    Так каждый запрос читается по своему индексу, без сортировки объединения в БД.
+    Порядок — по всем полям в одну сторону.
+    """
+
+    def __init__(self, querysets, ordering=()):
+        self.querysets = querysets
+        self.ordering = ordering
+
+    def order_by(self, *ordering):
+        return MergedQuerySet([queryset.order_by(*ordering) for queryset in self.querysets], ordering)
+
+    def filter(self, *args, **kwargs):
+        return MergedQuerySet([queryset.filter(*args, **kwargs) for queryset in self.querysets], self.ordering)
+
+    def __getitem__(self, page):
+        key = attrgetter(*(field.lstrip('-') for field in self.ordering))
+        rows = heapq.merge(*(queryset[:page.stop] for queryset in self.querysets),
+                           key=key, reverse=self.ordering[0].startswith('-'))
+        return list(islice(rows, page.start, page.stop))
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Постраничный вывод по ключу (?cursor=): следующая страница — WHERE id < последний,
+    без OFFSET, поэтому одинаково быстро на любой глубине. count — оценка для больших таблиц.
+    """
+    ordering = '-id'
+    page_size = 50
+    page_size_query_param = 'limit'
+    max_page_size = 200
+    exact_count_below = 10_000
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count, self.count_is_estimate = estimated_count(queryset, self.exact_count_below)
+        return super().paginate_queryset(self.split_queryset(queryset, request, view), request, view)
+
+    def split_queryset(self, queryset, request, view):
+        # queryset, который постранично читает CursorPagination (например, MergedQuerySet)
+        return queryset
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'count': self.count,
+            'count_is_estimate': self.count_is_estimate,
+            'results': data,
+        })
+
+
+class SellerInboxPagination(KeysetPagination):
+    # новые заказы сверху; порядок совпадает с индексом orderitem_store_inbox,
+    # id — для уникального ключа: у позиций одного заказа created_at один и тот же
+    ordering = ('-created_at', '-id')
+
+    def split_queryset(self, queryset, request, view):
+        # store_id IN (...) не читается по индексу в порядке created_at:
+        # у каждого магазина свой запрос по индексу, страницы сливаются
+        if 'store' in request.query_params or len(view.store_ids) < 2:
+            return queryset
+        return MergedQuerySet([queryset.filter(store_id=store) for store in view.store_ids])
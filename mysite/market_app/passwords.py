@@ -0,0 +1,87 @@
+"""
+Хэширование паролей вне потока запросов.
+
+PBKDF2 на вход/регистрацию/сброс пароля — сотни миллисекунд CPU. Под ASGI
+синхронные view выполняются в одном общем потоке, поэтому такой view на это
+время останавливает все остальные. Вход, регистрация и сброс пароля —
+асинхронные view, а само хэширование идёт в ограниченном пуле потоков
+(hashlib.pbkdf2_hmac отпускает GIL, так что потоки считают параллельно).
+Если в пуле и очереди уже PASSWORD_HASH_WORKERS + PASSWORD_HASH_QUEUE
+задач, новая сразу получает PasswordHashingBusy (ответ 503), а не ждёт
+в бесконечной очереди.
+
+Число итераций PBKDF2 задаётся PASSWORD_PBKDF2_ITERATIONS (подбирается
+командой bench_password_hashing); хэши со старыми параметрами пересчитываются
+при следующем успешном входе.
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    """
+    pbkdf2_sha256 с числом итераций из настроек.
+    """
+
+    @property
+    def iterations(self):
+        return settings.PASSWORD_PBKDF2_ITERATIONS
+
+
+class PasswordHashingBusy(Exception):
+    pass
+
+
+class HashPool:
+    def __init__(self, workers, queue_size):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+        self.limit = workers + queue_size
+        self.pending = 0
+        self.lock = threading.Lock()
+
+    async def run(self, func, *args):
+        with self.lock:
+            if self.pending >= self.limit:
+                raise PasswordHashingBusy
+            self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+        finally:
+            with self.lock:
+                self.pending -= 1
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_hash_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = HashPool(settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_QUEUE)
+    return _pool
+
+
+async def hash_password(raw_password):
+    return await get_hash_pool().run(hashers.make_password, raw_password)
+
+
+async def acheck_password(user, raw_password):
+    """
+    Как user.check_password, но в пуле. Если хэш сделан с другими параметрами,
+    он пересчитывается и сохраняется; при занятом пуле — в следующий раз.
+    """
+    outdated = []
+    is_correct = await get_hash_pool().run(hashers.check_password, raw_password, user.password, outdated.append)
+    if is_correct and outdated:
+        try:
+            user.password = await hash_password(raw_password)
+        except PasswordHashingBusy:
+            return is_correct
+        await type(user)._default_manager.filter(pk=user.pk).aupdate(password=user.password)
+    return is_correct
@@ -0,0 +1,300 @@
+"""
+Профилирование отдельных запросов в проде.
+
+ProfilingMiddleware включает профилировщик, если staff прислал заголовок
+X-Profile (сессия админки или JWT) или запрос попал в случайную долю
+PROFILING_SAMPLE_RATE. Профилировщик статистический: отдельный поток раз в
+PROFILING_INTERVAL секунд снимает стек потока, в котором идёт запрос, так что
+сам запрос почти не замедляется. Заодно через execute_wrapper пишутся все
+SQL-запросы с временем.
+
+На каждый запрос в PROFILING_DIR ложатся два файла: <id>.json (запрос, ответ,
+SQL) и <id>.speedscope.json (открывается на https://www.speedscope.app);
+хранятся последние PROFILING_KEEP. Id профиля возвращается в заголовке
+X-Profile-Id, список — на странице admin/profiles/.
+
+Без срабатывания цена — проверка заголовка на запрос и ContextVar.get на
+SQL-запрос; при PROFILING_ENABLED=False middleware не подключается вовсе.
+У асинхронных view снимается поток цикла событий: работа в sync_to_async
+видна как ожидание, но её SQL попадает в список; синхронные view под ASGI
+снимаются в их рабочем потоке.
+"""
+import json
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextvars import ContextVar
+from datetime import datetime
+from pathlib import Path
+from urllib.parse import urlencode
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+
+HEADER = 'X-Profile'
+PROFILE_ID = re.compile(r'^[0-9]{8}-[0-9]{6}-[0-9]{6}-[0-9a-f]{8}$')
+# значения этих параметров запроса в профиль не пишутся (?token= у SSE-потока заказов — живой JWT)
+SECRET_PARAMS = re.compile(r'token|access|refresh|password|secret|key|code|signature', re.IGNORECASE)
+
+_queries = ContextVar('profiled_queries', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    queries = _queries.get()
+    if queries is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        # без параметров: в них бывают пароли и персональные данные
+        queries.append({'db': context['connection'].alias, 'sql': sql, 'many': many,
+                        'ms': round((time.perf_counter() - start) * 1000, 3)})
+
+
+def install_query_recorder(connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def redacted_path(request):
+    """
+    Путь запроса для профиля: секретные параметры заменены на ***.
+    """
+    params = [(name, '***' if SECRET_PARAMS.search(name) else value)
+              for name, values in request.GET.lists() for value in values]
+    return f"{request.path}?{urlencode(params, safe='*')}" if params else request.path
+
+
+def stack_of(frame):
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+        frame = frame.f_back
+    return tuple(reversed(stack))
+
+
+class Sampler(threading.Thread):
+    """
+    Раз в interval секунд снимает стек потока thread_id; stacks — {стек: секунд}.
+    """
+
+    def __init__(self, thread_id, interval):
+        super().__init__(name='request-profiler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+
+    def run(self):
+        last = time.perf_counter()
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            now = time.perf_counter()
+            if frame is not None:
+                self.stacks[stack_of(frame)] += now - last
+            last = now
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def speedscope(name, stacks):
+    frames, index, samples, weights = [], {}, [], []
+    for stack, seconds in stacks.items():
+        for frame in stack:
+            if frame not in index:
+                index[frame] = len(frames)
+                frames.append({'name': frame[0], 'file': frame[1], 'line': frame[2]})
+        samples.append([index[frame] for frame in stack])
+        weights.append(round(seconds * 1000, 3))
+    return {
+        '$schema': 'https://www.speedscope.app/file-format-schema.json',
+        'name': name,
+        'exporter': 'market_app.profiling',
+        'shared': {'frames': frames},
+        'profiles': [{'type': 'sampled', 'name': name, 'unit': 'milliseconds', 'startValue': 0,
+                      'endValue': round(sum(weights), 3), 'samples': samples, 'weights': weights}],
+    }
+
+
+class RequestProfile:
+    def __init__(self, request, trigger):
+        self.request = request
+        self.trigger = trigger
+        # время до микросекунд: по id сортируются профили при ротации
+        self.id = f"{datetime.now():%Y%m%d-%H%M%S-%f}-{uuid.uuid4().hex[:8]}"
+        self.queries = []
+
+    def start(self):
+        for connection in connections.all(initialized_only=True):
+            install_query_recorder(connection)
+        self.token = _queries.set(self.queries)
+        self.sampler = Sampler(threading.get_ident(), settings.PROFILING_INTERVAL)
+        self.started = time.perf_counter()
+        self.sampler.start()
+
+    def follow_current_thread(self):
+        self.sampler.thread_id = threading.get_ident()
+
+    def stop(self):
+        self.duration = time.perf_counter() - self.started
+        self.sampler.stop()
+        _queries.reset(self.token)
+
+    def save(self, response, user):
+        directory = Path(settings.PROFILING_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+        path = redacted_path(self.request)
+        name = f"{self.request.method} {path}"
+        meta = {
+            'id': self.id,
+            'method': self.request.method,
+            'path': path,
+            'status': response.status_code,
+            'trigger': self.trigger,
+            'user': user,
+            'created_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'duration_ms': round(self.duration * 1000, 1),
+            'sql_ms': round(sum(query['ms'] for query in self.queries), 1),
+            'queries': self.queries,
+        }
+        (directory / f'{self.id}.speedscope.json').write_text(json.dumps(speedscope(name, self.sampler.stacks)))
+        (directory / f'{self.id}.json').write_text(json.dumps(meta, ensure_ascii=False))
+        rotate_profiles(directory, settings.PROFILING_KEEP)
+
+
+def rotate_profiles(directory, keep):
+    # id начинается с времени, поэтому сортировка по имени — по возрасту
+    for path in sorted(directory.glob('*.speedscope.json'))[:-keep or None]:
+        path.unlink(missing_ok=True)
+        path.with_name(path.name.replace('.speedscope.json', '.json')).unlink(missing_ok=True)
+
+
+def list_profiles():
+    """
+    Сохранённые профили, новые первыми (без списка SQL).
+    """
+    directory = Path(settings.PROFILING_DIR)
+    profiles = []
+    for path in sorted(directory.glob('*.speedscope.json'), reverse=True):
+        meta = read_profile(path.name.replace('.speedscope.json', ''))
+        if meta is not None:
+            meta['query_count'] = len(meta.pop('queries'))
+            profiles.append(meta)
+    return profiles
+
+
+def read_profile(profile_id):
+    if not PROFILE_ID.match(profile_id):
+        return None
+    try:
+        return json.loads((Path(settings.PROFILING_DIR) / f'{profile_id}.json').read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def profile_user(request):
+    """
+    Кто из staff просит профиль: сессия админки или Bearer-токен; иначе None.
+    """
+    if request.user.is_authenticated:
+        user = request.user
+    else:
+        try:
+            authenticated = JWTAuthentication().authenticate(request)
+        except (AuthenticationFailed, InvalidToken, TokenError):
+            return None
+        user = authenticated[0] if authenticated else None
+    if user is not None and user.is_active and user.is_staff:
+        return user.get_username()
+    return None
+
+
+class ProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+            self.process_view = self.aprocess_view
+        connection_created.connect(install_query_recorder, dispatch_uid='market_app.profiling')
+
+    def trigger(self, request):
+        if HEADER in request.headers:
+            return 'header'
+        if settings.PROFILING_SAMPLE_RATE and random.random() < settings.PROFILING_SAMPLE_RATE:
+            return 'sample'
+        return None
+
+    def allowed_user(self, request, trigger):
+        # (разрешено, пользователь для записи)
+        if trigger == 'header':
+            user = profile_user(request)
+            return user is not None, user
+        return True, None
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        trigger = self.trigger(request)
+        if trigger is None:
+            return self.get_response(request)
+        allowed, user = self.allowed_user(request, trigger)
+        if not allowed:
+            return self.get_response(request)
+        profile = request.request_profile = RequestProfile(request, trigger)
+        profile.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            profile.stop()
+        profile.save(response, user)
+        response['X-Profile-Id'] = profile.id
+        return response
+
+    async def __acall__(self, request):
+        trigger = self.trigger(request)
+        if trigger is None:
+            return await self.get_response(request)
+        allowed, user = await sync_to_async(self.allowed_user)(request, trigger)
+        if not allowed:
+            return await self.get_response(request)
+        profile = request.request_profile = RequestProfile(request, trigger)
+        profile.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            profile.stop()
+        await sync_to_async(profile.save)(response, user)
+        response['X-Profile-Id'] = profile.id
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        profile = getattr(request, 'request_profile', None)
+        if profile is not None and not iscoroutinefunction(view_func):
+            profile.follow_current_thread()
+
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        # под ASGI синхронный view выполняется не в цикле событий, а в потоке
+        # sync_to_async(thread_sensitive=True) — переводим снятие стека туда же
+        profile = getattr(request, 'request_profile', None)
+        if profile is not None and not iscoroutinefunction(view_func):
+            await sync_to_async(profile.follow_current_thread)()
@@ -0,0 +1,197 @@
+"""
+Проверка планов запросов через EXPLAIN: основные запросы view должны читаться
+по индексу, а не сканировать или сортировать всю таблицу.
+
+Проверяется тестами market_app.tests (ProductSortPlanTests, ViewQueryPlanTests);
+команда check_query_plans — то же самое вручную на любой базе. В PostgreSQL на время EXPLAIN
+отключаются enable_sort/enable_seqscan: на маленькой базе планировщик и так
+выбрал бы полный проход, а так видно, может ли запрос вообще обойтись индексом.
+"""
+import re
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .catalog import ORDERING_COLUMNS
+from .filters import ProductFilter
+from .models import (
+    Cart, CartItem, Category, Favorite, FavoriteProduct, OrderEvent, OrderItem, Ordering, Product,
+    ProductRecommendation, Receipt, Review, Sale, Store, SubCategory, UserProfile,
+)
+
+# признаки плохого плана: полная сортировка и полный проход по таблице
+FULL_SORT = {
+    'sqlite': re.compile(r'USE TEMP B-TREE FOR ORDER BY'),
+    'postgresql': re.compile(r'\bSort\s+\('),  # и Sort, и Incremental Sort
+}
+FULL_SCAN = {
+    'sqlite': re.compile(r'\bSCAN (\w+)(?! USING)\s*$'),
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+}
+
+
+class PlanCheck:
+    """
+    Запрос для EXPLAIN. allow_scan — упорядоченный проход по индексу с LIMIT
+    (первая страница списка), полным сканом он не считается.
+    """
+
+    def __init__(self, name, queryset, allow_scan=False):
+        self.name = name
+        self.queryset = queryset
+        self.allow_scan = allow_scan
+
+    def explain(self):
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute("SET LOCAL enable_sort = off")
+                    cursor.execute("SET LOCAL enable_seqscan = off")
+            return self.queryset.explain()
+
+    def problems(self):
+        plan = self.explain()
+        patterns = [FULL_SORT.get(connection.vendor)]
+        if not self.allow_scan:
+            patterns.append(FULL_SCAN.get(connection.vendor))
+        return [line.strip() for line in plan.splitlines()
+                if any(pattern and pattern.search(line) for pattern in patterns)]
+
+
+def product_sort_checks():
+    """
+    Первая страница /product для каждой сортировки из ProductFilter, как её строит view.
+    """
+    for name in ORDERING_COLUMNS:
+        for ordering in (name, f"-{name}"):
+            queryset = ProductFilter({'ordering': ordering}, queryset=Product.objects.with_rating()).qs
+            yield PlanCheck(f"/product?ordering={ordering}", queryset[:20], allow_scan=True)
+
+
+def view_checks(user_id=1, product_id=1, order_id=1, store_id=1):
+    """
+    Основные запросы view для одного пользователя/товара/заказа/магазина (значения нужны
+    только для EXPLAIN, строки с такими id могут и не существовать).
+    """
+    now = timezone.now()
+    return [
+        PlanCheck("product/<pk>/ отзывы",
+                  Review.objects.filter(product_id=product_id, parent__isnull=True).order_by('-created_at')[:10]),
+        PlanCheck("product/<pk>/ активная акция",
+                  Sale.objects.filter(product_id=product_id, is_active=True).order_by('-discount_percent')[:1]),
+        PlanCheck("reviews/?product_id=",
+                  Review.objects.filter(product_id=product_id, parent__isnull=True)),
+        PlanCheck("product/<pk>/recommendations/",
+                  ProductRecommendation.objects.filter(product_id=product_id).order_by('-score')[:10]),
+        PlanCheck("favorite/product/",
+                  FavoriteProduct.objects.filter(favorite__user_id=user_id).order_by('-created_date')),
+        PlanCheck("orders/",
+                  Ordering.objects.filter(user_id=user_id).order_by('-created_at')),
+        PlanCheck("orders/?changed_since=",
+                  Ordering.objects.filter(user_id=user_id, updated_at__gt=now).order_by('updated_at')),
+        PlanCheck("orders/<pk>/events/",
+                  OrderEvent.objects.filter(order_id=order_id, order__user_id=user_id).order_by('created_at')),
+        PlanCheck("cart/",
+                  CartItem.objects.filter(cart__user_id=user_id)),
+        PlanCheck("cart/ позиция товара",
+                  CartItem.objects.filter(cart__user_id=user_id, product_id=product_id)),
+        PlanCheck("receipts/<pk>/",
+                  Receipt.objects.filter(order__user_id=user_id, pk=order_id)),
+        PlanCheck("run_sale_scheduler",
+                  Sale.objects.filter(next_transition__lte=now).order_by('next_transition')[:1000]),
+        PlanCheck("client?role=",
+                  UserProfile.objects.filter(role='продавец').order_by('-id')[:50]),
+        PlanCheck("client?role=&cursor=",
+                  UserProfile.objects.filter(role='продавец', id__lt=user_id).order_by('-id')[:50]),
+        PlanCheck("seller/orders/",
+                  OrderItem.objects.filter(store_id__in=[store_id], order_status='В обработке')
+                  .order_by('-created_at', '-id')[:50]),
+        PlanCheck("seller/orders/?cursor=",
+                  OrderItem.objects.filter(store_id__in=[store_id], order_status='В обработке', created_at__lt=now)
+                  .order_by('-created_at', '-id')[:50]),
+        # у продавца с несколькими магазинами SellerInboxPagination читает каждый магазин отдельно
+        PlanCheck("seller/orders/ (магазин продавца с несколькими магазинами)",
+                  OrderItem.objects.filter(store_id__in=[store_id], order_status='В обработке', store_id=store_id)
+                  .order_by('-created_at', '-id')[:51]),
+    ]
+
+
+def all_checks(**ids):
+    return [*product_sort_checks(), *view_checks(**ids)]
+
+
+def run_checks(checks):
+    """
+    [(имя, строки плана с полной сортировкой или полным сканом)] для проблемных запросов.
+    """
+    problems = []
+    for check in checks:
+        found = check.problems()
+        if found:
+            problems.append((check.name, found))
+    return problems
+
+
+def seed(count):
+    """
+    Синтетические данные для EXPLAIN: count товаров, отзывов и позиций заказов,
+    count // 50 пользователей со своими корзинами, избранным и заказами. Первый
+    пользователь и первый товар «горячие» — на них приходится заметная доля строк,
+    как у популярного товара и активного покупателя. Вызывать внутри транзакции,
+    которая потом откатывается. Возвращает id для view_checks.
+    """
+    now = timezone.now()
+    users = UserProfile.objects.bulk_create([
+        UserProfile(username=f"plan-check-{i}", password='!', phone_number=f"+99655{i:07d}")
+        for i in range(max(2, count // 50))
+    ])
+    user = users[0]
+    category = Category.objects.create(category_name='plan-check')
+    subcategory = SubCategory.objects.create(category=category, subcategory_name='plan-check')
+    store = Store.objects.create(owner=user, store_name='plan-check', category=category, subcategory=subcategory)
+    products = Product.objects.bulk_create([
+        Product(store=store, category=category, subcategory=subcategory, product_name=f"p{i}",
+                description='', price=i % 1000, effective_price=i % 1000, weight=1, quantity=i % 7,
+                composition='', action='', expiration_date='', equipment='', product_code=str(i),
+                rating=i % 5, popularity=i % 100)
+        for i in range(count)
+    ])
+    product = products[0]
+
+    def hot(i, rows, share=10):
+        # каждая share-я строка — горячему объекту, остальные равномерно
+        return rows[0] if i % share == 0 else rows[i % len(rows)]
+
+    Review.objects.bulk_create([
+        Review(user=users[i % len(users)], product=hot(i, products), rating=i % 5 + 1) for i in range(count)
+    ])
+    Sale.objects.bulk_create([
+        Sale(product=hot(i, products, 5), description='', discount_percent=i % 50, is_active=i % 2 == 0,
+             start_date=now, end_date=now + timedelta(days=1), next_transition=now + timedelta(days=1))
+        for i in range(count // 5)
+    ])
+    favorites = Favorite.objects.bulk_create([Favorite(user=u) for u in users])
+    FavoriteProduct.objects.bulk_create([
+        FavoriteProduct(favorite=favorite, product=products[(f * 7 + j) % len(products)])
+        for f, favorite in enumerate(favorites) for j in range(10)
+    ])
+    carts = Cart.objects.bulk_create([Cart(user=u) for u in users])
+    CartItem.objects.bulk_create([
+        CartItem(cart=cart, product=products[(c * 3 + j) % len(products)])
+        for c, cart in enumerate(carts) for j in range(5)
+    ])
+    orders = Ordering.objects.bulk_create([Ordering(user=hot(i, users)) for i in range(max(2, count // 5))])
+    OrderItem.objects.bulk_create([
+        OrderItem(order=orders[i % len(orders)], product=products[i % len(products)], store=store, created_at=now,
+                  product_name=products[i % len(products)].product_name, unit_price=products[i % len(products)].price)
+        for i in range(count)
+    ])
+    OrderEvent.objects.bulk_create([
+        OrderEvent(order=hot(i, orders), from_status='В обработке', to_status='В пути') for i in range(len(orders))
+    ])
+    if connection.vendor in ('postgresql', 'sqlite'):
+        # статистика нужна планировщику, чтобы он видел реальные размеры таблиц
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+    return {'user_id': user.pk, 'product_id': product.pk, 'order_id': orders[0].pk, 'store_id': store.pk}
@@ -0,0 +1,165 @@
+import heapq
+
+import numpy as np
+from scipy import sparse
+from django.db import transaction
+from django.db.models import Sum
+
+from .models import ArchivedOrderItem, OrderItem, Product, ProductRecommendation
+
+
+def _basket_matrix(order_ids, product_idx, n_products):
+    """
+    Бинарная матрица «заказ x товар» для одной пачки строк OrderItem.
+    """
+    _, rows = np.unique(order_ids, return_inverse=True)
+    data = np.ones(len(rows), dtype=np.float32)
+    matrix = sparse.csr_matrix((data, (rows, product_idx)), shape=(rows.max() + 1, n_products))
+    matrix.sum_duplicates()
+    matrix.data[:] = 1  # одна и та же позиция в заказе считается один раз
+    return matrix
+
+
+def count_cooccurrences(chunk_size=500_000):
+    """
+    Считает совместные покупки по всей истории заказов (OrderItem и архив).
+
+    Строки читаются потоком, отсортированными по order_id, пачками по chunk_size,
+    поэтому память ограничена размером пачки и разреженной матрицей товаров.
+    Возвращает (product_ids, cooccurrence, item_counts, n_orders).
+    """
+    product_ids = np.fromiter(
+        Product.objects.order_by('id').values_list('id', flat=True), dtype=np.int64
+    )
+    n_products = len(product_ids)
+    cooccurrence = sparse.csr_matrix((n_products, n_products), dtype=np.float64)
+    item_counts = np.zeros(n_products, dtype=np.float64)
+    n_orders = 0
+
+    # горячие позиции и архив (market_app.archive): id заказов не пересекаются, сливаем по order_id
+    rows = heapq.merge(*(
+        model.objects.order_by('order_id')
+        .values_list('order_id', 'product_id')
+        .iterator(chunk_size=min(chunk_size, 10_000))
+        for model in (OrderItem, ArchivedOrderItem)
+    ))
+
+    orders = np.empty(chunk_size, dtype=np.int64)
+    products = np.empty(chunk_size, dtype=np.int64)
+    filled = 0
+
+    def flush(end):
+        nonlocal cooccurrence, item_counts, n_orders
+        if not end:
+            return
+        product_idx = np.searchsorted(product_ids, products[:end])
+        # архивные позиции (DO_NOTHING, без ограничения в БД) могут ссылаться на удалённые товары
+        known = product_idx < n_products
+        known[known] = product_ids[product_idx[known]] == products[:end][known]
+        if not known.any():
+            return
+        baskets = _basket_matrix(orders[:end][known], product_idx[known], n_products)
+        cooccurrence = cooccurrence + (baskets.T @ baskets).tocsr()
+        item_counts += np.asarray(baskets.sum(axis=0)).ravel()
+        n_orders += baskets.shape[0]
+
+    for order_id, product_id in rows:
+        if filled == chunk_size:
+            # не разрываем заказ между пачками: хвост последнего заказа переносим
+            last = orders[filled - 1]
+            start = np.searchsorted(orders[:filled], last)
+            if start == 0:
+                raise ValueError("chunk_size меньше, чем число позиций в одном заказе")
+            flush(start)
+            tail = filled - start
+            orders[:tail] = orders[start:filled]
+            products[:tail] = products[start:filled]
+            filled = tail
+        orders[filled] = order_id
+        products[filled] = product_id
+        filled += 1
+    flush(filled)
+
+    return product_ids, cooccurrence, item_counts, n_orders
+
+
+def score_pairs(cooccurrence, item_counts, n_orders, method='lift'):
+    """
+    Превращает матрицу совместных покупок в оценки lift или PMI (векторно).
+    """
+    pairs = sparse.coo_matrix(cooccurrence)
+    off_diagonal = pairs.row != pairs.col
+    rows, cols, counts = pairs.row[off_diagonal], pairs.col[off_diagonal], pairs.data[off_diagonal]
+
+    lift = counts * n_orders / (item_counts[rows] * item_counts[cols])
+    scores = np.log(lift) if method == 'pmi' else lift
+    return sparse.csr_matrix((scores, (rows, cols)), shape=cooccurrence.shape)
+
+
+def top_k_neighbours(scores, top_k):
+    """
+    Для каждой строки CSR-матрицы возвращает индексы и оценки top_k лучших соседей.
+    """
+    for row in range(scores.shape[0]):
+        start, end = scores.indptr[row], scores.indptr[row + 1]
+        if start == end:
+            continue
+        data = scores.data[start:end]
+        indices = scores.indices[start:end]
+        if len(data) > top_k:
+            best = np.argpartition(-data, top_k)[:top_k]
+            data, indices = data[best], indices[best]
+        order = np.argsort(-data, kind='stable')
+        yield row, indices[order], data[order]
+
+
+def build_recommendations(top_k=20, min_support=2, method='lift', chunk_size=500_000, batch_size=5000):
+    """
+    Полностью пересобирает таблицу ProductRecommendation. Возвращает число записанных пар.
+    """
+    product_ids, cooccurrence, item_counts, n_orders = count_cooccurrences(chunk_size)
+    if not n_orders:
+        with transaction.atomic():
+            ProductRecommendation.objects.all().delete()
+        return 0
+
+    # отбрасываем редкие пары до оценки, чтобы не раздувать матрицу
+    cooccurrence.data[cooccurrence.data < min_support] = 0
+    cooccurrence.eliminate_zeros()
+    scores = score_pairs(cooccurrence, item_counts, n_orders, method)
+
+    written = 0
+    with transaction.atomic():
+        ProductRecommendation.objects.all().delete()
+        batch = []
+        for row, neighbours, values in top_k_neighbours(scores, top_k):
+            product_id = int(product_ids[row])
+            for idx, value in zip(neighbours, values):
+                batch.append(ProductRecommendation(
+                    product_id=product_id,
+                    recommended_id=int(product_ids[idx]),
+                    score=float(value),
+                ))
+            if len(batch) >= batch_size:
+                ProductRecommendation.objects.bulk_create(batch)
+                written += len(batch)
+                batch = []
+        ProductRecommendation.objects.bulk_create(batch)
+        written += len(batch)
+    return written
+
+
+def recommended_product_ids(product_ids, limit=10):
+    """
+    Сливает предрасчитанные списки для нескольких товаров (например, корзины).
+    Всё считается одним агрегирующим запросом по индексу (product, -score).
+    """
+    product_ids = list(product_ids)
+    rows = (
+        ProductRecommendation.objects.filter(product_id__in=product_ids)
+        .exclude(recommended_id__in=product_ids)
+        .values('recommended_id')
+        .annotate(total_score=Sum('score'))
+        .order_by('-total_score', 'recommended_id')[:limit]
+    )
+    return [row['recommended_id'] for row in rows]
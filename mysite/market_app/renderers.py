@@ -0,0 +1,29 @@
+import orjson
+from rest_framework.renderers import JSONRenderer
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer на orjson.
+
+    Для компактного вывода без отступов результат совпадает с JSONRenderer байт-в-байт.
+    Отступы (?format=json; indent=4) и типы, которые orjson сериализует иначе
+    (datetime, Decimal, ленивые строки), уходят в стандартный рендерер.
+    """
+    options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if indent or not self.compact or self.ensure_ascii:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, option=self.options)
+        except TypeError:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # как и в JSONRenderer: U+2028/U+2029 экранируются, чтобы вывод был валидным JavaScript
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
@@ -0,0 +1,242 @@
+"""
+Кэш готовых ответов горячих списков (/product, /sale).
+
+Два уровня: LRU с TTL в памяти процесса и общий для процессов кэш
+(settings.RESULT_CACHE, по умолчанию файловый). Ключ — нормализованные
+параметры запроса. Инвалидация по тегам: у каждого тега в общем кэше есть
+версия, запись помнит версии своих тегов на момент сборки и считается
+устаревшей, как только любая из них сменилась. Теги меняют сигналы
+Product/Sale/Review после коммита транзакции.
+
+Теги: catalog (любой товар), category:N, subcategory:N, store:N, sales,
+popularity (только порядок ?ordering=popularity).
+
+Промах никогда не ждёт: под ASGI все синхронные view процесса идут в одном
+потоке, и ожидание чужой сборки остановило бы весь воркер. Пока один поток
+пересобирает ответ, остальные отдают прежнее (устаревшее) значение, а если его
+нет — собирают сами. Между процессами блокировки нет: FileBasedCache.add не
+атомарен, так что одновременный промах в нескольких процессах собирается в
+каждом из них (но не больше одного раза на процесс).
+"""
+import hashlib
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework.response import Response
+
+from .models import FavoriteProduct, Product
+
+
+class ResultCache:
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.local = OrderedDict()  # key -> (истекает, версии тегов, значение)
+        self.lock = threading.Lock()
+        self.building = set()  # ключи, которые сейчас пересобирает этот процесс
+
+    @property
+    def shared(self):
+        return caches[settings.RESULT_CACHE]
+
+    def tag_versions(self, tags):
+        keys = {f"result_tag:{tag}": tag for tag in tags}
+        found = self.shared.get_many(keys)
+        for key in keys.keys() - found.keys():
+            # у тега ещё нет версии (или её вытеснили) — заводим новую
+            self.shared.add(key, uuid.uuid4().hex, timeout=None)
+            found[key] = self.shared.get(key)
+        return {keys[key]: version for key, version in found.items()}
+
+    def invalidate(self, tags):
+        self.shared.set_many({f"result_tag:{tag}": uuid.uuid4().hex for tag in tags}, timeout=None)
+
+    def _local_get(self, key):
+        # и устаревшие записи: их отдают, пока ответ пересобирается
+        with self.lock:
+            entry = self.local.get(key)
+            if entry is not None:
+                self.local.move_to_end(key)
+            return entry
+
+    def _local_set(self, key, versions, value, expires):
+        with self.lock:
+            self.local[key] = (expires, versions, value)
+            self.local.move_to_end(key)
+            while len(self.local) > self.max_entries:
+                self.local.popitem(last=False)
+
+    def get_or_build(self, key, tags, build):
+        """
+        Значение по ключу или build(). Версии тегов читаются до сборки: если
+        тег сменится, пока строится ответ, запись сразу окажется устаревшей.
+        """
+        versions = self.tag_versions(tags)
+        stale = None
+        entry = self._local_get(key)
+        if entry is not None:
+            expires, entry_versions, value = entry
+            if expires >= time.monotonic() and entry_versions == versions:
+                return value
+            stale = value
+        entry = self.shared.get(f"result:{key}")
+        if entry is not None:
+            if entry['versions'] == versions:
+                self._local_set(key, versions, entry['value'], time.monotonic() + entry['expires_at'] - time.time())
+                return entry['value']
+            if stale is None:
+                stale = entry['value']
+        return self._rebuild(key, versions, build, stale)
+
+    def _rebuild(self, key, versions, build, stale):
+        # промах: пересобирает один поток процесса, остальные тем временем отдают
+        # прежнее значение или собирают сами — без ожидания
+        with self.lock:
+            leader = key not in self.building
+            if leader:
+                self.building.add(key)
+        if not leader:
+            return stale if stale is not None else build()
+        try:
+            value = build()
+            self.shared.set(f"result:{key}", {
+                'versions': versions,
+                'value': value,
+                'expires_at': time.time() + self.ttl,
+            }, timeout=self.ttl)
+            self._local_set(key, versions, value, time.monotonic() + self.ttl)
+            return value
+        finally:
+            with self.lock:
+                self.building.discard(key)
+
+    def clear_local(self):
+        with self.lock:
+            self.local.clear()
+
+
+_result_cache = None
+
+
+def get_result_cache():
+    global _result_cache
+    if _result_cache is None:
+        _result_cache = ResultCache(settings.RESULT_CACHE_MAX_ENTRIES, settings.RESULT_CACHE_TTL)
+    return _result_cache
+
+
+def invalidate_tags(tags):
+    """
+    Сменить версии тегов после коммита: ответ, собранный из ещё не закоммиченных
+    данных, не должен попасть в кэш под новыми версиями.
+    """
+    tags = set(tags)
+    if tags:
+        transaction.on_commit(lambda: get_result_cache().invalidate(tags))
+
+
+def scope_tags(category=None, subcategory=None, store=None):
+    tags = set()
+    if category:
+        tags.add(f"category:{category}")
+    if subcategory:
+        tags.add(f"subcategory:{subcategory}")
+    if store:
+        tags.add(f"store:{store}")
+    return tags
+
+
+def products_tags(product_ids):
+    """
+    Теги, которые меняет правка товаров: их категории, подкатегории, магазины и catalog.
+    """
+    tags = {'catalog'}
+    for row in Product.objects.filter(pk__in=product_ids).values_list('category_id', 'subcategory_id', 'store_id'):
+        tags |= scope_tags(*row)
+    return tags
+
+
+def cache_key(prefix, params):
+    raw = '&'.join(f"{name}={value}" for name, value in params)
+    return f"{prefix}:{hashlib.sha256(raw.encode()).hexdigest()}"
+
+
+class CachedListMixin:
+    """
+    Ответ списка из ResultCache. result_cache_params — параметры запроса, от
+    которых зависит ответ (остальные в ключ не входят), result_cache_tags() —
+    теги записи. is_favorited в кэше всегда False и проставляется для
+    пользователя поверх общего ответа.
+    """
+    result_cache_params = ('fields', 'expand', 'limit', 'offset')
+
+    def result_cache_tags(self):
+        return {'catalog'}
+
+    def normalized_params(self):
+        params = []
+        for name in sorted(set(self.result_cache_params) & set(self.request.query_params)):
+            value = self.request.query_params[name]
+            if name == 'search':
+                value = ' '.join(value.replace(',', ' ').split())  # так же SearchFilter режет термы
+            elif name in ('fields', 'expand'):
+                value = ','.join(sorted({item.strip() for item in value.split(',') if item.strip()}))
+            else:
+                value = value.strip()
+            params.append((name, value))
+        return params
+
+    def get(self, request, *args, **kwargs):
+        if not settings.RESULT_CACHE_ENABLED:
+            return super().get(request, *args, **kwargs)
+        paginator = self.paginator
+        paginated = paginator is not None and paginator.get_limit(request) is not None
+
+        def build():
+            data = super(CachedListMixin, self).get(request, *args, **kwargs).data
+            if paginated:
+                return {'count': data['count'], 'results': self.shared_rows(data['results'])}
+            return self.shared_rows(data)
+
+        key = cache_key(type(self).__name__, self.normalized_params())
+        data = get_result_cache().get_or_build(key, self.result_cache_tags(), build)
+        if paginated:
+            paginator.request = request
+            paginator.limit = paginator.get_limit(request)
+            paginator.offset = paginator.get_offset(request)
+            paginator.count = data['count']
+            return paginator.get_paginated_response(self.user_rows(data['results']))
+        return Response(self.user_rows(data))
+
+    def favorites_need_id(self):
+        # ?fields= с is_favorited, но без id: id нужен, чтобы проставить is_favorited
+        # поверх общего ответа, поэтому он есть в кэше и убирается в user_rows
+        fields = {item.strip() for item in self.request.query_params.get('fields', '').split(',')}
+        return 'is_favorited' in fields and 'id' not in fields
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if settings.RESULT_CACHE_ENABLED and context.get('fields') is not None and self.favorites_need_id():
+            context['fields'] = context['fields'] | {'id'}
+        return context
+
+    def shared_rows(self, rows):
+        if rows and 'is_favorited' in rows[0]:
+            return [{**row, 'is_favorited': False} for row in rows]
+        return list(rows)
+
+    def user_rows(self, rows):
+        user = self.request.user
+        if rows and 'is_favorited' in rows[0] and user.is_authenticated:
+            favorites = set(FavoriteProduct.objects.filter(favorite__user=user).values_list('product_id', flat=True))
+            if favorites:
+                rows = [{**row, 'is_favorited': True} if row['id'] in favorites else row for row in rows]
+        if self.favorites_need_id():
+            rows = [{name: value for name, value in row.items() if name != 'id'} for row in rows]
+        return rows
+
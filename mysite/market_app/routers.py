@@ -0,0 +1,34 @@
+from django.conf import settings
+
+ARCHIVE_MODELS = {'archivedorder', 'archivedorderevent', 'archivedorderitem', 'archivedreceipt'}
+
+
+def is_archive_model(model):
+    return model._meta.app_label == 'market_app' and model._meta.model_name in ARCHIVE_MODELS
+
+
+class ArchiveRouter:
+    """
+    Архивные модели — в settings.ARCHIVE_DATABASE, всё остальное — в default.
+    Пока ARCHIVE_DATABASE == 'default', ничего не меняется.
+    """
+
+    def db_for_read(self, model, **hints):
+        # default явно: иначе товар архивной позиции искался бы в БД самой позиции
+        return settings.ARCHIVE_DATABASE if is_archive_model(model) else 'default'
+
+    def db_for_write(self, model, **hints):
+        return self.db_for_read(model, **hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # экземпляр, а не type(obj): request.user под сессией — SimpleLazyObject
+        if is_archive_model(obj1) or is_archive_model(obj2):
+            return True  # связи архива с пользователями и товарами — без ограничений в БД
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if settings.ARCHIVE_DATABASE == 'default':
+            return None
+        if app_label == 'market_app' and model_name in ARCHIVE_MODELS:
+            return db == settings.ARCHIVE_DATABASE
+        return db == 'default'
@@ -0,0 +1,37 @@
+from django.db import transaction
+from django.db.models import Min
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .models import Sale
+
+# Отправляется после каждого пакета переключений; product_ids — товары, у которых сменилась цена
+sales_transitioned = Signal()
+
+
+def apply_due_transitions(now=None, batch_size=1000):
+    """
+    Переключает акции, у которых наступило next_transition (по индексу), пакетами через bulk_update.
+    Возвращает число переключённых акций.
+    """
+    now = now or timezone.now()
+    total = 0
+    while True:
+        with transaction.atomic():
+            due = list(
+                Sale.objects.select_for_update()
+                .filter(next_transition__lte=now)
+                .order_by('next_transition')[:batch_size]
+            )
+            for sale in due:
+                sale.refresh_schedule(now)
+            Sale.objects.bulk_update(due, ['is_active', 'next_transition'])
+        if due:
+            sales_transitioned.send(sender=Sale, product_ids={sale.product_id for sale in due})
+        total += len(due)
+        if len(due) < batch_size:
+            return total
+
+
+def next_transition_time():
+    return Sale.objects.aggregate(Min('next_transition'))['next_transition__min']
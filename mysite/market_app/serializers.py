@@ -1,12 +1,40 @@
 from rest_framework import serializers
+from asgiref.sync import sync_to_async
 from .models import *
-from rest_framework_simplejwt.tokens import RefreshToken
+from .passwords import acheck_password
+from .tokens import RevocableRefreshToken
 from django.contrib.auth import get_user_model
 from django_rest_passwordreset.models import ResetPasswordToken
 
 User = get_user_model()
 
 
+class SparseFieldsMixin:
+    """
+    Поля ответа по context['fields'] и context['expand'] (?fields= / ?expand=).
+    expandable_fields: связь -> сериализатор; если передан expand, нераскрытая связь выводится как id.
+    """
+    expandable_fields = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fields = self.context.get('fields')
+        expand = self.context.get('expand')
+
+        if expand is not None:
+            for name, serializer_class in self.expandable_fields.items():
+                if name not in self.fields:
+                    continue
+                if name in expand:
+                    self.fields[name] = serializer_class(read_only=True)
+                else:
+                    self.fields[name] = serializers.PrimaryKeyRelatedField(read_only=True)
+
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
 class RegisterSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
@@ -36,19 +64,23 @@ class RegisterSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         password = validated_data.pop('password')
+        password_hash = validated_data.pop('password_hash', None)
         user = User(**validated_data)
-        user.set_password(password)
+        if password_hash:
+            user.password = password_hash  # уже посчитан в пуле passwords
+        else:
+            user.set_password(password)
         user.save()
         return user
 
     def to_representation(self, instance):
-        refresh = RefreshToken.for_user(instance)
+        refresh = RevocableRefreshToken.for_user(instance)
 
         return {
             'user': {
                 'username': instance.username,
                 'email': instance.email,
-                'phone_number': instance.phone_number,
+                'phone_number': str(instance.phone_number),
             },
             'access': str(refresh.access_token),
             'refresh': str(refresh),
@@ -59,27 +91,39 @@ class CustomLoginSerializer(serializers.Serializer):
     email = serializers.EmailField()
     password = serializers.CharField(write_only=True)
 
-    def validate(self, data):
-        email = data.get('email')
-        password = data.get('password')
-
+    def get_user(self, email):
         try:
-            user = User.objects.get(email=email)
+            return User.objects.get(email=email)
         except User.DoesNotExist:
             raise serializers.ValidationError({"email": "Пользователь с таким email не найден"})
 
-        if not user.check_password(password):
+    def check_user(self, user, password_ok):
+        if not password_ok:
             raise serializers.ValidationError({"password": "Неверный пароль"})
 
         if not user.is_active:
             raise serializers.ValidationError("Пользователь не активен")
 
+    def validate(self, data):
+        user = self.get_user(data.get('email'))
+        self.check_user(user, user.check_password(data.get('password')))
+        self.context['user'] = user
+        return data
+
+    async def avalidate(self):
+        """
+        Проверки is_valid() для асинхронного view: пароль сверяется в пуле passwords,
+        а не в потоке запроса. Бросает ValidationError, возвращает validated_data.
+        """
+        data = await sync_to_async(self.to_internal_value)(self.initial_data)
+        user = await sync_to_async(self.get_user)(data['email'])
+        self.check_user(user, await acheck_password(user, data['password']))
         self.context['user'] = user
         return data
 
     def to_representation(self, instance):
         user = self.context['user']
-        refresh = RefreshToken.for_user(user)
+        refresh = RevocableRefreshToken.for_user(user)
 
         return {
             'user': {
@@ -97,7 +141,7 @@ class LogoutSerializer(serializers.Serializer):
     def validate(self, attrs):
         token = attrs.get('refresh')
         try:
-            RefreshToken(token)
+            RevocableRefreshToken(token)
         except Exception:
             raise serializers.ValidationError({"refresh": "Невалидный токен"})
         return attrs
@@ -126,12 +170,15 @@ class VerifyResetCodeSerializer(serializers.Serializer):
         data['token'] = token
         return data
 
-    def save(self):
+    def save(self, password_hash=None):
         user = self.validated_data['user']
         token = self.validated_data['token']
         new_password = self.validated_data['new_password']
 
-        user.set_password(new_password)
+        if password_hash:
+            user.password = password_hash
+        else:
+            user.set_password(new_password)
         user.save()
         token.delete()
 
@@ -211,7 +258,7 @@ class ProductCreateSerializer(serializers.ModelSerializer):
 class ClientListSerializer(serializers.ModelSerializer):
     class Meta:
         model = UserProfile
-        fields = ['id', 'username', 'role', 'avatar']
+        fields = ['id', 'username', 'email', 'phone_number', 'role', 'avatar']
 
 
 class ClientDetailSerializer(serializers.ModelSerializer):
@@ -244,10 +291,12 @@ class SubCategorySerializers(serializers.ModelSerializer):
         fields = ['id', 'category', 'subcategory_name', 'subcategory_image']
 
 
-class ProductListSerializers(serializers.ModelSerializer):
+class ProductListSerializers(SparseFieldsMixin, serializers.ModelSerializer):
     avg_rating = serializers.SerializerMethodField()
+    is_favorited = serializers.SerializerMethodField()
     subcategory = SubCategorySerializers()
     category = CategorySerializer()
+    expandable_fields = {'category': CategorySerializer, 'subcategory': SubCategorySerializers}
 
     class Meta:
         model = Product
@@ -255,12 +304,18 @@ class ProductListSerializers(serializers.ModelSerializer):
             'id', 'category', 'subcategory', 'product_name', 'product_image', 'description',
             'price', 'weight', 'quantity', 'composition',
             'action', 'expiration_date', 'equipment',
-            'product_code', 'avg_rating'
+            'product_code', 'avg_rating', 'is_favorited'
         ]
 
     def get_avg_rating(self, obj):
+        # если queryset собран через with_rating(), лишнего запроса нет
+        if hasattr(obj, 'rating_avg'):
+            return round(obj.rating_avg, 1) if obj.rating_avg else 0.0
         return obj.get_average_rating()
 
+    def get_is_favorited(self, obj):
+        return getattr(obj, 'is_favorited', False)
+
 
 class ProductDetailSerializers(serializers.ModelSerializer):
     avg_rating = serializers.SerializerMethodField()
@@ -277,44 +332,84 @@ class ProductDetailSerializers(serializers.ModelSerializer):
         ]
 
     def get_avg_rating(self, obj):
+        if hasattr(obj, 'rating_avg'):
+            return round(obj.rating_avg, 1) if obj.rating_avg else 0.0
         return obj.get_average_rating()
 
 
+class StoreShortSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Store
+        fields = ['id', 'store_name', 'category', 'subcategory']
+
 
-class SaleSerializers(serializers.ModelSerializer):
+class ActiveSaleSerializer(serializers.ModelSerializer):
+    discounted_price = serializers.ReadOnlyField()
+
+    class Meta:
+        model = Sale
+        fields = ['id', 'description', 'discount_percent', 'discounted_price', 'start_date', 'end_date']
+
+
+
+class ProductShortSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Product
+        fields = ['id', 'product_name', 'product_image', 'price']
+
+
+class SaleSerializers(SparseFieldsMixin, serializers.ModelSerializer):
     discounted_price = serializers.ReadOnlyField()
     is_currently_active = serializers.ReadOnlyField()
+    expandable_fields = {'product': ProductShortSerializer}
 
     class Meta:
         model = Sale
-        fields = '__all__'
+        exclude = ['next_transition']
 
 
 class OrderItemSerializer(serializers.ModelSerializer):
-    product_name = serializers.CharField(source="product.product_name", read_only=True)
-    price = serializers.DecimalField(source="product.price", max_digits=10, decimal_places=2, read_only=True)
+    # всё из снимка на момент заказа, без Product
+    price = serializers.DecimalField(source="unit_price", max_digits=10, decimal_places=2, read_only=True)
     total_price = serializers.SerializerMethodField()
 
     class Meta:
         model = OrderItem
-        fields = ["id", "product", "product_name", "price", "quantity", "total_price"]
+        fields = ["id", "product", "product_name", "product_image", "price", "discount_percent", "quantity",
+                  "total_price"]
 
     def get_total_price(self, obj):
         return obj.total_price
 
 
+class SellerOrderLineSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = OrderItem
+        fields = ["id", "order", "store", "product", "product_name", "quantity", "order_status", "created_at"]
+
+
 class OrderingSerializer(serializers.ModelSerializer):
     items = OrderItemSerializer(many=True, read_only=True)
     total_sum = serializers.SerializerMethodField()
 
     class Meta:
         model = Ordering
-        fields = ["id", "user", "created_at", "is_paid", "delivery_status", "items", "total_sum"]
-        read_only_fields = ["user", "created_at", "total_sum"]
+        fields = ["id", "user", "created_at", "updated_at", "is_paid", "delivery_status", "items", "total_sum"]
+        read_only_fields = ["user", "created_at", "updated_at", "total_sum"]
 
     def get_total_sum(self, obj):
         return sum(item.total_price for item in obj.items.all())
 
+    def validate_delivery_status(self, value):
+        if self.instance is None:
+            if value != Ordering._meta.get_field('delivery_status').default:
+                raise serializers.ValidationError("Новый заказ может быть только в статусе 'В обработке'")
+        elif value != self.instance.delivery_status and not self.instance.can_transition_to(value):
+            raise serializers.ValidationError(
+                f"Нельзя сменить статус '{self.instance.delivery_status}' на '{value}'"
+            )
+        return value
+
     def create(self, validated_data):
         items_data = validated_data.pop("items", [])
         order = Ordering.objects.create(**validated_data)
@@ -323,6 +418,17 @@ class OrderingSerializer(serializers.ModelSerializer):
         return order
 
 
+class OrderEventSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = OrderEvent
+        fields = ["id", "order", "from_status", "to_status", "actor", "created_at"]
+
+
+class OrderBulkStatusSerializer(serializers.Serializer):
+    order_ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False, max_length=5000)
+    status = serializers.ChoiceField(choices=DELIVERY_STATUS_CHOICES)
+
+
 class CartItemCreateSerializer(serializers.ModelSerializer):
     product_id = serializers.IntegerField(write_only=True)
     quantity = serializers.IntegerField(default=1)
@@ -331,6 +437,33 @@ class CartItemCreateSerializer(serializers.ModelSerializer):
         model = CartItem
         fields = ['product_id', 'quantity']
 
+class CartOperationSerializer(serializers.Serializer):
+    op = serializers.ChoiceField(choices=['add', 'set', 'remove'])
+    product_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=0, required=False)
+
+    def validate(self, data):
+        if data['op'] == 'add':
+            data.setdefault('quantity', 1)
+            if data['quantity'] < 1:
+                raise serializers.ValidationError({"quantity": "Для add количество должно быть больше нуля"})
+        elif data['op'] == 'set' and 'quantity' not in data:
+            raise serializers.ValidationError({"quantity": "Для set нужно указать количество"})
+        return data
+
+
+class CartBatchSerializer(serializers.Serializer):
+    operations = CartOperationSerializer(many=True, allow_empty=False, max_length=200)
+
+    def validate_operations(self, operations):
+        product_ids = {operation['product_id'] for operation in operations}
+        existing = set(Product.objects.filter(id__in=product_ids).values_list('id', flat=True))
+        missing = sorted(product_ids - existing)
+        if missing:
+            raise serializers.ValidationError(f"Продукты не найдены: {missing}")
+        return operations
+
+
 class CartItemDetailSerializer(serializers.ModelSerializer):
     product_name = serializers.CharField(source='product.product_name', read_only=True)
     product_price = serializers.IntegerField(source='product.price', read_only=True)
@@ -342,10 +475,10 @@ class CartItemDetailSerializer(serializers.ModelSerializer):
         fields = ['id', 'product', 'product_name', 'product_price', 'product_image', 'quantity', 'total_price']
 
     def get_total_price(self, obj):
-        return obj.product.price * obj.quantity
+        return obj.total_price
 
 class CartDetailSerializer(serializers.ModelSerializer):
-    items = CartItemDetailSerializer(many=True, read_only=True)
+    items = CartItemDetailSerializer(source='discounted_items', many=True, read_only=True)
     total_price = serializers.IntegerField(read_only=True)
 
     class Meta:
@@ -370,6 +503,14 @@ class FavoriteProductSerializer(serializers.ModelSerializer):
         fields = ['id', 'product', 'created_date']
 
 
+class FavoriteProductListSerializer(serializers.ModelSerializer):
+    product = ProductListSerializers(read_only=True)
+
+    class Meta:
+        model = FavoriteProduct
+        fields = ['id', 'product', 'created_date']
+
+
 class ReceiptSerializer(serializers.ModelSerializer):
     items = OrderItemSerializer(source="order.items", many=True, read_only=True)
     customer_name = serializers.CharField(source="order.user.username", read_only=True)
@@ -380,7 +521,7 @@ class ReceiptSerializer(serializers.ModelSerializer):
         model = Receipt
         fields = ["id", "store_name", "purchase_date", "delivery_date", "items", "total_sum", "delivery_cost", "customer_name", "email", "phone_number",]
 
-class ReviewSerializer(serializers.ModelSerializer):
+class ReviewSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     user = serializers.StringRelatedField(read_only=True)
     replies = serializers.SerializerMethodField()
 
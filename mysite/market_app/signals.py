@@ -1,6 +1,15 @@
 from django.dispatch import receiver
 from django_rest_passwordreset.signals import reset_password_token_created
 from django.core.mail import send_mail
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.db import transaction
+from django.db.models import Q
+from .models import Category, OrderItem, Ordering, Product, Sale, Review, Store, SubCategory, UserProfile
+from .autocomplete import current_index
+from .catalog import patch_snapshot
+from .result_cache import invalidate_tags, products_tags, scope_tags
+from .utils import client_cache_key, product_page_cache_key, shared_cache
+from .sales import sales_transitioned
 import random
 
 @receiver(reset_password_token_created)
@@ -16,3 +25,190 @@ def password_reset_token_created(sender, instance, reset_password_token, *args,
         [reset_password_token.user.email],
         fail_silently=False,
     )
+
+
+def invalidate_product_pages(product_ids):
+    # после коммита: иначе параллельный запрос успеет положить в кэш старые данные
+    keys = [product_page_cache_key(pk) for pk in product_ids]
+    if keys:
+        transaction.on_commit(lambda: shared_cache().delete_many(keys))
+
+
+@receiver([post_save, post_delete], sender=Product)
+def invalidate_product_page_on_product(sender, instance, **kwargs):
+    invalidate_product_pages([instance.pk])
+
+
+@receiver([post_save, post_delete], sender=Sale)
+@receiver([post_save, post_delete], sender=Review)
+def invalidate_product_page_on_related(sender, instance, **kwargs):
+    invalidate_product_pages([instance.product_id])
+
+
+@receiver([post_save, post_delete], sender=Store)
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=SubCategory)
+def invalidate_product_pages_on_scope(sender, instance, **kwargs):
+    # магазин, категория и подкатегория выводятся на странице товара
+    if sender is Store:
+        products = Product.objects.filter(store_id=instance.pk)
+    elif sender is Category:
+        products = Product.objects.filter(Q(category_id=instance.pk) | Q(subcategory__category_id=instance.pk))
+    else:
+        products = Product.objects.filter(subcategory_id=instance.pk)
+    invalidate_product_pages(products.values_list('pk', flat=True))
+
+
+@receiver(sales_transitioned)
+def invalidate_product_pages_on_schedule(sender, product_ids, **kwargs):
+    # bulk_update не отправляет post_save, поэтому сбрасываем кэш явно; кэш страниц
+    # общий, так что сброс из процесса sale-scheduler виден веб-процессам
+    invalidate_product_pages(product_ids)
+
+
+@receiver([post_save, post_delete], sender=UserProfile)
+def invalidate_client_profile(sender, instance, **kwargs):
+    key = client_cache_key(instance.pk)
+    transaction.on_commit(lambda: shared_cache().delete(key))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Category)
+def update_autocomplete_on_save(sender, instance, **kwargs):
+    index = current_index()
+    if index is None:
+        return
+    if sender is Product:
+        transaction.on_commit(lambda: index.add('product', instance.pk, instance.product_name))
+    else:
+        transaction.on_commit(lambda: index.add('category', instance.pk, instance.category_name))
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Category)
+def update_autocomplete_on_delete(sender, instance, **kwargs):
+    index = current_index()
+    if index is not None:
+        kind = 'product' if sender is Product else 'category'
+        pk = instance.pk
+        transaction.on_commit(lambda: index.remove(kind, pk))
+
+
+# колонки сортировки пересчитываются сразу, до снимка каталога (он обновляется после коммита)
+@receiver(post_save, sender=Product)
+def refresh_sort_values_on_product(sender, instance, **kwargs):
+    Product.objects.filter(pk=instance.pk).refresh_sort_values(['effective_price'])
+
+
+@receiver([post_save, post_delete], sender=Sale)
+@receiver([post_save, post_delete], sender=Review)
+def refresh_sort_values_on_related(sender, instance, **kwargs):
+    fields = ['effective_price'] if sender is Sale else ['rating']
+    Product.objects.filter(pk=instance.product_id).refresh_sort_values(fields)
+
+
+# popularity у позиций заказа — приращением: без агрегатов по истории заказов на каждую позицию
+@receiver(pre_save, sender=OrderItem)
+def remember_ordered_quantity(sender, instance, **kwargs):
+    instance.previous_line = None
+    if not instance._state.adding:
+        instance.previous_line = OrderItem.objects.filter(pk=instance.pk).values_list('product_id', 'quantity').first()
+
+
+@receiver(post_save, sender=OrderItem)
+def add_popularity_on_save(sender, instance, **kwargs):
+    previous = getattr(instance, 'previous_line', None)
+    if previous is not None:
+        Product.objects.filter(pk=previous[0]).add_popularity(-previous[1])
+    Product.objects.filter(pk=instance.product_id).add_popularity(instance.quantity)
+
+
+@receiver(post_delete, sender=OrderItem)
+def add_popularity_on_delete(sender, instance, **kwargs):
+    Product.objects.filter(pk=instance.product_id).add_popularity(-instance.quantity)
+
+
+@receiver(post_save, sender=Ordering)
+def copy_status_to_order_items(sender, instance, created, **kwargs):
+    # OrderItem.order_status — копия для входящих заказов продавца
+    if not created:
+        OrderItem.objects.filter(order_id=instance.pk).exclude(order_status=instance.delivery_status).update(
+            order_status=instance.delivery_status
+        )
+
+
+@receiver(sales_transitioned)
+def refresh_sort_values_on_schedule(sender, product_ids, **kwargs):
+    Product.objects.filter(pk__in=product_ids).refresh_sort_values(['effective_price'])
+
+
+def refresh_catalog_snapshot(product_ids):
+    transaction.on_commit(lambda: patch_snapshot(product_ids))
+
+
+@receiver([post_save, post_delete], sender=Product)
+def refresh_catalog_on_product(sender, instance, **kwargs):
+    refresh_catalog_snapshot([instance.pk])
+
+
+@receiver([post_save, post_delete], sender=Sale)
+@receiver([post_save, post_delete], sender=Review)
+@receiver([post_save, post_delete], sender=OrderItem)
+def refresh_catalog_on_related(sender, instance, **kwargs):
+    refresh_catalog_snapshot([instance.product_id])
+
+
+@receiver(sales_transitioned)
+def refresh_catalog_on_schedule(sender, product_ids, **kwargs):
+    refresh_catalog_snapshot(product_ids)
+
+
+@receiver(pre_save, sender=Product)
+def remember_product_scope(sender, instance, **kwargs):
+    # товар перенесли в другую категорию/магазин — сбросить надо и списки, где он был
+    instance._previous_scope = None
+    if instance.pk:
+        instance._previous_scope = Product.objects.filter(pk=instance.pk).values_list(
+            'category_id', 'subcategory_id', 'store_id').first()
+
+
+@receiver([post_save, post_delete], sender=Product)
+def invalidate_results_on_product(sender, instance, **kwargs):
+    tags = {'catalog'} | scope_tags(instance.category_id, instance.subcategory_id, instance.store_id)
+    if getattr(instance, '_previous_scope', None):
+        tags |= scope_tags(*instance._previous_scope)
+    if Sale.objects.filter(product_id=instance.pk).exists():
+        tags.add('sales')  # discounted_price считается от цены товара
+    invalidate_tags(tags)
+
+
+@receiver([post_save, post_delete], sender=Sale)
+def invalidate_results_on_sale(sender, instance, **kwargs):
+    invalidate_tags(products_tags([instance.product_id]) | {'sales'})
+
+
+@receiver([post_save, post_delete], sender=Review)
+def invalidate_results_on_review(sender, instance, **kwargs):
+    invalidate_tags(products_tags([instance.product_id]))
+
+
+@receiver(sales_transitioned)
+def invalidate_results_on_schedule(sender, product_ids, **kwargs):
+    invalidate_tags(products_tags(product_ids) | {'sales'})
+
+
+@receiver([post_save, post_delete], sender=OrderItem)
+def invalidate_results_on_order_item(sender, instance, **kwargs):
+    # популярность в ответе не выводится, от неё зависит только порядок
+    invalidate_tags({'popularity'})
+
+
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_results_on_category(sender, instance, **kwargs):
+    subcategories = SubCategory.objects.filter(category_id=instance.pk).values_list('pk', flat=True)
+    invalidate_tags({'catalog', f"category:{instance.pk}", *(f"subcategory:{pk}" for pk in subcategories)})
+
+
+@receiver([post_save, post_delete], sender=SubCategory)
+def invalidate_results_on_subcategory(sender, instance, **kwargs):
+    invalidate_tags({'catalog', *scope_tags(instance.category_id, instance.pk)})
@@ -0,0 +1,801 @@
+import asyncio
+import json
+import tempfile
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from .archive import ARCHIVABLE_STATUS, archive_orders
+from .autocomplete import AutocompleteIndex
+from .events import get_broker
+from .idempotency import idempotency_cache, run_idempotent
+from .models import (
+    Cart, CartItem, Category, OrderEvent, OrderItem, Ordering, Product, Sale, Store, SubCategory, UserProfile,
+)
+from .passwords import HashPool, PasswordHashingBusy
+from .profiling import list_profiles, read_profile
+from .query_plans import product_sort_checks, seed, view_checks
+from .recommendations import build_recommendations, recommended_product_ids
+from .renderers import FastJSONRenderer
+from .result_cache import ResultCache
+from .tokens import BloomFilter, RevocableRefreshToken, RevocationFilter, prune_expired_tokens
+from .utils import shared_cache
+
+TEST_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'idempotency': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'idempotency'},
+    'results': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'results'},
+}
+
+
+class ProductSortPlanTests(TestCase):
+    """
+    Каждая сортировка /product читается по индексу (field, id), без полной сортировки.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        seed(2000)
+
+    def test_sorts_use_index(self):
+        for check in product_sort_checks():
+            with self.subTest(check.name):
+                self.assertEqual(check.problems(), [])
+
+
+class ViewQueryPlanTests(TestCase):
+    """
+    Основные запросы view на заполненной базе идут по индексу, без полного скана и сортировки.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ids = seed(3000)
+
+    def test_views_use_index(self):
+        for check in view_checks(**self.ids):
+            with self.subTest(check.name):
+                self.assertEqual(check.problems(), [])
+
+
+@override_settings(CACHES=TEST_CACHES, RESULT_CACHE_ENABLED=False)
+class CatalogTestCase(TestCase):
+    """
+    Покупатель, магазин и три товара по 100; снимок каталога во временном каталоге.
+    """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        snapshot = override_settings(CATALOG_SNAPSHOT_FILE=f"{directory.name}/catalog.npy")
+        snapshot.enable()
+        self.addCleanup(snapshot.disable)
+
+        self.user = UserProfile.objects.create_user(username='buyer', email='buyer@x.com', password='!',
+                                                    phone_number='+996555000001')
+        category = Category.objects.create(category_name='c')
+        subcategory = SubCategory.objects.create(category=category, subcategory_name='sc')
+        store = Store.objects.create(owner=self.user, store_name='st', category=category, subcategory=subcategory)
+        self.products = [
+            Product.objects.create(store=store, category=category, subcategory=subcategory, product_name=f"p{i}",
+                                   description='', price=100, weight=1, quantity=5, composition='', action='',
+                                   expiration_date='', equipment='', product_code=str(i))
+            for i in range(3)
+        ]
+
+
+class PopularityOrderingTests(CatalogTestCase):
+    def ordered_ids(self):
+        response = self.client.get('/product', {'ordering': '-popularity'})
+        return [row['id'] for row in response.json()]
+
+    def test_order_updates_popularity_in_snapshot(self):
+        self.assertEqual(self.ordered_ids()[0], self.products[2].pk)  # снимок собран до заказа
+        order = Ordering.objects.create(user=self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            OrderItem.objects.create(order=order, product=self.products[0], quantity=5)
+        self.assertEqual(self.ordered_ids()[0], self.products[0].pk)
+
+    def popularity(self):
+        return list(Product.objects.order_by('pk').values_list('popularity', flat=True))
+
+    def test_order_lines_add_popularity_without_aggregates(self):
+        order = Ordering.objects.create(user=self.user)
+        with CaptureQueriesContext(connection) as queries:
+            items = [OrderItem.objects.create(order=order, product=product, quantity=i + 1)
+                     for i, product in enumerate(self.products)]
+        self.assertFalse([query['sql'] for query in queries if 'SUM(' in query['sql']])
+        self.assertEqual(self.popularity(), [1, 2, 3])
+
+        items[0].product, items[0].quantity = self.products[1], 4
+        items[0].save()
+        items[2].delete()
+        self.assertEqual(self.popularity(), [0, 6, 0])
+
+        Product.objects.update(popularity=0)
+        call_command('refresh_sort_values', stdout=StringIO())
+        self.assertEqual(self.popularity(), [0, 6, 0])
+
+
+class CartDiscountTests(CatalogTestCase):
+    """
+    Корзина показывает ту же сумму со скидками, что спишет оформление заказа.
+    """
+
+    def setUp(self):
+        super().setUp()
+        now = timezone.now()
+        Sale.objects.create(product=self.products[0], description='', discount_percent=20,
+                            start_date=now - timedelta(days=1), end_date=now + timedelta(days=1))
+        self.client.force_login(self.user)
+        self.client.post('/cart/batch/', {'operations': [
+            {'op': 'set', 'product_id': self.products[0].pk, 'quantity': 2},
+            {'op': 'set', 'product_id': self.products[1].pk, 'quantity': 1},
+        ]}, content_type='application/json')
+
+    def test_cart_total_matches_order(self):
+        for fast in (False, True):
+            with self.subTest(fast=fast), override_settings(FAST_SERIALIZATION=fast):
+                cart = self.client.get('/cart/').json()
+                self.assertEqual([item['total_price'] for item in cart['items']], [160, 100])
+                self.assertEqual(cart['total_price'], 260)
+        order = self.client.post('/orders/from-cart/').json()
+        self.assertEqual(order['total_sum'], 260)
+
+
+class RecommendationTests(CatalogTestCase):
+    def order(self, *products):
+        order = Ordering.objects.create(user=self.user)
+        for product in products:
+            OrderItem.objects.create(order=order, product=product, quantity=1)
+
+    def ids(self, url):
+        return [row['id'] for row in self.client.get(url).json()]
+
+    def test_frequently_bought_together(self):
+        p0, p1, p2 = self.products
+        for _ in range(3):
+            self.order(p0, p1)
+        self.order(p0, p2)
+        self.order(p0, p2)
+        self.order(p1)
+        build_recommendations(min_support=2)
+
+        self.assertEqual(self.ids(f'/product/{p0.pk}/recommendations/'), [p2.pk, p1.pk])  # lift p2 выше
+        self.assertEqual(self.ids(f'/product/{p2.pk}/recommendations/'), [p0.pk])
+
+        self.client.post('/cart/add/', {'product_id': p0.pk}, content_type='application/json')  # гость
+        self.assertEqual(self.ids('/cart/recommendations/'), [p2.pk, p1.pk])
+        self.client.force_login(self.user)
+        self.client.post('/cart/add/', {'product_id': p2.pk}, content_type='application/json')
+        self.assertEqual(self.ids('/cart/recommendations/'), [p0.pk])  # товары корзины не советуются
+
+    def test_archived_lines_of_deleted_products_are_skipped(self):
+        for _ in range(2):
+            self.order(*self.products)
+        Ordering.objects.update(delivery_status=ARCHIVABLE_STATUS, updated_at=timezone.now() - timedelta(days=1))
+        self.assertEqual(archive_orders(timezone.now()), 2)
+        self.products[2].delete()  # архивные позиции остаются и ссылаются на удалённый товар
+
+        self.assertEqual(build_recommendations(min_support=1), 2)
+        self.assertEqual(recommended_product_ids([self.products[0].pk]), [self.products[1].pk])
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ResultCacheTests(TestCase):
+    def setUp(self):
+        self.cache = ResultCache(max_entries=10, ttl=60)
+        self.builds = []
+
+    def build(self, value):
+        def build():
+            self.builds.append(value)
+            return value
+        return build
+
+    def test_hit_and_invalidation(self):
+        self.assertEqual(self.cache.get_or_build('k', {'catalog'}, self.build(1)), 1)
+        self.assertEqual(self.cache.get_or_build('k', {'catalog'}, self.build(2)), 1)
+        self.cache.invalidate({'catalog'})
+        self.assertEqual(self.cache.get_or_build('k', {'catalog'}, self.build(3)), 3)
+        self.assertEqual(self.builds, [1, 3])
+
+    def test_concurrent_miss_does_not_wait(self):
+        self.cache.get_or_build('k', {'catalog'}, self.build(1))
+        self.cache.invalidate({'catalog'})
+        self.cache.building.update({'k', 'new'})  # другой поток уже пересобирает эти ключи
+        self.assertEqual(self.cache.get_or_build('k', {'catalog'}, self.build(2)), 1)  # прежнее значение
+        self.assertEqual(self.cache.get_or_build('new', {'catalog'}, self.build(3)), 3)  # прежнего нет — сам
+        self.assertEqual(self.builds, [1, 3])
+
+
+class ProductListTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        for price, product in zip((300, 100, 200), self.products):
+            product.price = price
+            product.save()
+
+    def product_query(self, params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/product', params)
+        sql = [query['sql'] for query in queries if 'FROM "market_app_product"' in query['sql']]
+        return response.json(), sql
+
+    def test_page_from_snapshot_full_list_from_db(self):
+        expected = [self.products[0].pk, self.products[2].pk, self.products[1].pk]
+        page, sql = self.product_query({'ordering': '-price', 'limit': 2})
+        self.assertEqual([row['id'] for row in page['results']], expected[:2])
+        self.assertIn(' IN (', sql[-1])  # из БД — только строки страницы
+
+        full, sql = self.product_query({'ordering': '-price'})
+        self.assertEqual([row['id'] for row in full], expected)
+        self.assertTrue(all(' IN (' not in query for query in sql))
+
+
+class SellerInboxTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        store = self.products[0].store
+        second = Store.objects.create(owner=self.user, store_name='st2', category=store.category,
+                                      subcategory=store.subcategory)
+        Product.objects.filter(pk=self.products[2].pk).update(store=second)
+        for _ in range(3):
+            order = Ordering.objects.create(user=self.user)
+            for product in Product.objects.order_by('pk'):
+                OrderItem.objects.create(order=order, product=product, quantity=1)
+        self.client.force_login(self.user)
+
+    def test_pages_across_stores(self):
+        expected = list(OrderItem.objects.order_by('-created_at', '-id').values_list('pk', flat=True))
+        seen, url = [], '/seller/orders/?limit=2'
+        while url:
+            page = self.client.get(url).json()
+            seen += [row['id'] for row in page['results']]
+            url = page['next']
+        self.assertEqual(seen, expected)  # у позиций одного заказа created_at общий — без повторов и пропусков
+
+
+@override_settings(CACHES=TEST_CACHES)
+class IdempotencyTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        idempotency_cache().clear()  # LocMem живёт между тестами, а pk пользователя повторяется
+        self.client.force_login(self.user)
+
+    def add_to_cart(self, key, quantity=1):
+        return self.client.post('/cart/add/', {'product_id': self.products[0].pk, 'quantity': quantity},
+                                content_type='application/json', headers={'Idempotency-Key': key})
+
+    def cart_quantity(self):
+        return CartItem.objects.get(cart__user=self.user).quantity
+
+    def test_repeat_is_replayed(self):
+        first = self.add_to_cart('k1')
+        second = self.add_to_cart('k1')
+        self.assertEqual(second.status_code, first.status_code)
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(self.cart_quantity(), 1)  # выполнен один раз
+
+        self.add_to_cart('k2')
+        self.assertEqual(self.cart_quantity(), 2)  # другой ключ — новый запрос
+
+    def test_same_key_with_other_data(self):
+        self.add_to_cart('k1')
+        response = self.add_to_cart('k1', quantity=5)
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(self.cart_quantity(), 1)
+
+    def test_concurrent_duplicate_gets_409(self):
+        request = Request(APIRequestFactory().post('/cart/add/', {'quantity': 1}, format='json'),
+                          parsers=[JSONParser()])
+        request.user = self.user
+        duplicates = []
+
+        def handler():
+            # дубль приходит, пока первый запрос ещё выполняется
+            duplicates.append(run_idempotent(request, 'k1', lambda: self.fail("дубль выполнен")))
+            return Response({'ok': True}, status=201)
+
+        self.assertEqual(run_idempotent(request, 'k1', handler).status_code, 201)
+        self.assertEqual(duplicates[0].status_code, 409)
+        self.assertEqual(duplicates[0]['Retry-After'], '1')
+        self.assertTrue(run_idempotent(request, 'k1', handler).has_header('Idempotent-Replayed'))
+
+
+class ArchiveTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.order = Ordering.objects.create(user=self.user)
+        for product in self.products[:2]:
+            OrderItem.objects.create(order=self.order, product=product, quantity=2)
+        Ordering.objects.update(delivery_status=ARCHIVABLE_STATUS, updated_at=timezone.now() - timedelta(days=1))
+        self.expected = self.client_for(self.user).get(f'/orders/{self.order.pk}/').json()
+        self.assertEqual(archive_orders(timezone.now()), 1)
+
+    def client_for(self, user):
+        self.client.force_login(user)
+        return self.client
+
+    def test_archived_order_is_read_back(self):
+        self.assertFalse(Ordering.objects.exists())
+        self.assertFalse(OrderItem.objects.exists())
+        self.assertEqual(list(Product.objects.order_by('pk').values_list('popularity', flat=True)), [2, 2, 0])
+
+        response = self.client.get(f'/orders/{self.order.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), self.expected)
+        self.assertEqual([order['id'] for order in self.client.get('/orders/').json()], [self.order.pk])
+
+    def test_archived_order_is_read_only(self):
+        response = self.client.patch(f'/orders/{self.order.pk}/', {'is_paid': True}, content_type='application/json')
+        self.assertEqual(response.status_code, 404)
+
+    def test_other_user_cannot_read_archived_order(self):
+        other = UserProfile.objects.create_user(username='other', email='other@x.com', password='!',
+                                                phone_number='+996555000002')
+        self.assertEqual(self.client_for(other).get(f'/orders/{self.order.pk}/').status_code, 404)
+
+
+class GuestCartTests(CatalogTestCase):
+    def add_to_cart(self, product, quantity):
+        return self.client.post('/cart/add/', {'product_id': product.pk, 'quantity': quantity},
+                                content_type='application/json')
+
+    def cart_items(self):
+        return {item['product']: item['quantity'] for item in self.client.get('/cart/').json()['items']}
+
+    def test_cart_lives_in_signed_cookie(self):
+        self.add_to_cart(self.products[0], 1)
+        self.add_to_cart(self.products[0], 2)
+        self.assertIn(settings.GUEST_CART_COOKIE, self.client.cookies)
+        self.assertEqual(self.cart_items(), {self.products[0].pk: 3})
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_tampered_cookie_is_an_empty_cart(self):
+        self.add_to_cart(self.products[0], 1)
+        value = self.client.cookies[settings.GUEST_CART_COOKIE].value
+        self.client.cookies[settings.GUEST_CART_COOKIE] = value[:-1] + ('A' if value[-1] != 'A' else 'B')
+        self.assertEqual(self.cart_items(), {})
+
+    def test_login_merges_quantities(self):
+        self.user.set_password('pw12345!')
+        self.user.save()
+        Cart.objects.create(user=self.user).items.create(product=self.products[0], quantity=1)
+        self.add_to_cart(self.products[0], 2)
+        self.add_to_cart(self.products[1], 1)
+
+        response = self.client.post('/login/', {'email': self.user.email, 'password': 'pw12345!'},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.cookies[settings.GUEST_CART_COOKIE]['max-age'], 0)  # cookie удалена
+        self.assertEqual(dict(CartItem.objects.filter(cart__user=self.user).values_list('product_id', 'quantity')),
+                         {self.products[0].pk: 3, self.products[1].pk: 1})
+
+
+class OrderStatusTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.order = Ordering.objects.create(user=self.user)
+        OrderItem.objects.create(order=self.order, product=self.products[0], quantity=1)
+        self.client.force_login(self.user)
+
+    def set_status(self, order, status):
+        return self.client.patch(f'/orders/{order.pk}/', {'delivery_status': status}, content_type='application/json')
+
+    def test_allowed_transition_is_logged(self):
+        self.assertEqual(self.set_status(self.order, 'В пути').status_code, 200)
+        self.assertEqual(list(OrderEvent.objects.values_list('from_status', 'to_status')), [('В обработке', 'В пути')])
+        self.assertEqual(OrderItem.objects.get().order_status, 'В пути')
+
+    def test_rejected_transition(self):
+        response = self.set_status(self.order, 'Доставлено')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('delivery_status', response.json())
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.delivery_status, 'В обработке')
+        self.assertFalse(OrderEvent.objects.exists())
+
+    def test_status_is_not_changed_without_event(self):
+        with mock.patch.object(OrderEvent.objects, 'create', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                self.set_status(self.order, 'В пути')
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.delivery_status, 'В обработке')
+
+    def test_bulk_transition(self):
+        delivered = Ordering.objects.create(user=self.user, delivery_status='Доставлено')
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.post('/orders/status/bulk/', {
+            'order_ids': [self.order.pk, delivered.pk, 999_999], 'status': 'В пути',
+        }, content_type='application/json')
+        self.assertEqual(response.json(), {
+            'updated': [self.order.pk],
+            'rejected': [{'id': delivered.pk, 'status': 'Доставлено'}],
+            'not_found': [999_999],
+        })
+        self.assertEqual(OrderItem.objects.get().order_status, 'В пути')
+        self.assertEqual(list(OrderEvent.objects.values_list('order_id', 'to_status')), [(self.order.pk, 'В пути')])
+
+
+class CartBatchTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+
+    def batch(self, operations):
+        return self.client.post('/cart/batch/', {'operations': operations}, content_type='application/json')
+
+    def cart(self):
+        return dict(CartItem.objects.filter(cart__user=self.user).values_list('product_id', 'quantity'))
+
+    def test_operations_are_applied_in_order(self):
+        p0, p1, p2 = (product.pk for product in self.products)
+        self.batch([{'op': 'add', 'product_id': p2, 'quantity': 1}])
+        response = self.batch([
+            {'op': 'add', 'product_id': p0, 'quantity': 2},
+            {'op': 'add', 'product_id': p0, 'quantity': 1},
+            {'op': 'set', 'product_id': p1, 'quantity': 5},
+            {'op': 'remove', 'product_id': p2},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.cart(), {p0: 3, p1: 5})
+        self.assertEqual({item['product']: item['quantity'] for item in response.json()['items']}, {p0: 3, p1: 5})
+
+    def test_unknown_product_rejects_whole_batch(self):
+        response = self.batch([
+            {'op': 'add', 'product_id': self.products[0].pk, 'quantity': 1},
+            {'op': 'add', 'product_id': 999_999, 'quantity': 1},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.cart(), {})
+
+    def test_query_count_does_not_grow_with_operations(self):
+        def count(operations):
+            with CaptureQueriesContext(connection) as queries:
+                self.batch(operations)
+            return len(queries)
+
+        count([{'op': 'add', 'product_id': self.products[0].pk, 'quantity': 1}])  # корзина создана
+        small = count([{'op': 'add', 'product_id': self.products[0].pk, 'quantity': 1}])
+        large = count([{'op': 'add', 'product_id': product.pk, 'quantity': 1} for product in self.products * 10])
+        self.assertEqual(small, large)
+
+
+class FastSerializationTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        now = timezone.now()
+        Sale.objects.create(product=self.products[0], description='«скидка» ', discount_percent=15,
+                            start_date=now - timedelta(days=1), end_date=now + timedelta(days=1))
+        self.client.force_login(self.user)
+
+    def test_fast_path_matches_standard_bytes(self):
+        for url, params in [('/product', {}), ('/product', {'limit': 2, 'ordering': '-price'}),
+                            ('/product', {'fields': 'id,product_name,avg_rating,is_favorited'}),
+                            ('/category', {}), ('/sale', {}), ('/sale', {'expand': 'product'}), ('/cart/', {})]:
+            with self.subTest(url=url, params=params):
+                with override_settings(FAST_SERIALIZATION=False):
+                    expected = self.client.get(url, params)
+                with override_settings(FAST_SERIALIZATION=True):
+                    fast = self.client.get(url, params)
+                self.assertEqual(fast.status_code, 200)
+                self.assertEqual(fast.content, expected.content)
+
+    def test_renderer_matches_json_renderer(self):
+        data = {'name': 'Халяль «мясо»', 'separators': '  ', 'price': 1.5, 'items': [1, None, True],
+                'decimal': Decimal('2.50'), 'created_at': timezone.now()}
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+
+class SparseFieldsetTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        now = timezone.now()
+        self.sale = Sale.objects.create(product=self.products[0], description='d', discount_percent=10,
+                                        start_date=now - timedelta(days=1), end_date=now + timedelta(days=1))
+
+    def get(self, url, params, table):
+        with CaptureQueriesContext(connection) as queries:
+            rows = self.client.get(url, params).json()
+        return rows, [query['sql'] for query in queries if f'FROM "{table}"' in query['sql']]
+
+    def test_only_requested_fields_and_columns(self):
+        rows, sql = self.get('/product', {'fields': 'id,product_name'}, 'market_app_product')
+        self.assertEqual(rows[0], {'id': self.products[0].pk, 'product_name': 'p0'})
+        self.assertNotIn('"description"', sql[0])
+
+        rows, sql = self.get('/sale', {'fields': 'id,discounted_price'}, 'market_app_sale')
+        self.assertEqual(rows, [{'id': self.sale.pk, 'discounted_price': 90}])
+        self.assertNotIn('"description"', sql[0])
+
+    def test_expand(self):
+        rows, _ = self.get('/sale', {'fields': 'id,product'}, 'market_app_sale')
+        self.assertEqual(rows[0]['product'], self.products[0].pk)
+        rows, _ = self.get('/sale', {'fields': 'id,product', 'expand': 'product'}, 'market_app_sale')
+        self.assertEqual(rows[0]['product']['id'], self.products[0].pk)
+
+
+@override_settings(ORDER_EVENTS_BROKER='market_app.events.LocalBroker', ORDER_EVENTS_HEARTBEAT=5)
+class OrderEventStreamTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        broker = mock.patch('market_app.events._broker', None)  # свой LocalBroker на тест
+        broker.start()
+        self.addCleanup(broker.stop)
+        order = Ordering.objects.create(user=self.user)
+        self.events = [
+            OrderEvent.objects.create(order=order, from_status='В обработке', to_status='В пути'),
+            OrderEvent.objects.create(order=order, from_status='В пути', to_status='Доставлено'),
+        ]
+
+    async def next_message(self, response):
+        chunk = await asyncio.wait_for(anext(aiter(response.streaming_content)), timeout=5)
+        return json.loads((chunk.decode() if isinstance(chunk, bytes) else chunk).split('data: ', 1)[1])
+
+    async def test_requires_authentication(self):
+        response = await self.async_client.get('/orders/events/stream/')
+        self.assertEqual(response.status_code, 401)
+
+    async def test_missed_then_live_events(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get('/orders/events/stream/',
+                                               headers={'Last-Event-ID': str(self.events[0].pk)})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual((await self.next_message(response))['id'], self.events[1].pk)  # пропущенное
+
+        live = {'id': self.events[1].pk + 1, 'order': self.events[1].order_id, 'to_status': 'Доставлено'}
+        # publish вызывается из потока синхронного view
+        await asyncio.get_running_loop().run_in_executor(None, get_broker().publish, self.user.pk, live)
+        self.assertEqual(await self.next_message(response), live)
+
+
+class AutocompleteTests(TestCase):
+    def setUp(self):
+        self.index = AutocompleteIndex()
+        for pk, name in enumerate(['Молоко коровье', 'Халва подсолнечная', 'Мёд цветочный', 'Milk shake'], 1):
+            self.index.add('product', pk, name)
+        self.index.add('category', 1, 'Молочные продукты')
+
+    def names(self, query):
+        return [item['name'] for item in self.index.suggest(query)]
+
+    def test_prefix_and_word_start(self):
+        self.assertEqual(self.names('мол'), ['Молоко коровье', 'Молочные продукты'])
+        self.assertEqual(self.names('подс'), ['Халва подсолнечная'])
+        self.assertEqual(self.names('мед'), ['Мёд цветочный'])  # ё = е
+
+    def test_other_keyboard_layout(self):
+        self.assertEqual(self.names('vjkj'), ['Молоко коровье', 'Молочные продукты'])
+        self.assertEqual(self.names('ьшдл'), ['Milk shake'])
+
+    def test_one_typo(self):
+        self.assertEqual(self.names('халаа'), ['Халва подсолнечная'])
+
+    def test_remove_and_rename(self):
+        self.index.remove('category', 1)
+        self.index.add('product', 1, 'Кефир')
+        self.assertEqual(self.names('мол'), [])
+        self.assertEqual(self.names('кеф'), ['Кефир'])
+        self.assertEqual(self.index.suggest('кеф'), [{'type': 'product', 'id': 1, 'name': 'Кефир'}])
+
+
+@override_settings(CACHES=TEST_CACHES)
+class UserDirectoryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = UserProfile.objects.create_user(username='staff', email='staff@x.com', password='!',
+                                                    phone_number='+996555000000', is_staff=True)
+        cls.users = [
+            UserProfile.objects.create_user(username=f"user{i}", email=f"u{i}@x.com", password='!',
+                                            phone_number=f"+99670000000{i}", role='продавец' if i % 2 else 'клиент')
+            for i in range(5)
+        ]
+
+    def setUp(self):
+        shared_cache().clear()
+        self.client.force_login(self.staff)
+
+    def ids(self, params):
+        return [row['id'] for row in self.client.get('/client', params).json()['results']]
+
+    def test_staff_only(self):
+        self.client.force_login(self.users[0])
+        self.assertEqual(self.client.get('/client').status_code, 403)
+        self.assertEqual(self.client.get(f'/client/{self.users[1].pk}/').status_code, 403)
+
+    def test_keyset_pages(self):
+        seen, url = [], '/client?limit=2'
+        while url:
+            page = self.client.get(url).json()
+            self.assertEqual(page['count'], 6)
+            seen += [row['id'] for row in page['results']]
+            url = page['next']
+        self.assertEqual(seen, sorted((user.pk for user in [self.staff, *self.users]), reverse=True))
+
+    def test_filters(self):
+        self.assertEqual(self.ids({'role': 'продавец'}), [self.users[3].pk, self.users[1].pk])
+        self.assertEqual(self.ids({'q': 'user2'}), [self.users[2].pk])
+        self.assertEqual(self.ids({'q': 'u4@'}), [self.users[4].pk])
+        self.assertEqual(self.ids({'q': '996 700 000 003'}), [self.users[3].pk])
+
+    def test_profile_cache_is_reset_on_save(self):
+        user = self.users[0]
+        self.assertEqual(self.client.get(f'/client/{user.pk}/').json()['username'], 'user0')
+        with self.captureOnCommitCallbacks(execute=True):
+            user.username = 'renamed'
+            user.save()
+        self.assertEqual(self.client.get(f'/client/{user.pk}/').json()['username'], 'renamed')
+
+
+class TokenRevocationTests(TestCase):
+    def setUp(self):
+        self.user = UserProfile.objects.create_user(username='buyer', email='buyer@x.com', password='!',
+                                                    phone_number='+996555000001')
+        self.revocations = RevocationFilter()
+        patcher = mock.patch('market_app.tokens._revocations', self.revocations)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_bloom_filter(self):
+        bloom = BloomFilter(1000)
+        for i in range(1000):
+            bloom.add(f"jti-{i}")
+        self.assertTrue(all(f"jti-{i}" in bloom for i in range(1000)))  # без ложноотрицательных
+        false_positives = sum(f"other-{i}" in bloom for i in range(10_000))
+        self.assertLess(false_positives, 300)  # ~1%
+
+    def test_revoked_token_is_rejected_without_query(self):
+        token = RevocableRefreshToken.for_user(self.user)
+        other = RevocableRefreshToken.for_user(self.user)
+        self.assertFalse(self.revocations.check(token['jti']))  # фильтр построен
+        with self.captureOnCommitCallbacks(execute=True):
+            token.blacklist()
+        with self.assertNumQueries(0):
+            self.assertTrue(self.revocations.check(token['jti']))
+            self.assertFalse(self.revocations.check(other['jti']))
+        with self.assertRaises(TokenError):
+            RevocableRefreshToken(str(token))
+        RevocableRefreshToken(str(other))
+
+    @override_settings(REVOCATION_FILTER_REFRESH=0)
+    def test_revocation_from_other_process(self):
+        token = RevocableRefreshToken.for_user(self.user)
+        self.assertFalse(self.revocations.check(token['jti']))
+        # отзыв в другом процессе: строка в БД без сигнала этому фильтру
+        BlacklistedToken.objects.create(token=OutstandingToken.objects.get(jti=token['jti']))
+        self.assertTrue(self.revocations.check(token['jti']))
+
+    def test_prune_expired_tokens(self):
+        tokens = [RevocableRefreshToken.for_user(self.user) for _ in range(4)]
+        for token in tokens[:2]:
+            token.blacklist()
+        OutstandingToken.objects.filter(jti__in=[token['jti'] for token in tokens[:3]]).update(
+            expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(prune_expired_tokens(batch_size=2), 3)
+        self.assertEqual(list(OutstandingToken.objects.values_list('jti', flat=True)), [tokens[3]['jti']])
+        self.assertFalse(BlacklistedToken.objects.exists())
+
+
+@override_settings(PASSWORD_PBKDF2_ITERATIONS=1000)
+class PasswordHashingTests(TestCase):
+    def setUp(self):
+        self.user = UserProfile.objects.create_user(username='buyer', email='buyer@x.com', password='pw12345!',
+                                                    phone_number='+996555000001')
+        self.pool = HashPool(workers=1, queue_size=0)
+        patcher = mock.patch('market_app.passwords._pool', self.pool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def login(self, password='pw12345!'):
+        return self.client.post('/login/', {'email': self.user.email, 'password': password},
+                                content_type='application/json')
+
+    def test_full_pool_answers_503(self):
+        self.pool.pending = self.pool.limit  # все потоки и очередь заняты
+        for response in (self.login(), self.client.post('/register/', {
+                'username': 'new', 'email': 'new@x.com', 'phone_number': '+996555000002', 'password': 'pw12345!',
+        }, content_type='application/json')):
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(response['Retry-After'], '1')
+        self.assertFalse(UserProfile.objects.filter(email='new@x.com').exists())
+
+    async def test_pool_rejects_over_limit(self):
+        started, release = threading.Event(), threading.Event()
+
+        def slow():
+            started.set()
+            release.wait(5)
+            return 'done'
+
+        task = asyncio.ensure_future(self.pool.run(slow))
+        await asyncio.get_running_loop().run_in_executor(None, started.wait, 5)
+        with self.assertRaises(PasswordHashingBusy):
+            await self.pool.run(slow)
+        release.set()
+        self.assertEqual(await task, 'done')
+        self.assertEqual(self.pool.pending, 0)
+
+    def test_login_checks_password_and_upgrades_hash(self):
+        self.assertEqual(self.login('wrong').status_code, 400)
+        with override_settings(PASSWORD_PBKDF2_ITERATIONS=2000):
+            response = self.login()
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('access', response.json())
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$2000$'))
+
+
+class ProfilingTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        profiles = override_settings(PROFILING_DIR=directory.name, PROFILING_SAMPLE_RATE=0.0, PROFILING_KEEP=2)
+        profiles.enable()
+        self.addCleanup(profiles.disable)
+
+    def get(self, **headers):
+        return self.client.get('/product', {'ordering': 'price', 'token': 'secret'}, headers=headers)
+
+    def saved(self):
+        return sorted(path.name for path in self.directory.glob('*.json'))
+
+    def test_off_by_default(self):
+        response = self.get()
+        self.assertFalse(response.has_header('X-Profile-Id'))
+        self.client.force_login(self.user)  # не staff
+        self.assertFalse(self.get(**{'X-Profile': '1'}).has_header('X-Profile-Id'))
+        self.assertEqual(self.saved(), [])
+
+    def test_disabled_middleware_ignores_header(self):
+        self.user.is_staff = True
+        self.user.save()
+        self.client.force_login(self.user)
+        with override_settings(PROFILING_ENABLED=False):
+            self.client = self.client_class()  # middleware собирается заново
+            self.client.force_login(self.user)
+            self.assertFalse(self.get(**{'X-Profile': '1'}).has_header('X-Profile-Id'))
+        self.assertEqual(self.saved(), [])
+
+    def test_staff_header_saves_profile(self):
+        self.user.is_staff = True
+        self.user.save()
+        self.client.force_login(self.user)
+        profile_id = self.get(**{'X-Profile': '1'})['X-Profile-Id']
+        self.assertEqual(self.saved(), [f'{profile_id}.json', f'{profile_id}.speedscope.json'])
+
+        meta = read_profile(profile_id)
+        self.assertEqual((meta['trigger'], meta['user'], meta['status']), ('header', 'buyer', 200))
+        self.assertEqual(meta['path'], '/product?ordering=price&token=***')  # JWT из ?token= не сохраняется
+        self.assertTrue(any('market_app_product' in query['sql'] for query in meta['queries']))
+        speedscope = json.loads((self.directory / f'{profile_id}.speedscope.json').read_text())
+        self.assertEqual(speedscope['profiles'][0]['type'], 'sampled')
+
+        self.assertContains(self.client.get('/admin/profiles/'), profile_id)
+
+    @override_settings(PROFILING_SAMPLE_RATE=1.0)
+    def test_sampling_keeps_last_profiles(self):
+        ids = [self.get()['X-Profile-Id'] for _ in range(3)]
+        self.assertEqual(read_profile(ids[-1])['trigger'], 'sample')
+        self.assertEqual([profile['id'] for profile in list_profiles()], ids[:0:-1])  # PROFILING_KEEP=2
@@ -0,0 +1,152 @@
+"""
+Быстрая проверка отзыва refresh-токенов и чистка таблиц token_blacklist.
+
+simplejwt проверяет каждый refresh-токен запросом к BlacklistedToken. Здесь
+вместо этого в памяти процесса держится фильтр Блума по jti отозванных и ещё
+не истёкших токенов плюс точное множество отозванных после последней
+пересборки. Фильтр догружает новые строки BlacklistedToken (по id) не чаще
+раза в REVOCATION_FILTER_REFRESH секунд и пересобирается целиком раз в
+REVOCATION_FILTER_REBUILD секунд, чтобы выбросить истёкшие. В БД идём только
+при срабатывании фильтра Блума (ложное ~1%). Отзыв в другом процессе виден
+здесь не позже чем через REVOCATION_FILTER_REFRESH секунд.
+"""
+import hashlib
+import math
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate=0.01):
+        capacity = max(capacity, 1000)
+        self.capacity = capacity
+        self.size = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = np.zeros(self.size, dtype=bool)
+
+    def positions(self, item):
+        # двойное хэширование: k позиций из двух 64-битных половин одного blake2b
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, item):
+        self.bits[self.positions(item)] = True
+
+    def __contains__(self, item):
+        return bool(self.bits[self.positions(item)].all())
+
+
+class RevocationFilter:
+    # перечитываем и немного уже виденных id: строка с меньшим id могла закоммититься позже
+    refresh_overlap = 100
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.bloom = None
+        self.recent = set()
+        self.last_id = 0
+        self.built_at = self.refreshed_at = 0.0
+
+    def rebuild(self):
+        last_id = BlacklistedToken.objects.aggregate(Max('id'))['id__max'] or 0
+        jtis = list(BlacklistedToken.objects.filter(token__expires_at__gt=timezone.now())
+                    .values_list('token__jti', flat=True))
+        bloom = BloomFilter(len(jtis) * 2)  # запас под отзывы до следующей пересборки
+        for jti in jtis:
+            bloom.add(jti)
+        self.bloom, self.recent, self.last_id = bloom, set(), last_id
+        self.built_at = self.refreshed_at = time.monotonic()
+
+    def refresh(self):
+        rows = (BlacklistedToken.objects.filter(id__gt=self.last_id - self.refresh_overlap)
+                .order_by('id').values_list('id', 'token__jti'))
+        for pk, jti in rows:
+            self.bloom.add(jti)
+            self.recent.add(jti)
+            self.last_id = max(self.last_id, pk)
+        self.refreshed_at = time.monotonic()
+
+    def sync(self):
+        now = time.monotonic()
+        with self.lock:
+            if (self.bloom is None or now - self.built_at > settings.REVOCATION_FILTER_REBUILD
+                    or len(self.recent) > self.bloom.capacity // 2):
+                self.rebuild()
+            elif now - self.refreshed_at > settings.REVOCATION_FILTER_REFRESH:
+                self.refresh()
+
+    def check(self, jti):
+        """
+        True — точно отозван, False — точно нет, None — надо спросить БД.
+        """
+        if jti in self.recent:
+            return True
+        self.sync()
+        if jti in self.recent:
+            return True
+        return None if jti in self.bloom else False
+
+    def add(self, jti):
+        with self.lock:
+            if self.bloom is not None:
+                self.bloom.add(jti)
+                self.recent.add(jti)
+
+
+_revocations = RevocationFilter()
+
+
+def get_revocation_filter():
+    return _revocations
+
+
+class RevocableRefreshToken(RefreshToken):
+    """
+    RefreshToken, который проверяет отзыв через RevocationFilter, а не запросом к БД.
+    """
+
+    def check_blacklist(self):
+        jti = self.payload[api_settings.JTI_CLAIM]
+        revoked = get_revocation_filter().check(jti)
+        if revoked is None:
+            return super().check_blacklist()
+        if revoked:
+            raise TokenError("Token is blacklisted")
+
+    def blacklist(self):
+        result = super().blacklist()
+        jti = self.payload[api_settings.JTI_CLAIM]
+        transaction.on_commit(lambda: get_revocation_filter().add(jti))
+        return result
+
+
+def prune_expired_tokens(batch_size=5000, pause=0.0):
+    """
+    Удаляет истёкшие OutstandingToken (и их BlacklistedToken) пакетами по
+    batch_size, каждый пакет в своей транзакции. Возвращает число удалённых токенов.
+    """
+    total = 0
+    while True:
+        with transaction.atomic():
+            ids = list(OutstandingToken.objects.filter(expires_at__lte=timezone.now())
+                       .order_by('id').values_list('id', flat=True)[:batch_size])
+            if not ids:
+                return total
+            # BlacklistedToken удаляются каскадом
+            OutstandingToken.objects.filter(id__in=ids).delete()
+        total += len(ids)
+        if len(ids) < batch_size:
+            return total
+        if pause:
+            time.sleep(pause)
@@ -20,6 +20,9 @@ urlpatterns = [
     path('subcategory', SubCategoryAPIView.as_view(), name='subcategory_list'),
     path('product', ProductListAPIView.as_view(), name='product_list'),
     path('sale', SaleAPIView.as_view(), name='sale_list'),
+    path('product/autocomplete/', ProductAutocompleteView.as_view(), name='product-autocomplete'),
+    path('product/<int:pk>/', ProductDetailView.as_view(), name='product-detail'),
+    path('product/<int:pk>/recommendations/', ProductRecommendationView.as_view(), name='product-recommendations'),
 
     path("reviews/", ReviewListCreateView.as_view(), name="review-list-create"),
     path("reviews/<int:pk>/", ReviewDetailView.as_view(), name="review-detail"),
@@ -28,17 +31,22 @@ urlpatterns = [
     path('password_reset/', include('django_rest_passwordreset.urls', namespace='password_reset')),
     path('password_reset/verify_code/', verify_reset_code, name='verify_reset_code'),
 
-    path('register/', RegisterView.as_view(), name='register'),
-    path('login/', CustomLoginView.as_view(), name='login'),
+    path('register/', register_user, name='register'),
+    path('login/', login_user, name='login'),
     path('logout/', LogoutView.as_view(), name='login'),
 
     path('cart/', CartDetailView.as_view(), name='cart-detail'),  # GET корзина
     path('cart/add/', CartItemCreateView.as_view(), name='cart-item-add'),  # POST добавить товар
+    path('cart/batch/', CartBatchView.as_view(), name='cart-batch'),  # POST пачка операций add/set/remove
     path('cart/delete/<int:product_id>/', CartItemDeleteView.as_view(), name='cart-item-delete'), # DELETE удалить товар
+    path('cart/recommendations/', CartRecommendationView.as_view(), name='cart-recommendations'),
 
 
     path("orders/", OrderListCreateView.as_view(), name="order-list"),
     path("orders/<int:pk>/", OrderDetailView.as_view(), name="order-detail"),
+    path("orders/<int:pk>/events/", OrderEventListView.as_view(), name="order-events"),
+    path("orders/status/bulk/", OrderBulkStatusView.as_view(), name="order-status-bulk"),
+    path("orders/events/stream/", order_events_stream, name="order-events-stream"),
 
     path("orders/from-cart/", CreateOrderFromCartView.as_view(), name="order-from-cart"),
 
@@ -51,6 +59,7 @@ urlpatterns = [
 
     path("seller/request-code/", SellerRequestCodeView.as_view(), name="seller-request-code"),
     path("seller/verify-code/", SellerVerifyCodeView.as_view(), name="seller-verify-code"),
+    path("seller/orders/", SellerInboxView.as_view(), name="seller-inbox"),
 
 ]
 
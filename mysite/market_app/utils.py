@@ -1,6 +1,7 @@
 import random
 from django.core.mail import send_mail
 from django.conf import settings
+from django.core.cache import caches
 
 
 def send_seller_verification_code(user):
@@ -21,4 +22,26 @@ def send_seller_verification_code(user):
         fail_silently=False,
     )
 
-    return code
\ No newline at end of file
+    return code
+
+
+def shared_cache():
+    """
+    Общий для рабочих процессов кэш (settings.RESULT_CACHE): сброс из сигнала в
+    одном процессе виден во всех, в отличие от LocMem-кэша 'default'.
+    """
+    return caches[settings.RESULT_CACHE]
+
+
+def product_page_cache_key(product_id):
+    """
+    Ключ кэша агрегированной страницы товара (ProductDetailView).
+    """
+    return f"product_page:{product_id}"
+
+
+def client_cache_key(user_id):
+    """
+    Ключ кэша профиля пользователя (ClientDetailAPIView).
+    """
+    return f"client:{user_id}"
@@ -2,33 +2,109 @@ from rest_framework import views
 from .serializers import *
 from rest_framework import status, viewsets, generics, permissions, response
 from rest_framework.response import Response
-from rest_framework_simplejwt.tokens import RefreshToken
+from .passwords import PasswordHashingBusy, hash_password
+from .tokens import RevocableRefreshToken
 from rest_framework.decorators import api_view
 from rest_framework.views import APIView
-from django.http import Http404
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from asgiref.sync import sync_to_async
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, AuthenticationFailed
+import asyncio
+import functools
+import json
+from django.db import transaction
+from django.db.models import Count, Prefetch, Value
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from rest_framework.filters import SearchFilter
 from rest_framework import filters
 from rest_framework.exceptions import PermissionDenied
+from .recommendations import recommended_product_ids
+from .cart import apply_cart_operations
+from .orders import bulk_transition
+from .archive import merge_order_tiers
+from .guest_cart import (
+    GuestCartMixin, apply_guest_operations, guest_cart_data, merge_guest_cart, write_guest_cart,
+)
+from .idempotency import IdempotentPostMixin
+from .result_cache import CachedListMixin, scope_tags
+from .autocomplete import get_index
+from .catalog import get_snapshot
+from .filters import ProductFilter, SellerInboxFilter, UserDirectoryFilter
+from .pagination import KeysetPagination, SellerInboxPagination
+from django_filters.rest_framework import DjangoFilterBackend
+from rest_framework.pagination import LimitOffsetPagination
+from .events import get_broker, notify_order_events, order_event_message
+from .utils import client_cache_key, product_page_cache_key, shared_cache
+from .fast_serializers import CategoryRowSerializer, ProductRowSerializer, SaleRowSerializer, serialize_cart
+from .renderers import FastJSONRenderer
+from rest_framework.renderers import JSONRenderer
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+
+
+
+
+def password_view(view):
+    """
+    Асинхронный POST-эндпоинт с хэшированием пароля (market_app/passwords.py):
+    разбирает тело как request.data в DRF, ValidationError превращает в 400,
+    переполненный пул хэширования — в 503. view(request, data) возвращает json_response.
+    """
+    @csrf_exempt
+    @require_POST
+    @functools.wraps(view)
+    async def wrapper(request):
+        if request.content_type == 'application/json':
+            try:
+                data = json.loads(request.body or b'{}')
+            except ValueError:
+                return JsonResponse({'detail': 'JSON parse error'}, status=status.HTTP_400_BAD_REQUEST)
+        else:
+            data = request.POST
+        try:
+            return await view(request, data)
+        except serializers.ValidationError as exc:
+            return json_response(serializers.as_serializer_error(exc), status.HTTP_400_BAD_REQUEST)
+        except PasswordHashingBusy:
+            response = JsonResponse({'detail': 'Сервер перегружен, повторите запрос позже'},
+                                    status=status.HTTP_503_SERVICE_UNAVAILABLE)
+            response['Retry-After'] = '1'
+            return response
+    return wrapper
 
 
+def json_response(payload, code):
+    return HttpResponse(JSONRenderer().render(payload), status=code, content_type='application/json')
 
 
-class RegisterView(generics.CreateAPIView):
-    serializer_class = RegisterSerializer
+async def with_guest_cart(request, user, response):
+    # корзина гостя переходит к вошедшему пользователю
+    if await sync_to_async(merge_guest_cart)(request, user):
+        write_guest_cart(response, {})
+    return response
 
-    def create(self, request, *args, **kwargs):
-        serializer = self.get_serializer(data=request.data)
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-class CustomLoginView(generics.GenericAPIView):
-    serializer_class = CustomLoginSerializer
+@password_view
+async def register_user(request, data):
+    serializer = RegisterSerializer(data=data)
+    await sync_to_async(serializer.is_valid)(raise_exception=True)
+    password_hash = await hash_password(serializer.validated_data['password'])
+    await sync_to_async(serializer.save)(password_hash=password_hash)
+    response = json_response(await sync_to_async(getattr)(serializer, 'data'), status.HTTP_201_CREATED)
+    return await with_guest_cart(request, serializer.instance, response)
 
-    def post(self, request, *args, **kwargs):
-        serializer = self.get_serializer(data=request.data)
-        serializer.is_valid(raise_exception=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+
+@password_view
+async def login_user(request, data):
+    serializer = CustomLoginSerializer(data=data)
+    validated_data = await serializer.avalidate()
+    response = json_response(await sync_to_async(serializer.to_representation)(validated_data), status.HTTP_200_OK)
+    return await with_guest_cart(request, serializer.context['user'], response)
 
 class LogoutView(generics.GenericAPIView):
     serializer_class = LogoutSerializer
@@ -39,23 +115,23 @@ class LogoutView(generics.GenericAPIView):
 
         try:
             refresh_token = serializer.validated_data['refresh']
-            token = RefreshToken(refresh_token)
+            token = RevocableRefreshToken(refresh_token)
             token.blacklist()
             return Response(status=status.HTTP_205_RESET_CONTENT)
         except Exception:
             return Response({'detail': 'Невалидный токен'}, status=status.HTTP_400_BAD_REQUEST)
 
 
-@api_view(['POST'])
-def verify_reset_code(request):
+@password_view
+async def verify_reset_code(request, data):
     """
     Проверка кода сброса и установка нового пароля.
     """
-    serializer = VerifyResetCodeSerializer(data=request.data)
-    if serializer.is_valid():
-        serializer.save()
-        return Response({'message': 'Пароль успешно сброшен.'}, status=status.HTTP_200_OK)
-    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    serializer = VerifyResetCodeSerializer(data=data)
+    await sync_to_async(serializer.is_valid)(raise_exception=True)
+    password_hash = await hash_password(serializer.validated_data['new_password'])
+    await sync_to_async(serializer.save)(password_hash=password_hash)
+    return json_response({'message': 'Пароль успешно сброшен.'}, status.HTTP_200_OK)
 
 
 User = get_user_model()
@@ -89,42 +165,369 @@ class SellerVerifyCodeView(generics.GenericAPIView):
         return response.Response({"detail": "Вы стали продавцом"})
 
 class ClientListAPIView(generics.ListAPIView):
+    """
+    Справочник пользователей для персонала: ?role=, ?q= (начало username, email
+    или телефона), страницы по ?cursor= и ?limit=.
+    """
     queryset = UserProfile.objects.all()
     serializer_class = ClientListSerializer
+    permission_classes = [permissions.IsAdminUser]
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = UserDirectoryFilter
+    pagination_class = KeysetPagination
 
 class ClientDetailAPIView(generics.RetrieveAPIView):
+    """
+    Профиль пользователя для персонала, как и справочник /client. Кэшируется в
+    общем кэше, сбрасывается сигналом при сохранении UserProfile.
+    """
     queryset = UserProfile.objects.all()
     serializer_class = ClientDetailSerializer
+    permission_classes = [permissions.IsAdminUser]
+    cache_timeout = 300
+
+    def retrieve(self, request, *args, **kwargs):
+        key = client_cache_key(self.kwargs['pk'])
+        data = shared_cache().get(key)
+        if data is None:
+            data = self.get_serializer(self.get_object()).data
+            shared_cache().set(key, data, self.cache_timeout)
+        return Response(data)
+
+class FastSerializationMixin:
+    """
+    Быстрый путь для горячих списков: словари из .values() + orjson.
+    Включается настройкой FAST_SERIALIZATION, вывод совпадает со стандартным.
+    """
+    row_serializer_class = None
+
+    def fast_path_enabled(self):
+        return settings.FAST_SERIALIZATION
+
+    def get_renderers(self):
+        renderers = super().get_renderers()
+        if self.fast_path_enabled():
+            renderers = [FastJSONRenderer() if type(r) is JSONRenderer else r for r in renderers]
+        return renderers
+
+    def list(self, request, *args, **kwargs):
+        if not self.fast_path_enabled():
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            # страница уже состоит из моделей — обычный сериализатор
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+        row_serializer = self.row_serializer_class(context=self.get_serializer_context())
+        return Response(row_serializer.serialize(queryset))
+
+
+def sparse_columns(serializer, model, dependencies=None, prefix=''):
+    """
+    Колонки для only() и пути для select_related, которые реально нужны сериализатору.
+    """
+    dependencies = dependencies or {}
+    columns, related = {prefix + model._meta.pk.name}, set()
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        for path in dependencies.get(name, []):
+            columns.add(prefix + path)
+            if '__' in path:
+                related.add(prefix + path.rsplit('__', 1)[0])
+        if not field.source_attrs:
+            continue
+        source = field.source_attrs[0]
+        try:
+            model_field = model._meta.get_field(source)
+        except FieldDoesNotExist:
+            continue
+        if not model_field.concrete:
+            # обратные связи (replies) — это prefetch, а не колонки
+            continue
+        columns.add(prefix + source)
+        if not model_field.is_relation or isinstance(field, serializers.PrimaryKeyRelatedField):
+            continue
+        related.add(prefix + source)
+        if isinstance(field, serializers.Serializer):
+            sub_columns, sub_related = sparse_columns(field, model_field.related_model, prefix=prefix + source + '__')
+            columns |= sub_columns
+            related |= sub_related
+        elif len(field.source_attrs) > 1:
+            columns.add(prefix + '__'.join(field.source_attrs))
+    return columns, related
+
+
+class SparseFieldsetMixin:
+    """
+    ?fields=a,b — только перечисленные поля, ?expand=x — вложенный объект вместо id.
+    Под выбранные поля подстраивается и queryset: only() читает только нужные колонки,
+    select_related делается только для выводимых связей. Без параметров ответ не меняется.
+    """
+    field_dependencies = {}  # поле-свойство -> колонки модели, от которых оно зависит
+
+    def get_query_list(self, name):
+        request = self.request
+        if request is None or request.method != 'GET' or name not in request.query_params:
+            return None
+        return {item.strip() for item in request.query_params[name].split(',') if item.strip()}
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['fields'] = self.get_query_list('fields')
+        context['expand'] = self.get_query_list('expand')
+        return context
+
+    def field_requested(self, name):
+        fields = self.get_query_list('fields')
+        return fields is None or name in fields
+
+    def prune_queryset(self, queryset):
+        columns, related = sparse_columns(self.get_serializer(), queryset.model, self.field_dependencies)
+        if related:
+            # select_related() без аргументов тянет все связи, поэтому только явный список
+            queryset = queryset.select_related(*related)
+        return queryset.only(*columns)
 
-class CategoryAPIView(generics.ListAPIView):
+
+class CategoryAPIView(FastSerializationMixin, generics.ListAPIView):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
+    row_serializer_class = CategoryRowSerializer
 
 class SubCategoryAPIView(generics.ListAPIView):
     queryset = SubCategory.objects.all()
     serializer_class = SubCategorySerializers
 
-class ProductListAPIView(generics.ListAPIView):
-    queryset = Product.objects.all()
+class ProductListAPIView(CachedListMixin, SparseFieldsetMixin, FastSerializationMixin, generics.ListAPIView):
+    """
+    Фильтры и сортировка (ProductFilter) страницы (?limit=&offset=) без ?search=
+    считаются по снимку каталога в памяти, из БД читается только сама страница;
+    полный список без ?limit= идёт обычным запросом к БД. Готовые ответы
+    кэшируются (CachedListMixin) с тегами категории/подкатегории/магазина из фильтров.
+    """
     serializer_class = ProductListSerializers
-    filter_backends = [SearchFilter]
+    row_serializer_class = ProductRowSerializer
+    filter_backends = [DjangoFilterBackend, SearchFilter]
+    filterset_class = ProductFilter
     search_fields = ['product_name']
+    pagination_class = LimitOffsetPagination  # без ?limit= ответ — полный список, как раньше
+    result_cache_params = (*ProductFilter.base_filters, 'search', 'fields', 'expand', 'limit', 'offset')
+
+    def result_cache_tags(self):
+        params = self.request.query_params
+        # список внутри категории/подкатегории/магазина зависит только от её товаров
+        tags = scope_tags(params.get('category'), params.get('subcategory'), params.get('store')) or {'catalog'}
+        if params.get('ordering', '').lstrip('-') == 'popularity':
+            tags.add('popularity')
+        return tags
+
+    def get_queryset(self):
+        # порядок по умолчанию — по id; ?ordering= (ProductFilter) его заменяет
+        queryset = self.prune_queryset(Product.objects.order_by('id'))
+        if self.field_requested('avg_rating'):
+            queryset = queryset.with_rating()
+        if self.field_requested('is_favorited'):
+            queryset = queryset.with_favorited(self.request.user)
+        return queryset
+
+    def catalog_ids(self):
+        """
+        id товаров из снимка каталога или None, если запрос обслуживает БД.
+        """
+        if not settings.CATALOG_SNAPSHOT_ENABLED or 'search' in self.request.query_params:
+            return None
+        params = ProductFilter(self.request.query_params, queryset=Product.objects.none()).snapshot_params()
+        if params is None:
+            return None
+        return get_snapshot().select(**params).tolist()
+
+    def list(self, request, *args, **kwargs):
+        # снимок — только для страницы: весь каталог одним pk__in упёрся бы в лимит параметров SQLite
+        ids = self.catalog_ids() if self.paginator.get_limit(request) is not None else None
+        if ids is None:
+            return super().list(request, *args, **kwargs)
+        ids = self.paginate_queryset(ids)
+        queryset = self.get_queryset().filter(pk__in=ids)
+        if self.fast_path_enabled():
+            data = self.row_serializer_class(context=self.get_serializer_context()).serialize(queryset, order=ids)
+        else:
+            products = {product.pk: product for product in queryset}
+            data = self.get_serializer([products[pk] for pk in ids if pk in products], many=True).data
+        return self.get_paginated_response(data)
+
+class ProductAutocompleteView(APIView):
+    """Подсказки для строки поиска: до 10 товаров и категорий по началу слова"""
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request, *args, **kwargs):
+        query = request.query_params.get('q', '')
+        try:
+            limit = min(int(request.query_params.get('limit', 10)), 20)
+        except ValueError:
+            limit = 10
+        if not query.strip():
+            return Response([])
+        return Response(get_index().suggest(query, limit))
+
+
+class ProductDetailView(generics.RetrieveAPIView):
+    """
+    Страница товара одним запросом: товар, магазин, активная акция и итоговая цена,
+    сводка рейтинга и первая страница отзывов. Число SQL-запросов не зависит от
+    числа отзывов, пока ответы вложены не глубже двух уровней (глубже — запрос на
+    уровень). Ответ лежит в общем кэше и сбрасывается сигналами товара, акций,
+    отзывов, магазина, категории и подкатегории.
+    """
+    serializer_class = ProductDetailSerializers
+    queryset = Product.objects.select_related('category', 'subcategory__category', 'store')
+    reviews_page_size = 10
+    cache_timeout = 300
+
+    def retrieve(self, request, *args, **kwargs):
+        key = product_page_cache_key(self.kwargs['pk'])
+        data = shared_cache().get(key)
+        if data is None:
+            data, timeout = self.build_page()
+            shared_cache().set(key, data, timeout)
+        return Response(data)
+
+    def build_page(self):
+        product = self.get_object()
+        now = timezone.now()
+
+        # текущие и будущие акции товара: активную берём по is_active, а по
+        # next_transition ограничиваем кэш, чтобы он не пережил начало/конец акции
+        sales = list(product.sales.filter(next_transition__isnull=False))
+        sale = max((s for s in sales if s.is_active), key=lambda s: s.discount_percent, default=None)
+        timeout = self.cache_timeout
+        if sales:
+            upcoming = min(s.next_transition for s in sales)
+            timeout = max(1, min(timeout, int((upcoming - now).total_seconds()) + 1))
+
+        top_level = Review.objects.filter(product=product, parent__isnull=True)
+        distribution = {i: 0 for i in range(1, 6)}
+        unrated = 0
+        for row in top_level.values('rating').annotate(count=Count('id')):
+            if row['rating'] is None:
+                unrated = row['count']
+            else:
+                distribution[row['rating']] = row['count']
+        rated = sum(distribution.values())
+        product.rating_avg = sum(r * c for r, c in distribution.items()) / rated if rated else None
+
+        reviews = (
+            top_level.select_related('user')
+            .prefetch_related('replies__user', 'replies__replies')
+            .order_by('-created_at')[:self.reviews_page_size]
+        )
+
+        context = self.get_serializer_context()
+        data = {
+            'product': self.get_serializer(product).data,
+            'store': StoreShortSerializer(product.store, context=context).data if product.store else None,
+            'sale': ActiveSaleSerializer(sale, context=context).data if sale else None,
+            'effective_price': sale.discounted_price if sale else product.price,
+            'rating': {
+                'average': round(product.rating_avg, 1) if product.rating_avg else 0.0,
+                'count': rated,
+                'distribution': distribution,
+            },
+            'reviews_count': rated + unrated,
+            'reviews': ReviewSerializer(reviews, many=True, context=context).data,
+        }
+        return data, timeout
+
 
 class ProductCreateAPIView(generics.CreateAPIView):
     queryset = Product.objects.all()
     serializer_class = ProductCreateSerializer
 
 
-class SaleAPIView(generics.ListAPIView):
-    queryset = Sale.objects.all()
+class RecommendationListMixin:
+    serializer_class = ProductShortSerializer
+    pagination_class = None
+    recommendations_limit = 10
+    # по умолчанию рекомендации к товару из URL, как lookup_url_kwarg у DRF
+    source_url_kwarg = 'pk'
+
+    def get_source_product_ids(self):
+        return [self.kwargs[self.source_url_kwarg]]
+
+    def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            return Product.objects.none()
+        ids = recommended_product_ids(self.get_source_product_ids(), limit=self.recommendations_limit)
+        products = Product.objects.in_bulk(ids)
+        return [products[pk] for pk in ids if pk in products]
+
+
+class ProductRecommendationView(RecommendationListMixin, generics.ListAPIView):
+    """Часто покупают вместе с товаром"""
+
+
+class CartRecommendationView(GuestCartMixin, RecommendationListMixin, generics.ListAPIView):
+    """Рекомендации по текущей корзине"""
+
+    def get_source_product_ids(self):
+        if self.is_guest():
+            return list(self.guest_items())
+        return CartItem.objects.filter(cart__user=self.request.user).values_list('product_id', flat=True)
+
+
+class SaleAPIView(CachedListMixin, SparseFieldsetMixin, FastSerializationMixin, generics.ListAPIView):
     serializer_class = SaleSerializers
+    row_serializer_class = SaleRowSerializer
+    field_dependencies = {
+        'discounted_price': ['discount_percent', 'product__price'],
+        'is_currently_active': ['is_active'],
+    }
+
+    def get_queryset(self):
+        return self.prune_queryset(Sale.objects.all())
+
+    def result_cache_tags(self):
+        return {'sales'}
 
-class OrderListCreateView(generics.ListCreateAPIView):
+class OrderListCreateView(IdempotentPostMixin, generics.ListCreateAPIView):
     serializer_class = OrderingSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    def changed_since(self):
+        """?changed_since=<ISO-время> — только заказы, изменённые после этого момента (для синхронизации)"""
+        changed_since = self.request.query_params.get("changed_since")
+        if not changed_since:
+            return None
+        since = parse_datetime(changed_since)
+        if since is None:
+            raise serializers.ValidationError({"changed_since": "Неверный формат даты"})
+        if timezone.is_naive(since):
+            since = timezone.make_aware(since)
+        return since
+
     def get_queryset(self):
-        return Ordering.objects.filter(user=self.request.user).order_by("-created_at")
+        queryset = Ordering.objects.filter(user=self.request.user).prefetch_related("items")
+        since = self.changed_since()
+        if since is not None:
+            return queryset.filter(updated_at__gt=since).order_by("updated_at")
+        return queryset.order_by("-created_at")
+
+    def get_archived_queryset(self):
+        queryset = ArchivedOrder.objects.filter(user=self.request.user).prefetch_related("items")
+        since = self.changed_since()
+        if since is not None:
+            return queryset.filter(updated_at__gt=since).order_by("updated_at")
+        return queryset.order_by("-created_at")
+
+    def list(self, request, *args, **kwargs):
+        # история — из горячих таблиц и архива (market_app.archive), поля у них одинаковые
+        if self.changed_since() is not None:
+            orders = merge_order_tiers(self.get_queryset(), self.get_archived_queryset(),
+                                       key=lambda order: order.updated_at)
+        else:
+            orders = merge_order_tiers(self.get_queryset(), self.get_archived_queryset(),
+                                       key=lambda order: order.created_at, reverse=True)
+        return Response(self.get_serializer(orders, many=True).data)
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
@@ -136,39 +539,200 @@ class OrderDetailView(generics.RetrieveUpdateAPIView):
     queryset = Ordering.objects.all()
 
     def get_queryset(self):
-        return Ordering.objects.filter(user=self.request.user)
+        queryset = Ordering.objects.filter(user=self.request.user)
+        if self.request.method not in permissions.SAFE_METHODS:
+            # статус проверяется по машине состояний на заблокированной строке (update — в транзакции)
+            queryset = queryset.select_for_update()
+        return queryset
+
+    def get_object(self):
+        try:
+            return super().get_object()
+        except Http404:
+            # архивный заказ можно посмотреть, но не изменить
+            if self.request.method not in permissions.SAFE_METHODS:
+                raise
+            return get_object_or_404(ArchivedOrder.objects.prefetch_related("items"),
+                                     pk=self.kwargs['pk'], user=self.request.user)
+
+    @transaction.atomic
+    def update(self, request, *args, **kwargs):
+        # смена статуса и запись в журнал OrderEvent — вместе или никак
+        return super().update(request, *args, **kwargs)
 
+    def perform_update(self, serializer):
+        previous = serializer.instance.delivery_status
+        order = serializer.save()
+        if order.delivery_status != previous:
+            event = OrderEvent.objects.create(
+                order=order, from_status=previous, to_status=order.delivery_status, actor=self.request.user
+            )
+            notify_order_events([event], {order.pk: order.user_id})
 
-class CartDetailView(generics.RetrieveAPIView):
-    serializer_class = CartDetailSerializer
+
+class SellerInboxView(generics.ListAPIView):
+    """
+    Входящие заказы продавца: позиции заказов по всем его магазинам, новые сверху,
+    ?status=, ?store=, страницы по ?cursor= и ?limit=.
+    """
+    serializer_class = SellerOrderLineSerializer
     permission_classes = [permissions.IsAuthenticated]
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = SellerInboxFilter
+    pagination_class = SellerInboxPagination
+
+    def get_queryset(self):
+        # id магазинов отдельным запросом: сама выборка идёт по индексу
+        # orderitem_store_inbox без JOIN магазинов и товаров
+        self.store_ids = list(Store.objects.filter(owner=self.request.user).values_list('id', flat=True))
+        return OrderItem.objects.filter(store_id__in=self.store_ids)
+
+
+class OrderEventListView(generics.ListAPIView):
+    """История статусов заказа"""
+    serializer_class = OrderEventSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        pk, user = self.kwargs['pk'], self.request.user
+        if not Ordering.objects.filter(pk=pk, user=user).exists():
+            return ArchivedOrderEvent.objects.filter(order_id=pk, order__user=user).order_by('created_at')
+        return OrderEvent.objects.filter(order_id=pk, order__user=user).order_by('created_at')
+
+
+async def stream_user(request):
+    """
+    Пользователь SSE-подключения: сессия или JWT (заголовок Authorization: Bearer
+    или ?token=, потому что EventSource в браузере не умеет слать заголовки).
+    """
+    user = await request.auser()
+    if user.is_authenticated:
+        return user
+    header = request.headers.get('Authorization', '')
+    raw_token = header[len('Bearer '):] if header.startswith('Bearer ') else request.GET.get('token')
+    if not raw_token:
+        return None
+    authentication = JWTAuthentication()
+    try:
+        token = authentication.get_validated_token(raw_token)
+        return await sync_to_async(authentication.get_user)(token)
+    except (InvalidToken, AuthenticationFailed):
+        return None
+
+
+def sse_message(message):
+    return f"id: {message['id']}\nevent: order_status\ndata: {json.dumps(message, ensure_ascii=False)}\n\n"
+
+
+async def order_events_stream(request):
+    """
+    Server-sent events: смена статусов заказов текущего пользователя.
+    Работает под ASGI (mysite/asgi.py); открытое подключение — это только очередь
+    в памяти, без потока и без соединения с БД. После переподключения пропущенные
+    события досылаются по Last-Event-ID.
+    """
+    user = await stream_user(request)
+    if user is None:
+        return JsonResponse({"detail": "Учетные данные не были предоставлены."}, status=401)
+
+    broker = get_broker()
+    queue = broker.subscribe(user.pk)
+
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    missed = []
+    if last_event_id and last_event_id.isdigit():
+        missed = await sync_to_async(list)(
+            OrderEvent.objects.filter(order__user=user, id__gt=int(last_event_id)).order_by('id')[:500]
+        )
+
+    async def stream():
+        try:
+            sent = 0
+            for event in missed:
+                sent = event.id
+                yield sse_message(order_event_message(event))
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=settings.ORDER_EVENTS_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                if message['id'] > sent:
+                    yield sse_message(message)
+        finally:
+            broker.unsubscribe(user.pk, queue)
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # nginx не должен буферизовать поток
+    return response
+
+
+class OrderBulkStatusView(IdempotentPostMixin, generics.GenericAPIView):
+    """Массовая смена статуса доставки (курьеры, склад)"""
+    serializer_class = OrderBulkStatusSerializer
+    permission_classes = [permissions.IsAdminUser]
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        updated, rejected, not_found = bulk_transition(
+            serializer.validated_data['order_ids'], serializer.validated_data['status'], actor=request.user
+        )
+        return Response({"updated": updated, "rejected": rejected, "not_found": not_found})
+
+
+class CartDetailView(GuestCartMixin, FastSerializationMixin, generics.RetrieveAPIView):
+    serializer_class = CartDetailSerializer
 
     def get_object(self):
         cart, _ = Cart.objects.get_or_create(user=self.request.user)
         return cart
 
-class CartItemCreateView(generics.CreateAPIView):
+    def retrieve(self, request, *args, **kwargs):
+        if self.is_guest():
+            return Response(guest_cart_data(self.guest_items(), self.get_serializer_context()))
+        if not self.fast_path_enabled():
+            return super().retrieve(request, *args, **kwargs)
+        return Response(serialize_cart(self.get_object(), self.get_serializer_context()))
+
+class CartItemCreateView(GuestCartMixin, IdempotentPostMixin, generics.CreateAPIView):
     serializer_class = CartItemCreateSerializer
-    permission_classes = [permissions.IsAuthenticated]
 
     def perform_create(self, serializer):
-        cart, _ = Cart.objects.get_or_create(user=self.request.user)
         product_id = serializer.validated_data['product_id']
         quantity = serializer.validated_data.get('quantity', 1)
 
-        try:
-            product = Product.objects.get(id=product_id)
-        except Product.DoesNotExist:
+        if not Product.objects.filter(id=product_id).exists():
             raise serializers.ValidationError({"product": "Продукт с таким ID не найден"})
 
-        cart_item, created = CartItem.objects.get_or_create(cart=cart, product=product)
-        if not created:
-            cart_item.quantity += quantity
-        else:
-            cart_item.quantity = quantity
-        cart_item.save()
+        operations = [{'op': 'add', 'product_id': product_id, 'quantity': quantity}]
+        if self.is_guest():
+            self.save_guest_items(apply_guest_operations(self.guest_items(), operations))
+            return
+        cart, _ = Cart.objects.get_or_create(user=self.request.user)
+        apply_cart_operations(cart, operations)
+
+class CartBatchView(GuestCartMixin, IdempotentPostMixin, generics.GenericAPIView):
+    """Синхронизация корзины пачкой операций add/set/remove за один запрос"""
+    serializer_class = CartBatchSerializer
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        if self.is_guest():
+            items = apply_guest_operations(self.guest_items(), serializer.validated_data['operations'])
+            self.save_guest_items(items)
+            return Response(guest_cart_data(items, self.get_serializer_context()), status=status.HTTP_200_OK)
 
-class CreateOrderFromCartView(generics.CreateAPIView):
+        cart, _ = Cart.objects.get_or_create(user=request.user)
+        apply_cart_operations(cart, serializer.validated_data['operations'])
+
+        return Response(CartDetailSerializer(cart, context=self.get_serializer_context()).data,
+                        status=status.HTTP_200_OK)
+
+class CreateOrderFromCartView(IdempotentPostMixin, generics.CreateAPIView):
     serializer_class = OrderingSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -177,23 +741,40 @@ class CreateOrderFromCartView(generics.CreateAPIView):
         if not cart or not cart.items.exists():
             return Response({"error": "Корзина пуста"}, status=status.HTTP_400_BAD_REQUEST)
 
-        order = Ordering.objects.create(user=request.user)
-        for cart_item in cart.items.all():
-            OrderItem.objects.create(
-                order=order,
-                product=cart_item.product,
-                quantity=cart_item.quantity
-            )
-        cart.items.all().delete()  # очистить корзину
+        # заказ, позиции и очистка корзины — вместе: при ошибке не остаётся пустого заказа
+        with transaction.atomic():
+            order = Ordering.objects.create(user=request.user)
+            cart_items = list(cart.items.select_related('product'))
+            discounts = active_discounts([cart_item.product_id for cart_item in cart_items])
+            for cart_item in cart_items:
+                item = OrderItem(
+                    order=order,
+                    product=cart_item.product,
+                    quantity=cart_item.quantity,
+                    store_id=cart_item.product.store_id,
+                    order_status=order.delivery_status,
+                    created_at=order.created_at,
+                )
+                item.fill_snapshot(cart_item.product, discounts.get(cart_item.product_id, 0))
+                item.save()
+            cart.items.all().delete()  # очистить корзину
 
         serializer = self.get_serializer(order)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-class CartItemDeleteView(generics.DestroyAPIView):
+class CartItemDeleteView(GuestCartMixin, generics.DestroyAPIView):
     serializer_class = CartItemDetailSerializer
-    permission_classes = [permissions.IsAuthenticated]
     lookup_field = 'product_id'
 
+    def destroy(self, request, *args, **kwargs):
+        if not self.is_guest():
+            return super().destroy(request, *args, **kwargs)
+        items = self.guest_items()
+        if items.pop(self.kwargs['product_id'], None) is None:
+            raise Http404
+        self.save_guest_items(items)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
     def get_object(self):
         cart, _ = Cart.objects.get_or_create(user=self.request.user)
         product_id = self.kwargs.get('product_id')
@@ -202,14 +783,16 @@ class CartItemDeleteView(generics.DestroyAPIView):
         except CartItem.DoesNotExist:
             raise Http404
 
-class ReviewListCreateView(generics.ListCreateAPIView):
+class ReviewListCreateView(IdempotentPostMixin, SparseFieldsetMixin, generics.ListCreateAPIView):
     serializer_class = ReviewSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 
     def get_queryset(self):
         """Отзывы можно фильтровать по product_id"""
         product_id = self.request.query_params.get("product_id")
-        queryset = Review.objects.select_related("user", "product", "parent")
+        queryset = self.prune_queryset(Review.objects.all())
+        if self.field_requested('replies'):
+            queryset = queryset.prefetch_related('replies__user', 'replies__replies')
         if product_id:
             return queryset.filter(product_id=product_id, parent__isnull=True)
         return queryset.filter(parent__isnull=True)
@@ -241,7 +824,7 @@ class ReviewDetailView(generics.RetrieveUpdateDestroyAPIView):
         instance.delete()
 
 
-class FavoriteProductCreateView(generics.CreateAPIView):
+class FavoriteProductCreateView(IdempotentPostMixin, generics.CreateAPIView):
     serializer_class = FavoriteProductSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -258,12 +841,22 @@ class FavoriteProductDeleteView(generics.DestroyAPIView):
     lookup_field = 'id'
 
 class FavoriteProductListView(generics.ListAPIView):
-    serializer_class = FavoriteProductSerializer
+    serializer_class = FavoriteProductListSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
         user = self.request.user
-        return FavoriteProduct.objects.filter(favorite__user=user)
+        # карточки товаров подтягиваются одним дополнительным запросом
+        products = (
+            Product.objects.select_related('category', 'subcategory__category')
+            .with_rating()
+            .annotate(is_favorited=Value(True))
+        )
+        return (
+            FavoriteProduct.objects.filter(favorite__user=user)
+            .prefetch_related(Prefetch('product', queryset=products))
+            .order_by('-created_date')
+        )
 
 class ReceiptDetailView(generics.RetrieveAPIView):
     queryset = Receipt.objects.all()
@@ -272,7 +865,16 @@ class ReceiptDetailView(generics.RetrieveAPIView):
 
     def get_queryset(self):
         # Покупатель видит только свои чеки
-        return Receipt.objects.filter(order__user=self.request.user)
+        return Receipt.objects.filter(order__user=self.request.user).select_related("order__user").prefetch_related(
+            "order__items"
+        )
+
+    def get_object(self):
+        try:
+            return super().get_object()
+        except Http404:
+            return get_object_or_404(ArchivedReceipt.objects.select_related("order").prefetch_related("order__items"),
+                                     pk=self.kwargs['pk'], order__user=self.request.user)
 
 class StoreListCreateView(generics.ListCreateAPIView):
     serializer_class = StoreSerializer
@@ -13,4 +13,11 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mysite.settings')
 
+# Под ASGI работает SSE-поток /orders/events/stream/ (market_app.views.order_events_stream).
+# Запуск: gunicorn -k uvicorn.workers.UvicornWorker mysite.asgi:application
 application = get_asgi_application()
+
+# индекс подсказок поиска строится при старте процесса, а не на первом запросе
+from market_app.autocomplete import warm_index  # noqa: E402
+
+warm_index()
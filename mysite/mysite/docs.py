@@ -0,0 +1,125 @@
+"""
+Документация API (Swagger UI).
+
+Модуль импортируется из urls.py только при API_DOCS_ENABLED, поэтому drf_yasg
+не загружается в рабочих процессах без документации. Схема собирается один раз
+при деплое командой build_api_schema и отдаётся как готовый файл.
+"""
+import hashlib
+import logging
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.urls import path
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import etag
+from drf_yasg import openapi
+from drf_yasg.codecs import OpenAPICodecJson
+from drf_yasg.generators import OpenAPISchemaGenerator
+from drf_yasg.renderers import SwaggerUIRenderer
+from drf_yasg.utils import swagger_auto_schema
+from rest_framework import generics, permissions
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from market_app.serializers import CustomLoginSerializer, RegisterSerializer, VerifyResetCodeSerializer
+
+logger = logging.getLogger(__name__)
+
+API_INFO = openapi.Info(title="HalalMarket", default_version='v1')
+
+
+TOKENS_RESPONSE = openapi.Schema(type=openapi.TYPE_OBJECT, properties={
+    'user': openapi.Schema(type=openapi.TYPE_OBJECT, additional_properties=openapi.Schema(type=openapi.TYPE_STRING)),
+    'access': openapi.Schema(type=openapi.TYPE_STRING),
+    'refresh': openapi.Schema(type=openapi.TYPE_STRING),
+})
+PASSWORD_ERRORS = {
+    400: 'Ошибка валидации',
+    503: 'Пул хэширования паролей занят, повторить через Retry-After секунд',
+}
+
+
+def password_endpoint_docs(serializer_class, response_status, response):
+    """
+    Описание для схемы асинхронного view с паролем (market_app.views.password_view):
+    это не APIView, и drf_yasg сам его не находит. Запросы сюда не маршрутизируются.
+    """
+    @swagger_auto_schema(request_body=serializer_class, responses={response_status: response, **PASSWORD_ERRORS})
+    def post(self, request, *args, **kwargs):
+        """Обрабатывает одноимённый асинхронный view из market_app.views"""
+
+    return type(f"{serializer_class.__name__}Docs", (generics.GenericAPIView,), {
+        'post': post,
+        'serializer_class': serializer_class,
+        'permission_classes': [permissions.AllowAny],
+    })
+
+
+# путь -> описание (по пути: имя 'login' в market_app.urls занято и у /logout/)
+PASSWORD_ENDPOINTS = {
+    '/register/': password_endpoint_docs(
+        RegisterSerializer, 201, openapi.Response('Пользователь создан, токены выданы', TOKENS_RESPONSE)),
+    '/login/': password_endpoint_docs(
+        CustomLoginSerializer, 200, openapi.Response('Токены', TOKENS_RESPONSE)),
+    '/password_reset/verify_code/': password_endpoint_docs(
+        VerifyResetCodeSerializer, 200, 'Пароль сброшен'),
+}
+
+
+class SchemaGenerator(OpenAPISchemaGenerator):
+    def get_endpoints(self, request):
+        endpoints = super().get_endpoints(request)
+        for endpoint, docs_view in PASSWORD_ENDPOINTS.items():
+            view = self.create_view(docs_view.as_view(), 'POST', request)
+            endpoints[endpoint] = (docs_view, [('POST', view)])
+        return endpoints
+
+
+def generate_schema():
+    """
+    Собирает схему OpenAPI и возвращает её как JSON (bytes).
+    """
+    schema = SchemaGenerator(API_INFO).get_schema(request=None, public=True)
+    return OpenAPICodecJson(validators=[]).encode(schema)
+
+
+@lru_cache(maxsize=1)
+def load_schema():
+    schema_file = Path(settings.API_SCHEMA_FILE)
+    try:
+        return schema_file.read_bytes()
+    except FileNotFoundError:
+        # без заранее собранного файла генерируем один раз на процесс
+        logger.warning("%s не найден, схема собирается на лету (запустите build_api_schema)", schema_file)
+        return generate_schema()
+
+
+def schema_etag(request):
+    return hashlib.md5(load_schema()).hexdigest()
+
+
+@cache_control(public=True, max_age=3600)
+@etag(schema_etag)
+def schema_json(request):
+    return HttpResponse(load_schema(), content_type='application/json')
+
+
+class SwaggerUIView(APIView):
+    """
+    Страница Swagger UI; сама схема подгружается с schema_json (SWAGGER_SETTINGS['SPEC_URL']).
+    """
+    permission_classes = [permissions.AllowAny]
+    renderer_classes = [SwaggerUIRenderer]
+
+    def get(self, request, *args, **kwargs):
+        # UI нужны только заголовок и версия, пути берутся из готового файла
+        return Response(openapi.Swagger(info=API_INFO, _prefix='/', paths=openapi.Paths({})))
+
+
+urlpatterns = [
+    path('docs/', SwaggerUIView.as_view(), name='schema-swagger-ui'),
+    path('docs/openapi.json', schema_json, name='api-schema'),
+]
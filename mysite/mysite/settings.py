@@ -44,9 +44,7 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'market_app',
-    'rest_framework_swagger',
     'rest_framework',
-    'drf_yasg',
     'rest_framework_simplejwt',
     'rest_framework_simplejwt.token_blacklist',  # ОБЯЗАТЕЛЬНО
     'django_rest_passwordreset',
@@ -55,6 +53,11 @@ INSTALLED_APPS = [
 
 ]
 
+# Swagger (drf_yasg) подключается только если документация включена
+API_DOCS_ENABLED = config('API_DOCS_ENABLED', default=DEBUG, cast=bool)
+if API_DOCS_ENABLED:
+    INSTALLED_APPS.append('drf_yasg')
+
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -64,6 +67,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'market_app.profiling.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'mysite.urls'
@@ -92,14 +96,40 @@ WSGI_APPLICATION = 'mysite.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': config('SQLITE_PATH', default=str(BASE_DIR / 'db.sqlite3')),
     }
 }
 
+# Архив доставленных заказов (команда archive_orders): по умолчанию в той же БД,
+# ARCHIVE_SQLITE_PATH выносит его в отдельную (migrate --database archive)
+ARCHIVE_SQLITE_PATH = config('ARCHIVE_SQLITE_PATH', default='')
+if ARCHIVE_SQLITE_PATH:
+    DATABASES['archive'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ARCHIVE_SQLITE_PATH,
+    }
+ARCHIVE_DATABASE = 'archive' if ARCHIVE_SQLITE_PATH else 'default'
+DATABASE_ROUTERS = ['market_app.routers.ArchiveRouter']
+ARCHIVE_ORDERS_AFTER_DAYS = config('ARCHIVE_ORDERS_AFTER_DAYS', default=180, cast=int)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
+# pbkdf2_sha256 с настраиваемым числом итераций (подбирается ./manage.py bench_password_hashing);
+# хэши со старыми параметрами пересчитываются при входе
+PASSWORD_HASHERS = [
+    'market_app.passwords.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+PASSWORD_PBKDF2_ITERATIONS = config('PASSWORD_PBKDF2_ITERATIONS', default=1_000_000, cast=int)
+# пул потоков для хэширования на входе/регистрации/сбросе; сверх WORKERS + QUEUE задач — ответ 503
+PASSWORD_HASH_WORKERS = config('PASSWORD_HASH_WORKERS', default=os.cpu_count() or 2, cast=int)
+PASSWORD_HASH_QUEUE = config('PASSWORD_HASH_QUEUE', default=64, cast=int)
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -137,6 +167,12 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 MEDIA_URL = '/media/'
 
+# Схема OpenAPI собирается при деплое: ./manage.py build_api_schema
+API_SCHEMA_FILE = STATIC_ROOT / 'openapi.json'
+SWAGGER_SETTINGS = {
+    'SPEC_URL': 'api-schema',
+}
+
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -145,9 +181,18 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 AUTH_USER_MODEL = 'market_app.UserProfile'
 
 REST_FRAMEWORK = {
-    'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend']
+    'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend'],
+    # токены из /login/ (Bearer), плюс прежние сессия и Basic
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'rest_framework.authentication.SessionAuthentication',
+        'rest_framework.authentication.BasicAuthentication',
+    ],
 }
 
+# Быстрая сериализация горячих списков (товары, акции, категории, корзина): .values() + orjson
+FAST_SERIALIZATION = config('FAST_SERIALIZATION', default=False, cast=bool)
+
 
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=300),
@@ -159,10 +204,68 @@ SIMPLE_JWT = {
     'TOKEN_BLACKLIST_ENABLED': True,
 }
 
+# корзина без входа — подписанная cookie (market_app/guest_cart.py), переносится в Cart при входе
+GUEST_CART_COOKIE = 'guest_cart'
+GUEST_CART_MAX_AGE = 60 * 60 * 24 * 30
+GUEST_CART_MAX_ITEMS = 50
+
+# отзыв refresh-токенов проверяется по фильтру в памяти (market_app/tokens.py): новые отзывы
+# догружаются раз в REVOCATION_FILTER_REFRESH секунд, фильтр пересобирается раз в REVOCATION_FILTER_REBUILD
+REVOCATION_FILTER_REFRESH = config('REVOCATION_FILTER_REFRESH', default=2, cast=float)
+REVOCATION_FILTER_REBUILD = config('REVOCATION_FILTER_REBUILD', default=600, cast=float)
+
+# профилирование запросов (market_app/profiling.py): по заголовку X-Profile от staff или случайная
+# доля PROFILING_SAMPLE_RATE; профили смотреть в admin/profiles/. False — middleware не подключается
+PROFILING_ENABLED = config('PROFILING_ENABLED', default=True, cast=bool)
+PROFILING_SAMPLE_RATE = config('PROFILING_SAMPLE_RATE', default=0.0, cast=float)
+PROFILING_INTERVAL = 0.002  # секунд между снимками стека
+PROFILING_DIR = config('PROFILING_DIR', default=str(BASE_DIR / 'var' / 'profiles'))
+PROFILING_KEEP = config('PROFILING_KEEP', default=200, cast=int)  # старые профили удаляются
+
+# Idempotency-Key: ответы на POST хранятся в общем для всех процессов кэше (таблица создаётся createcachetable)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'idempotency': {
+        'BACKEND': config('IDEMPOTENCY_CACHE_BACKEND', default='django.core.cache.backends.db.DatabaseCache'),
+        'LOCATION': config('IDEMPOTENCY_CACHE_LOCATION', default='idempotency_cache'),
+    },
+    # общий для процессов уровень кэша ответов списков (market_app.result_cache)
+    'results': {
+        'BACKEND': config('RESULT_CACHE_BACKEND', default='django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': config('RESULT_CACHE_LOCATION', default=str(BASE_DIR / 'var' / 'result_cache')),
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+}
+IDEMPOTENCY_CACHE = 'idempotency'
+IDEMPOTENCY_KEY_TTL = 60 * 60 * 24  # сутки: дольше клиенты запрос не повторяют
+IDEMPOTENCY_LOCK_TIMEOUT = 60  # защита от зависшей блокировки, если процесс упал посреди запроса
+IDEMPOTENCY_RETRY_AFTER = 1  # Retry-After (сек.) для дубля, пришедшего, пока первый запрос ещё выполняется
+
+# Кэш ответов /product и /sale: LRU в процессе + общий кэш 'results', сброс по тегам сигналами
+RESULT_CACHE_ENABLED = config('RESULT_CACHE_ENABLED', default=True, cast=bool)
+RESULT_CACHE = 'results'
+RESULT_CACHE_TTL = 60  # сек.; страховка на случай изменений в обход сигналов (update(), правка БД руками)
+RESULT_CACHE_MAX_ENTRIES = 512  # записей в памяти одного процесса
+
+# Колоночный снимок каталога (market_app.catalog): общий для процессов файл, открывается через mmap
+CATALOG_SNAPSHOT_ENABLED = config('CATALOG_SNAPSHOT_ENABLED', default=True, cast=bool)
+CATALOG_SNAPSHOT_FILE = config('CATALOG_SNAPSHOT_FILE', default=str(BASE_DIR / 'var' / 'catalog_snapshot.npy'))
+
+# Индекс автодополнения поиска в памяти процесса; перестраивается, если старше этого (сек.)
+AUTOCOMPLETE_MAX_AGE = 300
+
+# SSE-уведомления о статусах заказов: брокер раздаёт события всем рабочим процессам ASGI
+ORDER_EVENTS_BROKER = config('ORDER_EVENTS_BROKER', default='market_app.events.UnixSocketBroker')
+ORDER_EVENTS_SOCKET_DIR = config('ORDER_EVENTS_SOCKET_DIR', default='/tmp/halalmarket-order-events')
+ORDER_EVENTS_HEARTBEAT = 20  # секунд между ping, чтобы прокси не рвали тихие подключения
+
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
-EMAIL_HOST = 'smtp.gmail.com'
-EMAIL_PORT = 587
-EMAIL_USE_TLS = True
+# хост/порт переопределяются окружением (нагрузочный тест подставляет локальный SMTP-приёмник)
+EMAIL_HOST = config('EMAIL_HOST', default='smtp.gmail.com')
+EMAIL_PORT = config('EMAIL_PORT', default=587, cast=int)
+EMAIL_USE_TLS = config('EMAIL_USE_TLS', default=True, cast=bool)
 EMAIL_HOST_USER = 'kadyroverjan2006@gmail.com'          # твой Gmail
 EMAIL_HOST_PASSWORD = 'upps rxfo fgnj rexa'  # сгенерированный пароль для приложений
 
@@ -191,4 +294,7 @@ CORS_ALLOW_HEADERS = [
     "content-type",
     "authorization",
     "x-requested-with",
+    "idempotency-key",
+    "x-profile",
 ]
+CORS_EXPOSE_HEADERS = ["idempotent-replayed", "x-profile-id", "retry-after"]
@@ -18,23 +18,19 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
-from django.conf.urls.static import static
-from rest_framework_swagger.views import get_swagger_view
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
-from rest_framework import permissions
-from django.conf import settings
 
-schema_view = get_schema_view(
-    openapi.Info(
-        title="HalalMarket",
-        default_version='v1',),
-    public=True,
-    permission_classes=(permissions.AllowAny,),
-)
+from market_app.admin import profile_detail, profile_download, profile_list
 
 urlpatterns = [
+    # профили запросов (market_app.profiling) — до admin.site.urls, иначе их перехватит админка
+    path('admin/profiles/', admin.site.admin_view(profile_list), name='admin-profiles'),
+    path('admin/profiles/<str:profile_id>/', admin.site.admin_view(profile_detail), name='admin-profile'),
+    path('admin/profiles/<str:profile_id>/speedscope/', admin.site.admin_view(profile_download),
+         name='admin-profile-speedscope'),
     path('admin/', admin.site.urls),
     path('', include('market_app.urls')),
-    path('docs/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
 ]+static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+
+# drf_yasg импортируется только когда документация включена
+if settings.API_DOCS_ENABLED:
+    urlpatterns += [path('', include('mysite.docs'))]
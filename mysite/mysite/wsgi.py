@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mysite.settings')
 
 application = get_wsgi_application()
+
+# индекс подсказок поиска строится при старте процесса, а не на первом запросе
+from market_app.autocomplete import warm_index  # noqa: E402
+
+warm_index()